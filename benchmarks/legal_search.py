@@ -0,0 +1,112 @@
+# benchmarks/legal_search.py
+"""
+Benchmark do índice do acervo jurídico: gera um acervo sintético com o tamanho de algumas
+leis grandes (artigos com vocabulário de distribuição Zipf), mede a indexação completa, a
+reindexação incremental após alterar um arquivo, a latência das buscas top-k exatas e quanto
+limitar as listas de cada termo (`max_postings`) acelera a busca e perde em recall.
+
+Uso: python -m benchmarks.legal_search [artigos_por_lei]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List
+
+from utils.legal_index import LegalIndex
+
+LAWS = ("Constituição da República Federativa do Brasil", "Código Penal", "Código Civil",
+        "Código de Processo Civil", "Código de Defesa do Consumidor", "Consolidação das Leis do Trabalho")
+
+
+def vocabulary(size: int, rng: random.Random) -> List[str]:
+    letters = "abcdefghijlmnoprstuv"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 11))) for _ in range(size)]
+
+
+def write_corpus(directory: str, articles: int, words: List[str], weights: List[float],
+                 rng: random.Random) -> List[str]:
+    paths = []
+    for index, title in enumerate(LAWS):
+        lines = [title, ""]
+        for number in range(1, articles + 1):
+            body = " ".join(rng.choices(words, weights, k=rng.randint(20, 160)))
+            lines.append(f"Art. {number}º {body}.")
+        path = os.path.join(directory, f"lei{index}.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines))
+        paths.append(path)
+    return paths
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def latencies(index: LegalIndex, queries: List[str]) -> str:
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, k=3)
+        timings.append(time.perf_counter() - started)
+    return (f"p50 {percentile(timings, 0.5) * 1000:.3f} ms  p95 {percentile(timings, 0.95) * 1000:.3f} ms"
+            f"  p99 {percentile(timings, 0.99) * 1000:.3f} ms")
+
+
+def main(articles: int = 2000):
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as root:
+        corpus = os.path.join(root, "acervo")
+        os.makedirs(corpus)
+        words = vocabulary(30000, rng)
+        # Pesos Zipf: poucas palavras muito comuns, muitas raras
+        weights = [1 / (rank + 1) for rank in range(len(words))]
+        paths = write_corpus(corpus, articles, words, weights, rng)
+        size = sum(os.path.getsize(path) for path in paths)
+
+        index = LegalIndex(corpus, os.path.join(root, "indice"))
+        started = time.perf_counter()
+        index.refresh()
+        full = time.perf_counter() - started
+        stats = index.stats()
+        print(f"Acervo: {stats['sources']} leis, {stats['documents']} artigos, "
+              f"{stats['terms']} termos, {size / 1024 / 1024:.1f} MB")
+        print(f"Indexação completa: {full * 1000:.0f} ms")
+
+        with open(paths[0], "a", encoding="utf-8") as file:
+            file.write("\nArt. 99999 dispositivo acrescentado.")
+        started = time.perf_counter()
+        index.refresh()
+        print(f"Reindexação após alterar 1 arquivo: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        started = time.perf_counter()
+        reopened = LegalIndex(corpus, os.path.join(root, "indice"))
+        reopened.refresh()
+        print(f"Abertura do índice já construído: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        # Perguntas com a mesma distribuição de palavras do acervo, inclusive as muito comuns
+        queries = [
+            " ".join(rng.choices(words, weights, k=rng.randint(3, 12)))
+            + (f" artigo {rng.randint(1, articles)} do código penal" if rng.random() < 0.3 else "")
+            for _ in range(2000)
+        ]
+        print(f"Busca top-3 exata ({len(queries)} perguntas): {latencies(reopened, queries)}")
+
+        # Limitar as entradas lidas por termo acelera a busca, mas perde artigos relevantes
+        exact = [[(item["source"], item["label"]) for item in reopened.search(query, k=3)] for query in queries]
+        for limit in (256, 1024, 4096):
+            capped = LegalIndex(corpus, os.path.join(root, "indice"), max_postings=limit)
+            capped.refresh()
+            found = sum(
+                len(set(expected) & {(item["source"], item["label"]) for item in capped.search(query, k=3)})
+                for query, expected in zip(queries, exact)
+            )
+            print(f"  max_postings={limit}: {latencies(capped, queries)}"
+                  f"  | {found / sum(map(len, exact)):.1%} dos mesmos artigos da busca exata")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,299 @@
+# benchmarks/load_test.py
+"""
+Teste de carga de ponta a ponta, sem rede: instancia o GeminiCog de verdade, troca os clientes
+do Gemini e do HuggingFace por substitutos locais (benchmarks/stubs.py) e dispara mensagens
+sintéticas no `on_message` em ritmo e concorrência configuráveis.
+
+Relata vazão, percentis de latência de ponta a ponta e até a primeira resposta, atraso do
+event loop, memória e as métricas por etapa coletadas pelo próprio bot. Histórico, estado
+compartilhado, índice do acervo e caches em disco ficam em um diretório temporário.
+
+Uso: python -m benchmarks.load_test --mensagens 2000 --taxa 200 --concorrencia 100
+     python -m benchmarks.load_test --help   (todas as opções)
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from benchmarks.stubs import (
+    FakeBot, FakeChannel, FakeGuild, FakeMessage, FakeUser, LatencyModel,
+    StubGeminiModel, StubInferenceClient,
+)
+
+# O cog exige as chaves, mas nenhuma chamada real é feita
+os.environ.setdefault("GOOGLE_API_KEY", "offline")
+os.environ.setdefault("HUGGINGFACE_TOKEN", "offline")
+
+ERROR_PREFIXES = ("❌", "⚠️", "⏳", "Desculpe")
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopLagMonitor:
+    """Mede o atraso do event loop: quanto um `sleep` curto passa do tempo pedido."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Teste de carga offline do GeminiCog")
+    parser.add_argument("--mensagens", type=int, default=1000, help="total de mensagens sintéticas")
+    parser.add_argument("--taxa", type=float, default=100.0, help="mensagens por segundo (chegada aberta)")
+    parser.add_argument("--concorrencia", type=int, default=200, help="mensagens em atendimento ao mesmo tempo")
+    parser.add_argument("--usuarios", type=int, default=500)
+    parser.add_argument("--servidores", type=int, default=20)
+    parser.add_argument("--canais", type=int, default=5, help="canais por servidor")
+    parser.add_argument("--imagens", type=float, default=0.02, help="fração de pedidos de imagem")
+    parser.add_argument("--repetidas", type=float, default=0.2, help="fração de perguntas repetidas")
+    parser.add_argument("--gemini-ms", type=float, default=800, help="latência mediana do modelo pesado")
+    parser.add_argument("--rapido-ms", type=float, default=300, help="latência mediana do modelo rápido")
+    parser.add_argument("--analises", type=float, default=0.1, help="fração de pedidos longos e analíticos")
+    parser.add_argument("--gemini-erros", type=float, default=0.01, help="taxa de erros do Gemini")
+    parser.add_argument("--partes-ms", type=float, default=50, help="intervalo entre partes no streaming")
+    parser.add_argument("--imagem-ms", type=float, default=3000, help="latência mediana do HuggingFace")
+    parser.add_argument("--imagem-erros", type=float, default=0.02, help="taxa de erros do HuggingFace")
+    parser.add_argument("--discord-ms", type=float, default=60, help="latência mediana da API do Discord")
+    parser.add_argument("--sigma", type=float, default=0.5, help="dispersão das latências log-normais")
+    parser.add_argument("--cache", action="store_true", help="mantém os caches de respostas e imagens ativos")
+    parser.add_argument("--sem-limite", action="store_true", help="desativa o controle de admissão")
+    parser.add_argument("--sem-streaming", action="store_true", help="responde em uma única mensagem")
+    parser.add_argument("--sem-agrupamento", action="store_true", help="responde cada mensagem sem esperar continuação")
+    parser.add_argument("--sem-historico", action="store_true", help="não grava o histórico de interações")
+    parser.add_argument("--tracemalloc", action="store_true", help="mede alocações Python (mais lento)")
+    parser.add_argument("--semente", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def isolated_config(workdir: str) -> Dict:
+    """Configuração do bot com tudo o que é gravado em disco apontando para `workdir`."""
+    from utils.config import load_config
+
+    config = load_config()
+    config.setdefault("historico", {})["arquivo"] = os.path.join(workdir, "historico.sqlite3")
+    config.setdefault("estado_compartilhado", {})["arquivo"] = os.path.join(workdir, "estado.sqlite3")
+    config.setdefault("acervo", {})["pasta_indice"] = os.path.join(workdir, "acervo")
+    config.setdefault("imagens", {})["pasta_cache"] = os.path.join(workdir, "imagens")
+    if config.get("cache", {}).get("arquivo_sqlite"):
+        config["cache"]["arquivo_sqlite"] = os.path.join(workdir, "cache.sqlite3")
+    return config
+
+
+async def build_cog(args: argparse.Namespace, rng: random.Random, workdir: str):
+    import cogs.gemini_cog as gemini_cog
+    from utils.logger import Logger
+    from utils.personas import PERSONAS
+
+    # O pipeline de logging é criado uma única vez por processo, com o arquivo do primeiro
+    # Logger: criado aqui, o log do teste fica no diretório temporário e não no bot.log
+    Logger("GeminiCog", os.path.join(workdir, "bot.log"))
+    bot = FakeBot()
+    # Históricos, índices e caches do teste vão para um diretório temporário, nunca para os
+    # arquivos que o bot de verdade usa (e que o `!historico` lê)
+    config = isolated_config(workdir)
+    load_config = gemini_cog.load_config
+    gemini_cog.load_config = lambda: config
+    try:
+        cog = gemini_cog.GeminiCog(bot)
+    finally:
+        gemini_cog.load_config = load_config
+    # Só avisos e erros no log durante o teste
+    logging.getLogger("GeminiCog").setLevel(logging.WARNING)
+
+    gemini = StubGeminiModel(
+        LatencyModel(args.gemini_ms / 1000, args.sigma, args.gemini_erros, rng),
+        LatencyModel(args.partes_ms / 1000, args.sigma, 0.0, rng)
+    )
+    fast = StubGeminiModel(
+        LatencyModel(args.rapido_ms / 1000, args.sigma, args.gemini_erros, rng),
+        LatencyModel(args.partes_ms / 1000, args.sigma, 0.0, rng),
+        answer_words=150
+    )
+    cog.models = {(cog.model_name, name): gemini for name in PERSONAS}
+    cog.models.update({(cog.fast_model_name, name): fast for name in PERSONAS})
+    cog.hf_client = StubInferenceClient(LatencyModel(args.imagem_ms / 1000, args.sigma, args.imagem_erros, rng))
+
+    if not args.cache:
+        cog.response_cache = None
+        cog.image_cache = None
+    if args.sem_limite:
+        cog.rate_limiter = None
+    if args.sem_streaming:
+        cog.streaming = False
+    if args.sem_historico:
+        cog.history = None
+    if args.sem_agrupamento:
+        cog.debouncer = None
+
+    await cog.cog_load()
+    return bot, cog, gemini, fast
+
+
+def synthesize(args: argparse.Namespace, rng: random.Random) -> List[FakeMessage]:
+    discord_latency = LatencyModel(args.discord_ms / 1000, args.sigma, 0.0, rng)
+    guilds = [FakeGuild(100 + i) for i in range(args.servidores)]
+    channels = [
+        FakeChannel(10_000 + g * args.canais + c, guild, discord_latency)
+        for g, guild in enumerate(guilds) for c in range(args.canais)
+    ]
+    users = [FakeUser(1_000_000 + i, f"usuario{i}") for i in range(args.usuarios)]
+    frequent = [f"o que diz o artigo {n} do código civil?" for n in range(20)]
+
+    messages = []
+    for i in range(args.mensagens):
+        roll = rng.random()
+        if roll < args.imagens:
+            content = f"samer imagem balança da justiça estilo {rng.randint(1, 50)}"
+        elif roll < args.imagens + args.analises:
+            content = (
+                f"samer, analise o caso {i}: o locatário deixou de pagar {rng.randint(2, 12)} aluguéis e o "
+                "fiador alega que a fiança se extinguiu com a prorrogação do contrato. Compare as posições "
+                "da doutrina e da jurisprudência e diga qual tese deve prevalecer."
+            )
+        elif roll < args.imagens + args.analises + args.repetidas:
+            content = f"samer, {rng.choice(frequent)}"
+        else:
+            content = f"samer, pergunta {i}: qual o prazo do recurso {rng.randint(1, 10**6)}?"
+        messages.append(FakeMessage(content, rng.choice(users), rng.choice(channels)))
+    return messages
+
+
+async def run(args: argparse.Namespace, workdir: str):
+    rng = random.Random(args.semente)
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    bot, cog, gemini, fast = await build_cog(args, rng, workdir)
+    messages = synthesize(args, rng)
+    semaphore = asyncio.Semaphore(args.concorrencia)
+    latencies: List[float] = []
+    first_reply: List[float] = []
+    outcomes = {"ok": 0, "erro": 0, "sem_resposta": 0}
+    error_texts = ERROR_PREFIXES + tuple(cog.messages.values())
+
+    arrivals: Dict[int, float] = {}
+
+    async def handle(message: FakeMessage):
+        # A latência conta desde a chegada, incluindo a espera por uma vaga
+        arrived = arrivals[message.id] = time.perf_counter()
+        async with semaphore:
+            await cog.on_message(message)
+        latencies.append(time.perf_counter() - arrived)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    gc.collect()
+    started = time.perf_counter()
+    tasks = []
+    for index, message in enumerate(messages):
+        delay = started + index / args.taxa - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(handle(message)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    # Só no fim: perguntas agrupadas são respondidas na última mensagem, por outra tarefa
+    for message in messages:
+        if message.first_reply_at is not None:
+            first_reply.append(message.first_reply_at - arrivals[message.id])
+        if not message.replies:
+            outcomes["sem_resposta"] += 1
+        elif any(reply.content.startswith(error_texts) for reply in message.replies):
+            outcomes["erro"] += 1
+        else:
+            outcomes["ok"] += 1
+
+    peak_traced = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    history = cog.history.stats() if cog.history else None
+    merged = cog.debouncer.stats()["merged"] if cog.debouncer else 0
+    await cog.cog_unload()
+
+    report(args, elapsed, latencies, first_reply, outcomes, monitor.samples, gemini, fast, cog,
+           rss_before, rss_after, peak_traced, history, merged)
+
+
+def report(args, elapsed, latencies, first_reply, outcomes, lag, gemini, fast, cog,
+           rss_before, rss_after, peak_traced, history, merged):
+    from utils.metrics import metrics
+
+    def line(label: str, values: List[float]):
+        print(
+            f"  {label:<26} p50 {percentile(values, 0.5) * 1000:>8.1f}  p95 {percentile(values, 0.95) * 1000:>8.1f}"
+            f"  p99 {percentile(values, 0.99) * 1000:>8.1f}  máx {max(values, default=0) * 1000:>8.1f} ms"
+        )
+
+    print(f"\n{args.mensagens} mensagens em {elapsed:.1f}s ({args.taxa:g}/s pedidas, concorrência {args.concorrencia})")
+    print(f"  Vazão: {len(latencies) / elapsed:.1f} mensagens/s")
+    print(f"  Resultados: {outcomes['ok']} ok, {outcomes['erro']} com erro, {outcomes['sem_resposta']} sem resposta "
+          f"({merged} agrupadas em outra pergunta)")
+    print(f"  Chamadas aos substitutos: Gemini pesado {gemini.calls} ({gemini.errors} falhas), "
+          f"rápido {fast.calls} ({fast.errors} falhas), "
+          f"HuggingFace {cog.hf_client.calls} ({cog.hf_client.errors} falhas)")
+    print("Latências:")
+    line("ponta a ponta", latencies)
+    line("até a primeira resposta", first_reply)
+    line("atraso do event loop", lag)
+    # ru_maxrss é em KB no Linux
+    print(f"Memória: pico do processo {rss_after / 1024:.0f} MB (+{(rss_after - rss_before) / 1024:.0f} MB durante o teste)")
+    if peak_traced is not None:
+        print(f"  Pico de alocações Python (tracemalloc): {peak_traced / 1024 / 1024:.1f} MB")
+    if history is not None:
+        print(f"Histórico: {history['written']} registros gravados em {history['batches']} lotes, "
+              f"{history['dropped']} descartados")
+
+    stages = metrics.histograms().get("etapa_segundos", {})
+    if stages:
+        print("Etapas medidas pelo bot:")
+        for labels, histogram in sorted(stages.items()):
+            if histogram.count:
+                print(
+                    f"  {dict(labels).get('etapa', ''):<26} n {histogram.count:>7}"
+                    f"  p50 {histogram.quantile(0.5) * 1000:>8.1f}  p95 {histogram.quantile(0.95) * 1000:>8.1f}"
+                    f"  p99 {histogram.quantile(0.99) * 1000:>8.1f} ms"
+                )
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.taxa <= 0 or args.concorrencia <= 0:
+        sys.exit("--taxa e --concorrencia devem ser positivos")
+    with tempfile.TemporaryDirectory(prefix="load_test") as workdir:
+        asyncio.run(run(args, workdir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# benchmarks/stubs.py
+"""
+Substitutos locais do Discord, do Gemini e do HuggingFace para os benchmarks: imitam apenas
+a parte das APIs usada pelo GeminiCog, com latência e taxa de erros configuráveis, sem
+nenhuma chamada de rede.
+"""
+
+import asyncio
+import itertools
+import math
+import random
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+_ids = itertools.count(10_000_000)
+
+
+class StubBackendError(RuntimeError):
+    """Falha simulada de um serviço externo."""
+
+
+class LatencyModel:
+    """Latências log-normais em torno da mediana (em segundos) e uma probabilidade de erro."""
+
+    def __init__(self, median: float, sigma: float = 0.5, error_rate: float = 0.0,
+                 rng: Optional[random.Random] = None):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.rng.lognormvariate(math.log(self.median), self.sigma)
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and self.rng.random() < self.error_rate
+
+
+# --- Discord -----------------------------------------------------------------------------
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str, bot: bool = False):
+        self.id = user_id
+        self.name = name
+        self.bot = bot
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+
+class _Typing:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, guild: Optional[FakeGuild], latency: LatencyModel):
+        self.id = channel_id
+        self.name = f"canal-{channel_id}"
+        self.guild = guild
+        self.latency = latency
+        self.sent = 0
+        self.edits = 0
+
+    def typing(self) -> _Typing:
+        return _Typing()
+
+
+class FakeMessage:
+    """Mensagem recebida ou enviada. `reply` e `edit` custam uma latência simulada da API."""
+
+    def __init__(self, content: str, author: FakeUser, channel: FakeChannel):
+        self.id = next(_ids)
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.mentions: List[FakeUser] = []
+        self.reference = None
+        self.replies: List["FakeMessage"] = []
+        self.first_reply_at: Optional[float] = None
+
+    async def reply(self, content: Optional[str] = None, file: Any = None, **kwargs) -> "FakeMessage":
+        await asyncio.sleep(self.channel.latency.sample())
+        self.channel.sent += 1
+        if self.first_reply_at is None:
+            self.first_reply_at = time.perf_counter()
+        sent = FakeMessage(content or "", FakeUser(0, "bot", bot=True), self.channel)
+        sent.file = file
+        self.replies.append(sent)
+        return sent
+
+    async def edit(self, content: Optional[str] = None, **kwargs):
+        await asyncio.sleep(self.channel.latency.sample())
+        self.channel.edits += 1
+        if content is not None:
+            self.content = content
+
+    async def delete(self):
+        await asyncio.sleep(self.channel.latency.sample())
+
+
+class FakeBot:
+    """O mínimo do commands.Bot que o cog consulta: o usuário do bot e o prefixo dos comandos."""
+
+    def __init__(self, user_id: int = 1):
+        self.user = FakeUser(user_id, "Samélio", bot=True)
+        self.command_prefix = "!"
+
+
+# --- Gemini ------------------------------------------------------------------------------
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Response:
+    def __init__(self, chunks: List[str], prompt: str, delay: LatencyModel, stream: bool):
+        self._chunks = chunks
+        self._delay = delay
+        self._stream = stream
+        self.text = "".join(chunks)
+        self.usage_metadata = _Usage(len(prompt) // 4 + 1, len(self.text) // 4 + 1)
+
+    def __aiter__(self) -> AsyncIterator[_Chunk]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[_Chunk]:
+        for index, text in enumerate(self._chunks):
+            if index:
+                await asyncio.sleep(self._delay.sample())
+            yield _Chunk(text)
+
+
+class _StubChat:
+    def __init__(self, model: "StubGeminiModel"):
+        self.model = model
+
+    async def send_message_async(self, content: str, generation_config: Any = None,
+                                 stream: bool = False) -> _Response:
+        model = self.model
+        model.calls += 1
+        # Com streaming a latência simulada é a do primeiro trecho
+        await asyncio.sleep(model.latency.sample())
+        if model.latency.fails():
+            model.errors += 1
+            raise StubBackendError("Falha simulada do Gemini")
+        words = model.answer.split(" ")
+        size = max(1, math.ceil(len(words) / model.chunks))
+        chunks = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        return _Response(chunks, content, model.chunk_latency, stream)
+
+
+class StubGeminiModel:
+    """Substitui `genai.GenerativeModel`: responde um texto fixo, em `chunks` partes no streaming."""
+
+    def __init__(self, latency: LatencyModel, chunk_latency: LatencyModel,
+                 answer_words: int = 300, chunks: int = 10):
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chunks = chunks
+        self.answer = " ".join(f"palavra{i % 97}" for i in range(answer_words))
+        self.calls = 0
+        self.errors = 0
+
+    def start_chat(self, history: Optional[list] = None) -> _StubChat:
+        return _StubChat(self)
+
+
+# --- HuggingFace -------------------------------------------------------------------------
+
+class StubInferenceClient:
+    """Substitui o `InferenceClient`: chamada bloqueante, como a original, que devolve uma imagem."""
+
+    def __init__(self, latency: LatencyModel, size: int = 512):
+        self.latency = latency
+        self.size = size
+        self.calls = 0
+        self.errors = 0
+
+    def text_to_image(self, prompt: str):
+        from PIL import Image
+
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        if self.latency.fails():
+            self.errors += 1
+            raise StubBackendError("Falha simulada do HuggingFace")
+        # Ruído para que a codificação tenha um custo realista (imagens lisas comprimem demais)
+        seed = hash(prompt) & 0xFFFF
+        return Image.effect_noise((self.size, self.size), 40 + seed % 30).convert("RGB")
@@ -0,0 +1,108 @@
+# benchmarks/trigger_matching.py
+"""
+Micro-benchmark do reconhecimento de gatilhos: compara a implementação antiga de
+`should_respond` + limpeza do `on_message` com o TriggerMatcher compilado, sobre um fluxo
+sintético de mensagens em que a grande maioria não é dirigida ao bot.
+
+Uso: python -m benchmarks.trigger_matching [quantidade_de_mensagens]
+"""
+
+import random
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from utils.triggers import TriggerMatcher
+
+BOT_ID = 123456789012345678
+OTHER_ID = 987654321098765432
+
+WORDS = (
+    "direito contrato prazo recurso processo audiência juiz sentença lei artigo código "
+    "civil penal trabalhista hoje amanhã alguém sabe como funciona isso aquilo obrigado "
+    "kkkk bom dia boa noite galera pessoal link vídeo jogo partida samerica"
+).split()
+
+
+def legacy(content: str, mentioned: bool, reply_to_bot: bool) -> Optional[str]:
+    """Reprodução da lógica anterior, sem os objetos do discord.py."""
+    lowered = content.strip().lower()
+    activation_phrases = ['samer', f'<@{BOT_ID}>', f'<@!{BOT_ID}>']
+    starts_with_activation = any(lowered.startswith(phrase + ' ') or
+                                 lowered.startswith(phrase + ',') or
+                                 lowered.startswith(phrase + ':') or
+                                 lowered.startswith(phrase + '?') or
+                                 lowered.startswith(phrase + '!')
+                                 for phrase in activation_phrases)
+    if not (mentioned or starts_with_activation or reply_to_bot):
+        return None
+
+    if mentioned:
+        content = content.replace(f'<@{BOT_ID}>', '').strip()
+    content_lower = content.lower()
+    for phrase in activation_phrases:
+        if content_lower.startswith(phrase):
+            parts = content.split(None, 1)
+            content = parts[1].strip() if len(parts) > 1 else ''
+            break
+    return content
+
+
+def firehose(count: int, seed: int = 42) -> List[Tuple[str, bool, bool]]:
+    """Gera (conteúdo, menciona o bot, é resposta ao bot): ~95% das mensagens não são para o bot."""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 30)))
+        roll = rng.random()
+        if roll < 0.02:
+            messages.append((f"samer, {text}", False, False))
+        elif roll < 0.035:
+            messages.append((f"<@{BOT_ID}> {text}", True, False))
+        elif roll < 0.04:
+            messages.append((text, False, True))
+        elif roll < 0.06:
+            # Menções a outras pessoas: precisam ser rejeitadas também
+            messages.append((f"<@{OTHER_ID}> {text}", False, False))
+        else:
+            messages.append((text, False, False))
+    return messages
+
+
+def measure(label: str, func, messages) -> float:
+    started = time.perf_counter()
+    for message in messages:
+        func(message)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22}{elapsed * 1e9 / len(messages):>10.0f} ns/mensagem")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    messages = firehose(count)
+    matcher = TriggerMatcher(BOT_ID, ["samer"])
+
+    # As duas implementações precisam concordar antes de comparar os tempos
+    fixed = 0
+    for content, mentioned, reply in messages:
+        expected = legacy(content, mentioned, reply)
+        result = matcher.match(content, reply)
+        assert (expected is None) == (result is None), content
+        if expected is not None and expected.split() != result.split():
+            # A versão antiga cortava a primeira palavra de respostas como "samerica ...";
+            # é a única diferença esperada
+            assert result.split()[1:] == expected.split(), (expected, result)
+            fixed += 1
+
+    print(
+        f"{count} mensagens, {sum(legacy(*m) is not None for m in messages)} para o bot "
+        f"({fixed} com a primeira palavra cortada indevidamente pela versão antiga)"
+    )
+    before = measure("antigo", lambda m: legacy(*m), messages)
+    after = measure("TriggerMatcher", lambda m: matcher.match(m[0], m[2]), messages)
+    print(f"Aceleração: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,22 @@
 # bot.py
 
+import time
+
+# Início do processo, antes das importações pesadas, para o relatório de inicialização
+STARTED = time.perf_counter()
+
+import asyncio
 import os
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 from utils.logger import Logger
-from typing import List
+from utils.config import load_config
+from utils.metrics import MetricsServer, metrics
+from utils.cluster import current_cluster, launch
+from typing import List, Optional, Tuple
+
+IMPORTS_DONE = time.perf_counter()
 
 load_dotenv()
 
@@ -24,24 +35,45 @@ intents.message_content = True  # Necessário para ler o conteúdo das mensagens
 intents.guilds = True
 intents.members = True  # Necessário se você planeja acessar informações de membros
 
-class DiscordBot(commands.Bot):
-    def __init__(self):
+class DiscordBot(commands.AutoShardedBot):
+    def __init__(self, shard_ids: Optional[List[int]] = None, shard_count: Optional[int] = None):
+        # Sem shard_ids/shard_count o discord.py usa a quantidade de shards recomendada pelo Discord
         super().__init__(
             command_prefix="!",
             intents=intents,
             help_command=None,
-            case_insensitive=True
+            case_insensitive=True,
+            shard_ids=shard_ids,
+            shard_count=shard_count
         )
         self.logger = logger
+        self.cluster_id = current_cluster()
+        # Relógio da inicialização: desconta a espera escalonada dos clusters, contando só as importações
+        self.boot_started = time.perf_counter() - (IMPORTS_DONE - STARTED)
+        self.connected = False
+        
+        # Métricas (seção "metricas" do config_bot.json): o endpoint HTTP é opcional e local
+        metricas = load_config().get("metricas", {})
+        metrics.enabled = metricas.get("ativado", True)
+        self.metrics_server = MetricsServer(
+            metrics,
+            host=metricas.get("endereco", "127.0.0.1"),
+            # Cada cluster de shards expõe as métricas na porta seguinte
+            port=(metricas.get("porta_http") or 0) + (self.cluster_id or 0)
+        ) if metrics.enabled and metricas.get("porta_http") else None
 
     async def setup_hook(self):
         """Configurações iniciais do bot."""
         try:
-            # Carrega todos os cogs da pasta 'cogs', exceto '__init__.py'
-            for filename in os.listdir('./cogs'):
-                if filename.endswith('.py') and filename != '__init__.py':
-                    await self.load_extension(f'cogs.{filename[:-3]}')
-                    self.logger.info(f"Cog {filename} carregado com sucesso!")
+            # Carrega todos os cogs da pasta 'cogs', exceto '__init__.py', ao mesmo tempo: a parte
+            # assíncrona de cada um (cog_load) não espera pelos outros
+            cogs_started = time.perf_counter()
+            filenames = sorted(
+                filename for filename in os.listdir('./cogs')
+                if filename.endswith('.py') and filename != '__init__.py'
+            )
+            timings = await asyncio.gather(*(self.load_cog(filename) for filename in filenames))
+            cogs_elapsed = time.perf_counter() - cogs_started
             
             # Adiciona um comando de ajuda personalizado
             @self.command(name="ajuda")
@@ -51,21 +83,81 @@ class DiscordBot(commands.Bot):
                     "**Comandos Disponíveis:**\n"
                     "`!ajuda` - Exibe esta mensagem de ajuda.\n"
                     "`!config [temperatura] [top_p] [top_k] [max_tokens]` - Configura os parâmetros do modelo (administradores).\n"
-                    "`!logs [linhas]` - Mostra as últimas linhas do log (administradores).\n"
+                    "`!config modelo [auto|rapido|pesado]` - Mostra ou altera o roteamento entre o modelo rápido e o pesado neste servidor (administradores).\n"
+                    "`!logs [linhas] [nivel=] [logger=] [desde=] [ate=]` - Mostra as últimas linhas do log, com filtros opcionais (administradores).\n"
+                    "`!cache [limpar]` - Mostra as estatísticas do cache de respostas ou o limpa (administradores).\n"
+                    "`!status` - Mostra o estado dos serviços externos (administradores).\n"
+                    "`!stats` - Mostra latências por etapa, erros e tokens consumidos (administradores).\n"
+                    "`!fila` - Mostra a ocupação e o tempo de espera da fila do Gemini (administradores).\n"
+                    "`!persona [nome]` - Mostra ou altera a persona usada neste servidor (administradores).\n"
+                    "`!historico [@usuario] [quantidade]` - Mostra as últimas interações do servidor ou de um usuário (administradores).\n"
+                    "`!esquecer` - Encerra sua conversa neste canal e começa do zero.\n"
                     "`!convite` - Gera um link de convite para adicionar o bot a outros servidores.\n"
-                    "`!imagem <prompt>` - Gera uma imagem com base no prompt fornecido."
+                    "`!imagem <prompt>` - Gera uma imagem com base no prompt fornecido.\n"
+                    "`!cancelar` - Cancela seus pedidos de imagem que ainda estão na fila."
                 )
                 await ctx.send(help_text)
-                self.logger.info(f"Comando de ajuda utilizado por {ctx.author}")
+                self.logger.info("Comando de ajuda utilizado por %s", ctx.author)
             
-            self.logger.info("Todos os cogs foram carregados com sucesso!")
+            loaded = [(filename, elapsed) for filename, elapsed in timings if elapsed is not None]
+            if len(loaded) == len(filenames):
+                self.logger.info("Todos os cogs foram carregados com sucesso!")
+            
+            if metrics.enabled:
+                self.logger.info("Custo medido de cada medição de latência: ~%.0f ns", metrics.calibrate())
+            if self.metrics_server:
+                await self.metrics_server.start()
+                self.logger.info(
+                    "Métricas disponíveis em http://%s:%s/metrics",
+                    self.metrics_server.host, self.metrics_server.port
+                )
+            
+            self.logger.info(
+                "Inicialização: importações %.0f ms | cogs %.0f ms (%s) | pronto para conectar em %.0f ms",
+                (IMPORTS_DONE - STARTED) * 1000, cogs_elapsed * 1000,
+                ", ".join(f"{filename} {elapsed * 1000:.0f} ms" for filename, elapsed in loaded),
+                (time.perf_counter() - self.boot_started) * 1000
+            )
             
         except Exception as e:
             self.logger.error(f"Erro ao carregar cogs: {str(e)}", exc_info=True)
 
+    async def load_cog(self, filename: str) -> Tuple[str, Optional[float]]:
+        """Carrega um cog e retorna quanto tempo levou (None se falhou, sem impedir os demais)."""
+        started = time.perf_counter()
+        try:
+            await self.load_extension(f'cogs.{filename[:-3]}')
+        except Exception as e:
+            self.logger.error(f"Erro ao carregar o cog {filename}: {str(e)}", exc_info=True)
+            return filename, None
+        self.logger.info("Cog %s carregado com sucesso!", filename)
+        return filename, time.perf_counter() - started
+
+    async def invoke(self, ctx: commands.Context):
+        """Executa o comando registrando sua duração."""
+        name = ctx.command.qualified_name if ctx.command else "desconhecido"
+        with metrics.timer("comando_segundos", comando=name):
+            await super().invoke(ctx)
+
+    async def close(self):
+        """Encerra o endpoint de métricas junto com o bot."""
+        if self.metrics_server:
+            await self.metrics_server.close()
+        await super().close()
+
     async def on_ready(self):
         """Evento chamado quando o bot está online."""
-        self.logger.info(f"{self.user} está online e conectado em {len(self.guilds)} servidores!")
+        if not self.connected:
+            self.connected = True
+            self.logger.info(
+                "Conectado ao Discord %.0f ms após o início do processo",
+                (time.perf_counter() - self.boot_started) * 1000
+            )
+        self.logger.info(
+            "%s está online e conectado em %d servidores com %d shard(s)%s!",
+            self.user, len(self.guilds), len(self.shards),
+            f" (cluster {self.cluster_id})" if self.cluster_id is not None else ""
+        )
         await self.change_presence(
             activity=discord.Activity(
                 type=discord.ActivityType.watching,
@@ -73,6 +165,10 @@ class DiscordBot(commands.Bot):
             )
         )
 
+    async def on_shard_ready(self, shard_id: int):
+        """Evento chamado quando um shard conclui a conexão com o gateway."""
+        self.logger.info("Shard %d pronto", shard_id)
+
     async def on_command_error(self, ctx: commands.Context, error: commands.CommandError):
         """Tratamento de erros de comandos."""
         if isinstance(error, commands.MissingPermissions):
@@ -82,12 +178,27 @@ class DiscordBot(commands.Bot):
         elif isinstance(error, commands.CommandNotFound):
             await ctx.send("❌ Comando não encontrado. Use `!ajuda` para ver os comandos disponíveis.")
         else:
+            metrics.inc("erros_total", etapa="comando", tipo=type(error).__name__)
             self.logger.error(f"Erro no comando {ctx.command}: {error}", exc_info=True)
             await ctx.send("❌ Ocorreu um erro ao executar o comando.")
 
+def run_cluster(cluster_id: int, shard_ids: List[int], shard_count: int, delay: float):
+    """Roda um cluster de shards em um processo próprio (chamada pelo launcher)."""
+    # Espera os clusters anteriores identificarem seus shards no gateway
+    time.sleep(delay)
+    bot = DiscordBot(shard_ids=shard_ids, shard_count=shard_count)
+    bot.run(TOKEN)
+
 def main():
     """Função principal para iniciar o bot."""
-    bot = DiscordBot()
+    # Seção "fragmentacao": com mais de um processo, cada um atende um bloco de shards
+    fragmentacao = load_config().get("fragmentacao", {})
+    processes = fragmentacao.get("processos", 1)
+    shard_count = fragmentacao.get("shards")
+    if processes > 1:
+        launch(run_cluster, TOKEN, processes, shard_count, logger=logger)
+        return
+    bot = DiscordBot(shard_count=shard_count)
     bot.run(TOKEN)
 
 if __name__ == "__main__":
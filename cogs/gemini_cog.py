@@ -2,17 +2,48 @@
 
 import discord
 from discord.ext import commands
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
-from utils.logger import Logger
-from typing import Optional, List
-from huggingface_hub import InferenceClient
+from utils.logger import Logger, new_correlation_id
+from utils.metrics import metrics
+from utils.config import load_config
+from utils.scheduler import FairScheduler
+from utils.streaming import StreamingReply
+from utils.delivery import deliver
+from utils.cache import ResponseCache, make_key
+from utils.singleflight import SingleFlight
+from utils.sessions import ChatSessionStore, estimate_tokens
+from utils.personas import PERSONAS, DEFAULT_PERSONA, build_persona
+from utils.rate_limiter import RateLimiter
+from utils.shared_state import SharedRateLimiter, create_state
+from utils.cluster import current_cluster
+from utils.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+from utils.image_queue import ImageJob, ImageJobQueue, JobCancelledError, QueueFullError
+from utils.image_cache import ImageCache
+from utils.interaction_store import InteractionStore
+from utils.legal_index import LegalIndex, format_context
+from utils.model_router import AUTO, FAST, HEAVY, MODES, ModelRouter
+from utils.debounce import MessageDebouncer
+from utils.triggers import TriggerMatcher, split_image_prompt
+from typing import Optional, List, AsyncIterator, Tuple, Dict, Any, TYPE_CHECKING
 import asyncio
+import math
+import multiprocessing
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 
+if TYPE_CHECKING:
+    import google.generativeai as genai
+    from huggingface_hub import InferenceClient
+
 load_dotenv()
 
+# Respostas enviadas no lugar de uma resposta do Gemini
+EMPTY_REPLY = "Desculpe, não consegui gerar uma resposta. Pode reformular sua pergunta?"
+UNAVAILABLE_REPLY = "⚠️ O serviço de IA está temporariamente indisponível. Tente novamente em alguns instantes."
+
 class GeminiCog(commands.Cog, name="Comandos Gemini"):
     """Comandos de IA usando Google Gemini e HuggingFace para suporte jurídico e geração de imagens."""
 
@@ -31,10 +62,165 @@ class GeminiCog(commands.Cog, name="Comandos Gemini"):
             self.logger.error("HUGGINGFACE_TOKEN não encontrada no .env")
             raise ValueError("HUGGINGFACE_TOKEN não encontrada")
         
-        # Configuração do Google Gemini
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
-        self.chats = {}
+        # Limite global de chamadas simultâneas ao Gemini, com fila justa entre servidores
+        self.config = load_config()
+        desempenho = self.config.get("desempenho", {})
+        self.scheduler = FairScheduler(
+            max_concurrent=desempenho.get("max_requisicoes_simultaneas", 4),
+            weights={int(guild_id): peso for guild_id, peso in desempenho.get("pesos_servidores", {}).items()}
+        )
+        
+        # Respostas em streaming, com edições progressivas da mensagem
+        respostas = self.config.get("respostas", {})
+        self.messages = {
+            "error": respostas.get("mensagem_erro", "Desculpe, ocorreu um erro. Por favor, tente novamente."),
+            "timeout": respostas.get("mensagem_timeout", "O tempo limite para resposta foi excedido."),
+        }
+        self.streaming = respostas.get("streaming", True)
+        self.edit_interval = respostas.get("intervalo_edicao", 1.0)
+        
+        # Entrega de respostas longas: trechos agrupados em embeds e, acima do limite, um arquivo .md
+        self.use_embeds = respostas.get("usar_embeds", True)
+        self.attachment_threshold = respostas.get("limite_anexo", 8000)
+        
+        # Estado global do bot (seção "estado_compartilhado"): com vários processos de shards,
+        # limites de taxa, cache e configurações alteradas por comandos valem para todos
+        estado = self.config.get("estado_compartilhado", {})
+        self.state = create_state(estado, multiprocess=current_cluster() is not None)
+        self.sync_interval = estado.get("intervalo_sincronizacao", 5)
+        self.state_versions = {"config": 0, "personas": 0, "modelos": 0}
+        self.sync_task: Optional[asyncio.Task] = None
+        
+        # Cache de respostas para perguntas repetidas (a chave inclui a configuração de geração);
+        # com o estado compartilhado, a camada em disco fica no mesmo arquivo e serve a todos
+        cache_config = self.config.get("cache", {})
+        self.response_cache = ResponseCache(
+            max_entries=cache_config.get("max_entradas", 1024),
+            ttl=cache_config.get("ttl_segundos", 86400),
+            sqlite_path=cache_config.get("arquivo_sqlite") or (self.state.path if self.state.shared else None),
+            max_disk_entries=cache_config.get("max_entradas_disco", 50000)
+        ) if cache_config.get("ativado", True) else None
+        
+        # Agrupamento de requisições idênticas simultâneas (para imagens, feito pela própria fila)
+        self.text_flight = SingleFlight()
+        
+        # Fila dedicada de geração de imagens, com workers e pool de threads próprios
+        imagens = self.config.get("imagens", {})
+        # Uma thread por tentativa (mais a do hedging) para cada worker: tentativas que
+        # estouram o prazo não esgotam o pool das seguintes
+        self.image_queue = ImageJobQueue(
+            workers=imagens.get("workers", 2),
+            max_pending=imagens.get("max_pendentes", 50),
+            threads=imagens.get("workers", 2) * (respostas.get("tentativas_maximas", 3) + 1)
+        )
+        self.default_image_priority = imagens.get("prioridade_padrao", 10)
+        self.image_priorities = {
+            int(guild_id): prioridade for guild_id, prioridade in imagens.get("prioridades_servidores", {}).items()
+        }
+        self.image_status_interval = imagens.get("intervalo_status", 3)
+        
+        # Codificação das imagens em processos separados, no formato e tamanho aceitos pelo Discord
+        self.image_format = imagens.get("formato", "webp")
+        self.image_quality = imagens.get("qualidade", 90)
+        self.upload_limit = int(imagens.get("limite_upload_mb", 10) * 1024 * 1024)
+        self.encoding_processes = imagens.get("processos_codificacao", 1)
+        self.encoding_pool: Optional[ProcessPoolExecutor] = None
+        
+        # Cache em disco das imagens geradas, endereçado por prompt + modelo + formato
+        self.image_cache = ImageCache(
+            imagens.get("pasta_cache", "./cache/imagens"),
+            max_bytes=int(imagens.get("cache_max_mb", 500) * 1024 * 1024)
+        ) if imagens.get("cache_ativado", True) else None
+        
+        # Sessões de conversa por usuário e canal, com histórico limitado
+        sessoes = self.config.get("sessoes", {})
+        self.chats = ChatSessionStore(
+            max_sessions=sessoes.get("max_sessoes", 5000),
+            ttl=sessoes.get("ttl_segundos", 1800),
+            max_history_tokens=sessoes.get("max_tokens_historico", 2000),
+            max_total_tokens=sessoes.get("max_tokens_total", 2_000_000)
+        ) if sessoes.get("ativado", True) else None
+        
+        # Perguntas em várias mensagens seguidas (seção "agrupamento"): o bot espera o usuário
+        # terminar e responde uma única vez, à última mensagem, com o texto completo
+        agrupamento = self.config.get("agrupamento", {})
+        self.debouncer = MessageDebouncer(
+            window=agrupamento.get("janela_segundos", 1.0),
+            typing_window=agrupamento.get("janela_digitando", 5.0),
+            max_wait=agrupamento.get("espera_maxima", 8.0),
+            max_parts=agrupamento.get("max_mensagens", 5),
+            max_chars=agrupamento.get("max_caracteres", 4000),
+            max_open=agrupamento.get("max_pendentes", 10000)
+        ) if agrupamento.get("ativado", True) else None
+        
+        # Controle de admissão (seção "moderacao" do config_bot.json): um token bucket por
+        # usuário, canal e servidor; imagens custam mais que perguntas de texto
+        moderacao = self.config.get("moderacao", {})
+        limits = {
+            "user": (moderacao.get("max_mensagens_minuto", 10), moderacao.get("max_mensagens_minuto", 10) / 60),
+            "channel": (moderacao.get("limite_canal_minuto", 30), moderacao.get("limite_canal_minuto", 30) / 60),
+            "guild": (moderacao.get("limite_servidor_minuto", 120), moderacao.get("limite_servidor_minuto", 120) / 60),
+        }
+        if not moderacao.get("filtro_spam", True):
+            self.rate_limiter = None
+        elif self.state.shared:
+            self.rate_limiter = SharedRateLimiter(self.state, limits)
+        else:
+            self.rate_limiter = RateLimiter(limits)
+        self.text_cost = moderacao.get("custo_texto", 1)
+        self.image_cost = moderacao.get("custo_imagem", 5)
+        # O aviso de limite é enviado no máximo uma vez a cada `intervalo_aviso` segundos por usuário
+        notice_interval = moderacao.get("intervalo_aviso", 5)
+        self.notice_limiter = RateLimiter({"user": (1, 1 / notice_interval)})
+        
+        # Resiliência das chamadas externas: prazo, novas tentativas com jitter, hedging e disjuntor
+        resiliencia = self.config.get("resiliencia", {})
+        self.gemini_resilience = ResilientCaller(
+            "Gemini",
+            timeout=respostas.get("tempo_maximo", 30),
+            max_attempts=respostas.get("tentativas_maximas", 3),
+            backoff_base=resiliencia.get("backoff_base", 0.5),
+            backoff_max=resiliencia.get("backoff_max", 8),
+            breaker=CircuitBreaker(resiliencia.get("falhas_para_abrir", 5), resiliencia.get("tempo_reabertura", 30)),
+            hedging=resiliencia.get("hedging_gemini", True)
+        )
+        self.hf_resilience = ResilientCaller(
+            "HuggingFace",
+            timeout=resiliencia.get("tempo_maximo_imagem", 120),
+            max_attempts=respostas.get("tentativas_maximas", 3),
+            backoff_base=resiliencia.get("backoff_base", 0.5),
+            backoff_max=resiliencia.get("backoff_max", 8),
+            breaker=CircuitBreaker(resiliencia.get("falhas_para_abrir", 5), resiliencia.get("tempo_reabertura", 30)),
+            hedging=resiliencia.get("hedging_imagem", False)
+        )
+        
+        # Histórico persistente de interações e alterações de configuração (seção "historico"),
+        # gravado em lotes por uma tarefa própria, sem atrasar as respostas
+        historico = self.config.get("historico", {})
+        self.history = InteractionStore(
+            historico.get("arquivo", "./cache/historico.sqlite3"),
+            batch_size=historico.get("tamanho_lote", 500),
+            flush_interval=historico.get("intervalo_gravacao", 1.0),
+            max_pending=historico.get("max_pendentes", 20000),
+            retention_days=historico.get("retencao_dias", 90),
+            max_rows=historico.get("max_registros", 500000),
+            compaction_interval=historico.get("intervalo_limpeza", 3600),
+            logger=self.logger
+        ) if historico.get("ativado", True) else None
+        
+        # Acervo jurídico local (seção "acervo"): artigos de lei relevantes para a pergunta vão
+        # junto com ela para o Gemini. Com vários processos, cada um mantém sua cópia do índice
+        acervo = self.config.get("acervo", {})
+        cluster = current_cluster()
+        self.legal_index = LegalIndex(
+            acervo.get("pasta", "./acervo"),
+            os.path.join(acervo.get("pasta_indice", "./cache/acervo"), f"cluster{cluster}" if cluster is not None else ""),
+            max_postings=acervo.get("limite_postings")
+        ) if acervo.get("ativado", True) else None
+        self.legal_top_k = acervo.get("artigos_por_pergunta", 3)
+        self.legal_max_chars = acervo.get("max_caracteres", 3000)
+        self.legal_refresh_interval = acervo.get("intervalo_verificacao", 300)
+        self.legal_task: Optional[asyncio.Task] = None
         
         # Configuração inicial do modelo
         self.generation_config = {
@@ -44,52 +230,257 @@ class GeminiCog(commands.Cog, name="Comandos Gemini"):
             "max_output_tokens": 4096,
         }
         
+        # Configuração do Google Gemini: a persona vai como instrução de sistema, montada uma
+        # única vez por variante, em vez de ser concatenada ao texto de cada pergunta. O SDK é
+        # pesado de importar, então os modelos são criados no primeiro uso (ou no aquecimento
+        # feito em segundo plano no cog_load), sem atrasar a conexão ao Discord
+        ia = self.config.get("ia", {})
+        self.model_name = ia.get("modelo_gemini", "gemini-1.5-pro")
+        self.fast_model_name = ia.get("modelo_rapido", "gemini-1.5-flash")
+        self.models: Dict[Tuple[str, str], "genai.GenerativeModel"] = {}
+        self.guild_personas = {
+            int(guild_id): persona for guild_id, persona in ia.get("personas_servidores", {}).items()
+            if persona in PERSONAS
+        }
+        
+        # Roteamento entre o modelo rápido e o pesado (ia.roteamento), com o orçamento de tokens
+        # de saída ajustado a cada pergunta; `!config modelo` fixa um dos dois por servidor
+        roteamento = ia.get("roteamento", {})
+        self.router = ModelRouter(
+            self.fast_model_name,
+            self.model_name,
+            simple_chars=roteamento.get("limite_simples", 300),
+            heavy_chars=roteamento.get("limite_pesado", 1200),
+            fast_max_tokens=roteamento.get("max_tokens_rapido", 1024),
+            heavy_max_tokens=roteamento.get("max_tokens_pesado", 4096),
+            max_error_rate=roteamento.get("taxa_erro_maxima", 0.3),
+            max_latency=roteamento.get("latencia_maxima", 10),
+            window=roteamento.get("janela", 50),
+            max_age=roteamento.get("validade_amostras", 300)
+        ) if roteamento.get("ativado", True) else None
+        self.guild_routes = {
+            int(guild_id): mode for guild_id, mode in ia.get("roteamento_servidores", {}).items()
+            if mode in MODES
+        }
+        
+        # Tokens de entrada economizados por requisição em relação ao prompt antigo, que era
+        # reenviado indentado junto com cada pergunta (a instrução de sistema ainda conta como
+        # entrada, então a economia vem da compactação e do enquadramento que deixou de existir)
+        self.prompt_savings = {
+            name: estimate_tokens(build_persona(name) + "\n\nUsuário: \nAssistente:") - estimate_tokens(instruction)
+            for name, instruction in PERSONAS.items()
+        }
+        self.prompt_tokens_saved = 0
+        for name, saved in self.prompt_savings.items():
+            self.logger.info(
+                f"Persona '{name}': ~{estimate_tokens(PERSONAS[name])} tokens de instrução | "
+                f"Economia estimada: ~{saved} tokens de entrada por requisição"
+            )
+        
+        # Gatilhos de ativação (seção "gatilhos"): compilados no primeiro uso, já com o bot logado
+        gatilhos = self.config.get("gatilhos", {})
+        self.trigger_names = gatilhos.get("nomes", ["samer"])
+        self.guild_aliases = {
+            int(guild_id): aliases for guild_id, aliases in gatilhos.get("apelidos_servidores", {}).items()
+        }
+        self.triggers: Dict[Optional[int], TriggerMatcher] = {}
+        
+        # HuggingFace InferenceClient: também criado no primeiro pedido de imagem
+        self.image_model = "prashanth970/flux-lora-uncensored"
+        self.hf_client: Optional["InferenceClient"] = None
+        self.warm_up_task: Optional[asyncio.Task] = None
+        
         self.logger.info("GeminiCog inicializado com sucesso")
+        
+        # Métricas por etapa (registro compartilhado com o bot); os gauges só leem o estado
+        # dos componentes quando alguém consulta `!stats` ou o endpoint HTTP
+        self.metrics = metrics
+        self.register_gauges()
 
-        # Configuração do HuggingFace InferenceClient
-        self.hf_client = InferenceClient("prashanth970/flux-lora-uncensored", token=self.hf_token)
-        self.logger.info("HuggingFace InferenceClient configurado com sucesso")
-
-        # Prompt do sistema com exemplos
-        self.system_prompt = """
-        <identity>
-            Você é Samélio, um ex-juiz aposentado que ajuda estudantes a se prepararem para concursos públicos, com conhecimento abrangente em diversas áreas do Direito.
-        </identity>
-        <context>
-            Você fornece respostas precisas e verificadas sobre tópicos jurídicos, utilizando documentos disponíveis, recursos online e APIs. Seu objetivo é ajudar os estudantes a entender conceitos complexos de forma simples e acessível.
-        </context>
-        <task>
-            Responda a perguntas sobre Direito com base em seu conhecimento e nos documentos disponíveis. Forneça explicações claras e concisas, evitando especulações e mantendo um tom amigável.
-        </task>
-        <constraints>
-            - Fale apenas sobre tópicos que você conhece.
-            - Evite respostas genéricas ou não verificadas.
-            - Respeite a privacidade e a confidencialidade das informações.
-            - Utilize algoritmos de verificação de precisão para garantir a exatidão das respostas.
-        </constraints>
-        <examples>
-            <example>
-                <input>
-                    O que é o princípio da legalidade no Direito Penal?
-                </input>
-                <output>
-                    O princípio da legalidade, previsto no artigo 5º, inciso XXXIX da Constituição Federal, estabelece que não há crime nem pena sem uma lei anterior que os defina. Isso significa que uma conduta só pode ser considerada criminosa se houver uma legislação que a tipifique como tal, garantindo assim a segurança jurídica e a proteção dos direitos individuais.
-                </output>
-            </example>
-            <example>
-                <input>
-                    Quais são os requisitos para a validade de um contrato?
-                </input>
-                <output>
-                    Para que um contrato seja considerado válido, ele deve atender aos seguintes requisitos: 
-                    1. Capacidade das partes: ambas devem ser capazes de contratar, ou seja, ter a idade e a sanidade mental necessárias.
-                    2. Objeto lícito: o objeto do contrato deve ser lícito, possível e determinado ou determinável.
-                    3. Forma prescrita ou não defesa em lei: alguns contratos exigem uma forma específica (escrito, por exemplo), enquanto outros podem ser feitos de forma verbal.
-                    4. Consentimento: as partes devem consentir livremente, sem vícios como coação, dolo ou erro.
-                </output>
-            </example>
-        </examples>
-        """
+    def register_gauges(self):
+        """Expõe a ocupação de caches, filas, sessões e disjuntores como gauges."""
+        def scheduler_stats():
+            stats = self.scheduler.stats()
+            return {"em_execucao": stats["in_flight"], "na_fila": stats["queued"], "espera_p95_ms": stats["p95_wait_ms"]}
+        
+        def image_queue_stats():
+            stats = self.image_queue.stats()
+            return {"pendentes": stats["pending"], "em_execucao": stats["running"], "agrupadas": stats["saved"]}
+        
+        def breaker_states():
+            # 0 = fechado, 0.5 = semiaberto, 1 = aberto
+            values = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 0.5, CircuitBreaker.OPEN: 1}
+            return {
+                caller.service: values[caller.breaker.state]
+                for caller in (self.gemini_resilience, self.hf_resilience)
+            }
+        
+        self.metrics.gauge("fila_gemini", scheduler_stats, "Ocupação da fila do Gemini")
+        self.metrics.gauge("fila_imagens", image_queue_stats, "Ocupação da fila de imagens")
+        self.metrics.gauge("disjuntores", breaker_states, "Estado dos disjuntores por serviço")
+        self.metrics.gauge("tokens_economizados", lambda: self.prompt_tokens_saved,
+                           "Tokens de entrada economizados com a instrução de sistema")
+        if self.response_cache:
+            self.metrics.gauge("cache_respostas", lambda: {
+                key: self.response_cache.stats()[key] for key in ("entries", "hits", "disk_hits", "misses")
+            }, "Entradas e acertos do cache de respostas")
+        if self.image_cache:
+            self.metrics.gauge("cache_imagens", lambda: {
+                key: self.image_cache.stats()[key] for key in ("entries", "bytes", "hits", "misses")
+            }, "Arquivos, bytes e acertos do cache de imagens")
+        if self.history:
+            self.metrics.gauge("historico", lambda: {
+                key: self.history.stats()[key] for key in ("pending", "written", "dropped", "removed")
+            }, "Registros do histórico pendentes, gravados, descartados e removidos pela limpeza")
+        if self.legal_index:
+            self.metrics.gauge("acervo", lambda: {
+                key: self.legal_index.stats()[key] for key in ("documents", "terms", "generation")
+            }, "Artigos e termos do acervo jurídico indexado")
+        if self.debouncer:
+            self.metrics.gauge("agrupamento", lambda: {
+                key: self.debouncer.stats()[key] for key in ("open", "merged", "bypassed")
+            }, "Perguntas aguardando continuação e mensagens agrupadas")
+        if self.chats:
+            self.metrics.gauge("sessoes", lambda: {
+                key: self.chats.stats()[key] for key in ("sessions", "tokens")
+            }, "Sessões de conversa ativas e tokens retidos")
+
+    async def cog_load(self):
+        """Inicia os workers da fila de imagens, carrega o estado global e agenda o aquecimento."""
+        self.image_queue.start()
+        # "spawn", como em utils/cluster.py: um fork copiaria o processo no meio de threads
+        # (logs, aquecimento, to_thread) e poderia herdar locks presos
+        self.encoding_pool = ProcessPoolExecutor(
+            max_workers=self.encoding_processes, mp_context=multiprocessing.get_context("spawn")
+        )
+        if self.history:
+            self.history.start()
+        if self.legal_index:
+            self.legal_task = asyncio.create_task(self.legal_index_loop())
+        # Importações pesadas e varredura do cache de imagens rodam enquanto o bot conecta;
+        # até lá, o cache de imagens encontra os arquivos direto no disco
+        self.warm_up_task = asyncio.create_task(self.warm_up())
+        await self.sync_shared_state()
+        if self.state.shared:
+            self.sync_task = asyncio.create_task(self.sync_loop())
+
+    async def cog_unload(self):
+        """Encerra os workers da fila de imagens quando o cog é descarregado."""
+        if self.warm_up_task:
+            self.warm_up_task.cancel()
+        if self.legal_task:
+            self.legal_task.cancel()
+        if self.legal_index:
+            self.legal_index.close()
+        if self.sync_task:
+            self.sync_task.cancel()
+            self.sync_task = None
+        await self.image_queue.close()
+        if self.encoding_pool:
+            self.encoding_pool.shutdown(wait=False, cancel_futures=True)
+            self.encoding_pool = None
+        if self.history:
+            await self.history.close()
+        await self.state.close()
+
+    async def warm_up(self):
+        """Importa os SDKs e cria os clientes fora do event loop, antes da primeira mensagem."""
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.gemini_model, DEFAULT_PERSONA, self.model_name)
+            if self.router:
+                await asyncio.to_thread(self.gemini_model, DEFAULT_PERSONA, self.fast_model_name)
+            await asyncio.to_thread(self.image_client)
+            if self.image_cache:
+                await self.image_cache.load()
+            self.logger.info("Clientes do Gemini e do HuggingFace prontos em %.0f ms", (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            # Sem aquecimento, os clientes são criados na primeira mensagem
+            self.logger.error("Erro ao preparar os clientes: %s", e, exc_info=True)
+
+    def gemini_model(self, persona: str, model_name: str) -> "genai.GenerativeModel":
+        """Retorna o modelo com a persona, importando o SDK e criando o modelo no primeiro uso."""
+        model = self.models.get((model_name, persona))
+        if model is None:
+            import google.generativeai as genai
+            from google.api_core.exceptions import ClientError, TooManyRequests
+            from google.generativeai.types import BlockedPromptException, StopCandidateException
+            
+            # Só agora os tipos de erro do SDK existem: bloqueios de segurança e erros 4xx são
+            # do pedido, não falhas do Gemini (o 429 continua sendo tentado de novo)
+            self.gemini_resilience.non_retryable = (BlockedPromptException, StopCandidateException, ClientError)
+            self.gemini_resilience.retryable = (TooManyRequests,)
+            genai.configure(api_key=self.api_key)
+            model = self.models[(model_name, persona)] = genai.GenerativeModel(
+                model_name, system_instruction=PERSONAS[persona]
+            )
+        return model
+
+    def image_client(self) -> "InferenceClient":
+        """Retorna o cliente do HuggingFace, criando-o no primeiro uso."""
+        if self.hf_client is None:
+            from huggingface_hub import InferenceClient
+            from huggingface_hub.utils import BadRequestError
+            
+            # Prompt recusado pelo modelo (400): repetir não adianta
+            self.hf_resilience.non_retryable = (BadRequestError,)
+            self.hf_client = InferenceClient(self.image_model, token=self.hf_token)
+            self.logger.info("HuggingFace InferenceClient configurado com sucesso")
+        return self.hf_client
+
+    async def legal_index_loop(self):
+        """Indexa o acervo jurídico e o reindexa quando algum arquivo muda."""
+        while True:
+            try:
+                started = time.perf_counter()
+                if await asyncio.to_thread(self.legal_index.refresh):
+                    stats = self.legal_index.stats()
+                    self.logger.info(
+                        "Acervo jurídico indexado em %.0f ms: %d artigos de %d lei(s) (geração %d)",
+                        (time.perf_counter() - started) * 1000, stats["documents"], stats["sources"], stats["generation"]
+                    )
+            except Exception as e:
+                self.logger.error("Erro ao indexar o acervo jurídico: %s", e, exc_info=True)
+            await asyncio.sleep(self.legal_refresh_interval)
+
+    async def ground_prompt(self, question: str) -> str:
+        """Acrescenta à pergunta os artigos do acervo mais relevantes para ela, se houver."""
+        if not self.legal_index:
+            return question
+        # A busca exata leva alguns milissegundos em acervos grandes: fora do event loop
+        with self.metrics.timer("etapa_segundos", etapa="acervo_busca"):
+            articles = await asyncio.to_thread(self.legal_index.search, question, self.legal_top_k)
+        if not articles:
+            return question
+        self.logger.debug("Artigos do acervo: %s", ", ".join(f"{a['source']} {a['label']}" for a in articles))
+        return format_context(articles, self.legal_max_chars) + "Pergunta: " + question
+
+    def cache_namespace(self, guild_id: Optional[int]) -> str:
+        """Parte da chave do cache que muda com a persona e com a versão do acervo indexado."""
+        persona = self.persona_for(guild_id)
+        return f"{persona}:acervo{self.legal_index.version}" if self.legal_index else persona
+
+    async def sync_shared_state(self):
+        """Aplica as alterações de `!config` e `!persona` feitas em qualquer processo."""
+        changed, self.state_versions["config"] = await self.state.changes("config", self.state_versions["config"])
+        if "geracao" in changed:
+            self.generation_config.update(changed["geracao"])
+        changed, self.state_versions["personas"] = await self.state.changes("personas", self.state_versions["personas"])
+        for guild_id, persona in changed.items():
+            if persona in PERSONAS:
+                self.guild_personas[int(guild_id)] = persona
+        changed, self.state_versions["modelos"] = await self.state.changes("modelos", self.state_versions["modelos"])
+        for guild_id, mode in changed.items():
+            if mode in MODES:
+                self.guild_routes[int(guild_id)] = mode
+
+    async def sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync_shared_state()
+            except Exception as e:
+                self.logger.error("Erro ao sincronizar o estado compartilhado: %s", e, exc_info=True)
 
     def get_channel_name(self, channel: discord.abc.GuildChannel) -> str:
         """Retorna o nome do canal de forma segura."""
@@ -102,180 +493,669 @@ class GeminiCog(commands.Cog, name="Comandos Gemini"):
         else:
             return f"#{channel.name}"
 
-    async def get_gemini_response(self, message_content: str, user_id: int) -> str:
+    def persona_for(self, guild_id: Optional[int]) -> str:
+        """Retorna a variante de persona escolhida pelo servidor."""
+        return self.guild_personas.get(guild_id, DEFAULT_PERSONA)
+
+    def model_for(self, guild_id: Optional[int], model_name: Optional[str] = None) -> "genai.GenerativeModel":
+        """Retorna o modelo pré-configurado com a persona do servidor e contabiliza a economia."""
+        persona = self.persona_for(guild_id)
+        self.prompt_tokens_saved += self.prompt_savings[persona]
+        return self.gemini_model(persona, model_name or self.model_name)
+
+    def route_request(self, question: str, history: List[dict],
+                      guild_id: Optional[int]) -> Tuple[str, Dict[str, Any], Optional[Tuple[str, bool]]]:
+        """
+        Escolhe o modelo e a configuração de geração da pergunta. O `max_output_tokens` de
+        `!config` continua sendo o teto; o roteador só o reduz para perguntas simples.
+        A decisão retornada só é contabilizada (`count_route`) se o modelo for chamado.
+        """
+        if not self.router:
+            return self.model_name, self.generation_config, None
+        tier, model_name, budget, diverted = self.router.route(
+            question, len(history) // 2, self.guild_routes.get(guild_id, AUTO)
+        )
+        config = dict(self.generation_config)
+        config["max_output_tokens"] = min(budget, self.generation_config["max_output_tokens"])
+        self.logger.debug("Roteado para %s (%s), até %d tokens", model_name, tier, config["max_output_tokens"])
+        return model_name, config, (tier, diverted)
+
+    def count_route(self, decision: Optional[Tuple[str, bool]]):
+        """Contabiliza a decisão do roteador de uma pergunta que não veio do cache."""
+        if decision is None:
+            return
+        tier, diverted = decision
+        self.router.count(tier, diverted)
+        self.metrics.inc("roteamento_total", nivel=tier)
+
+    def record_model_call(self, model_name: str, ttfb: Optional[float], ok: bool):
+        """
+        Alimenta as estatísticas usadas pelo roteador. A latência comparada é o tempo até o
+        primeiro trecho: a duração total cresce com o tamanho da resposta e faria respostas
+        longas, normais no modelo pesado, parecerem lentidão.
+        """
+        if self.router:
+            self.router.record(model_name, ttfb, ok)
+
+    async def get_gemini_response(self, message_content: str, user_id: int,
+                                  guild_id: Optional[int] = None,
+                                  channel_id: Optional[int] = None) -> str:
         """Obtém resposta do Gemini com base nas instruções personalizadas e tratamento de erros."""
         try:
-            self.logger.info(f"Processando mensagem do usuário {user_id}")
+            self.logger.info("Processando mensagem do usuário %s", user_id)
             
-            # Monta o prompt completo
-            full_prompt = f"{self.system_prompt}\n\nUsuário: {message_content}\nAssistente:"
+            history = self.chats.history(user_id, channel_id) if self.chats else []
+            model_name, config, decision = self.route_request(message_content, history, guild_id)
+            cache_key = make_key(message_content, config, f"{self.cache_namespace(guild_id)}:{model_name}")
             
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=self.generation_config,
-                stream=False
-            )
+            async def generate(key: Optional[str], turns: Optional[List[dict]]) -> str:
+                # Só quando o modelo é chamado: contabiliza a rota e busca os artigos de lei
+                # relevantes, que acompanham a pergunta; o histórico guarda só a pergunta
+                self.count_route(decision)
+                prompt = await self.ground_prompt(message_content)
+                return await self.generate_text(prompt, guild_id, key, turns, model_name, config)
+            
+            if history:
+                # Em uma conversa em andamento a resposta depende do histórico: sem cache
+                text = await generate(None, history)
+            else:
+                text = await self.get_cached_response(cache_key, user_id)
+                if not text:
+                    # Perguntas idênticas feitas ao mesmo tempo compartilham uma única chamada
+                    text = await self.text_flight.do(cache_key, lambda: generate(cache_key, None))
             
-            if response and response.text:
-                self.logger.info(f"Resposta gerada com sucesso para usuário {user_id}")
-                return response.text.strip()
+            if text:
+                self.logger.info("Resposta gerada com sucesso para usuário %s", user_id)
+                if self.chats:
+                    self.chats.record(user_id, channel_id, message_content, text)
+                return text
                 
-            self.logger.warning(f"Resposta vazia gerada para usuário {user_id}")
-            return "Desculpe, não consegui gerar uma resposta. Pode reformular sua pergunta?"
+            self.logger.warning("Resposta vazia gerada para usuário %s", user_id)
+            return EMPTY_REPLY
             
         except Exception as e:
-            self.logger.error(f"Erro ao gerar resposta para usuário {user_id}: {e}", exc_info=True)
-            return "Desculpe, ocorreu um erro. Por favor, tente novamente."
+            self.log_upstream_error(e, user_id)
+            return self.error_message(e)
+
+    def error_message(self, error: Exception) -> str:
+        """Mensagem para o usuário de acordo com o tipo de falha."""
+        if isinstance(error, CircuitOpenError):
+            return UNAVAILABLE_REPLY
+        if isinstance(error, asyncio.TimeoutError):
+            return self.messages["timeout"]
+        return self.messages["error"]
+
+    def log_upstream_error(self, error: Exception, user_id: int):
+        """Registra a falha; com o disjuntor aberto não há stack trace útil para logar."""
+        self.metrics.inc("erros_total", etapa="gemini", tipo=type(error).__name__)
+        if isinstance(error, CircuitOpenError):
+            self.logger.warning("Requisição do usuário %s recusada: %s", user_id, error)
+        else:
+            self.logger.error("Erro ao gerar resposta para usuário %s: %s", user_id, error, exc_info=True)
+
+    async def generate_text(self, message_content: str, guild_id: Optional[int],
+                            cache_key: Optional[str], history: Optional[List[dict]] = None,
+                            model_name: Optional[str] = None,
+                            generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Faz a chamada ao Gemini, com o histórico da conversa, e armazena a resposta no cache."""
+        model_name = model_name or self.model_name
+        model = self.model_for(guild_id, model_name)
+        generation_config = generation_config or self.generation_config
+        
+        # Aguarda uma vaga no agendador e usa a API assíncrona para não bloquear o event loop;
+        # cada tentativa usa uma sessão nova, para que falhas não poluam o histórico
+        async with self.scheduler.slot(guild_id):
+            try:
+                with self.metrics.timer("etapa_segundos", etapa="gemini"):
+                    response = await self.gemini_resilience.call(
+                        lambda: model.start_chat(history=history or []).send_message_async(
+                            message_content,
+                            generation_config=generation_config,
+                            stream=False
+                        )
+                    )
+            except Exception:
+                self.record_model_call(model_name, None, ok=False)
+                raise
+            # Sem streaming não há tempo até o primeiro trecho: conta só para a taxa de erros
+            self.record_model_call(model_name, None, ok=True)
+        
+        self.record_usage(response)
+        if not (response and response.text):
+            return ""
+        
+        text = response.text.strip()
+        if cache_key and self.response_cache:
+            await self.response_cache.set(cache_key, text)
+        return text
+
+    async def stream_gemini_response(self, message_content: str, user_id: int,
+                                     guild_id: Optional[int] = None,
+                                     channel_id: Optional[int] = None) -> AsyncIterator[str]:
+        """Obtém a resposta do Gemini em partes, à medida que é gerada."""
+        self.logger.info("Processando mensagem do usuário %s (streaming)", user_id)
+        
+        history = self.chats.history(user_id, channel_id) if self.chats else []
+        model_name, config, decision = self.route_request(message_content, history, guild_id)
+        cache_key = make_key(message_content, config, f"{self.cache_namespace(guild_id)}:{model_name}")
+        parts = []
+        
+        async def generate(key: Optional[str], turns: Optional[List[dict]]) -> AsyncIterator[str]:
+            # Rota e busca no acervo só para perguntas que de fato vão ao modelo
+            self.count_route(decision)
+            prompt = await self.ground_prompt(message_content)
+            async for text in self.generate_text_stream(prompt, user_id, guild_id, key, turns, model_name, config):
+                yield text
+        
+        if history:
+            # Em uma conversa em andamento a resposta depende do histórico: sem cache
+            stream = generate(None, history)
+        else:
+            cached = await self.get_cached_response(cache_key, user_id)
+            if cached:
+                stream = self._single(cached)
+            else:
+                # Perguntas idênticas feitas ao mesmo tempo recebem as mesmas partes da mesma chamada
+                stream = self.text_flight.stream(cache_key, lambda: generate(cache_key, None))
+        
+        async for text in stream:
+            parts.append(text)
+            yield text
+        
+        if parts and self.chats:
+            self.chats.record(user_id, channel_id, message_content, "".join(parts).strip())
+
+    @staticmethod
+    async def _single(text: str) -> AsyncIterator[str]:
+        yield text
+
+    async def generate_text_stream(self, message_content: str, user_id: int,
+                                   guild_id: Optional[int], cache_key: Optional[str],
+                                   history: Optional[List[dict]] = None,
+                                   model_name: Optional[str] = None,
+                                   generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Faz a chamada ao Gemini em streaming e armazena a resposta completa no cache."""
+        model_name = model_name or self.model_name
+        model = self.model_for(guild_id, model_name)
+        generation_config = generation_config or self.generation_config
+        
+        # A leitura roda em outra tarefa e só ela ocupa a vaga do agendador: editar e enviar
+        # mensagens no Discord (inclusive esperando por 429) não prende uma vaga do Gemini
+        queue: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.ensure_future(self._read_text_stream(
+            queue, message_content, user_id, guild_id, cache_key, history, model, model_name, generation_config
+        ))
+        try:
+            while True:
+                text = await queue.get()
+                if text is None:
+                    break
+                yield text
+            await reader
+        finally:
+            if not reader.done():
+                reader.cancel()
+            elif not reader.cancelled():
+                # Marca o erro como lido quando quem consumia desistiu antes do fim
+                reader.exception()
+
+    async def _read_text_stream(self, queue: asyncio.Queue, message_content: str, user_id: int,
+                                guild_id: Optional[int], cache_key: Optional[str],
+                                history: Optional[List[dict]], model: "genai.GenerativeModel",
+                                model_name: str, generation_config: Dict[str, Any]):
+        """Lê a resposta em streaming para a fila, ocupando a vaga do agendador só durante a leitura."""
+        parts = []
+        try:
+            async with self.scheduler.slot(guild_id):
+                started = time.perf_counter()
+                ttfb = None
+                try:
+                    async for text in self.gemini_resilience.stream(
+                        lambda: self.open_text_stream(model, message_content, history, generation_config)
+                    ):
+                        if ttfb is None:
+                            ttfb = time.perf_counter() - started
+                            self.metrics.observe("etapa_segundos", ttfb, etapa="gemini_ttfb")
+                            self.logger.info("TTFB: %.0f ms | Usuário: %s", ttfb * 1000, user_id)
+                        
+                        parts.append(text)
+                        queue.put_nowait(text)
+                except Exception:
+                    self.record_model_call(model_name, ttfb, ok=False)
+                    raise
+                self.record_model_call(model_name, ttfb, ok=True)
+                self.metrics.observe("etapa_segundos", time.perf_counter() - started, etapa="gemini")
+        finally:
+            # Fim da resposta (ou erro): None avisa quem está consumindo a fila
+            queue.put_nowait(None)
+        
+        # Só armazena respostas que chegaram completas
+        if parts and cache_key and self.response_cache:
+            await self.response_cache.set(cache_key, "".join(parts).strip())
+
+    async def open_text_stream(self, model: "genai.GenerativeModel", message_content: str,
+                               history: Optional[List[dict]],
+                               generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Uma tentativa de chamada em streaming ao Gemini; produz apenas as partes com texto."""
+        chat = model.start_chat(history=history or [])
+        response = await chat.send_message_async(
+            message_content,
+            generation_config=generation_config or self.generation_config,
+            stream=True
+        )
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Parte sem texto (por exemplo, interrompida pelos filtros de segurança)
+                continue
+            if text:
+                yield text
+        # Com a resposta consumida por inteiro, o uso de tokens fica disponível
+        self.record_usage(response)
+
+    def record_usage(self, response):
+        """Contabiliza os tokens de entrada e saída informados pelo Gemini."""
+        usage = getattr(response, "usage_metadata", None)
+        if not usage:
+            return
+        self.metrics.inc("gemini_tokens_total", getattr(usage, "prompt_token_count", 0) or 0, tipo="entrada")
+        self.metrics.inc("gemini_tokens_total", getattr(usage, "candidates_token_count", 0) or 0, tipo="saida")
 
-    async def generate_image(self, prompt: str) -> Optional[discord.File]:
+    async def get_cached_response(self, cache_key: str, user_id: int) -> Optional[str]:
+        """Consulta o cache de respostas, sem deixar falhas do cache interromperem o atendimento."""
+        if not self.response_cache:
+            return None
+        try:
+            cached = await self.response_cache.get(cache_key)
+        except Exception as e:
+            self.logger.error("Erro ao consultar o cache de respostas: %s", e, exc_info=True)
+            return None
+        if cached:
+            self.logger.info("Resposta obtida do cache para usuário %s", user_id)
+        return cached
+
+    async def reply_streaming(self, message: discord.Message, content: str) -> Optional[str]:
         """
-        Gera uma imagem usando o HuggingFace e retorna como um discord.File.
-        Retorna None se ocorrer um erro.
+        Responde à mensagem publicando o texto conforme o Gemini o gera. Retorna a resposta
+        completa, ou None se ela veio vazia ou foi interrompida por um erro.
         """
+        reply = StreamingReply(message, limit=1900, edit_interval=self.edit_interval)
+        parts = []
         try:
-            self.logger.info(f"Iniciando geração de imagem para prompt: {prompt}")
-            # Chamada síncrona, então executa em um executor para não bloquear o event loop
-            image = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: self.hf_client.text_to_image(prompt)
-            )
-            
-            if image:
-                # Salva a imagem em BytesIO
-                img_byte_arr = BytesIO()
-                image.save(img_byte_arr, format='PNG')
-                img_byte_arr.seek(0)
-                
-                discord_file = discord.File(fp=img_byte_arr, filename='image.png')
-                self.logger.info("Imagem gerada com sucesso")
-                return discord_file
-            else:
-                self.logger.warning("Imagem gerada está vazia")
+            async for text in self.stream_gemini_response(
+                content,
+                message.author.id,
+                message.guild.id if message.guild else None,
+                message.channel.id
+            ):
+                parts.append(text)
+                await reply.feed(text)
+        except Exception as e:
+            self.log_upstream_error(e, message.author.id)
+            if not reply.has_content:
+                await message.reply(self.error_message(e))
                 return None
-                
+            await reply.feed("\n\n⚠️ A resposta foi interrompida por um erro.")
+            parts = []
+        
+        await reply.finish()
+        
+        if reply.messages:
+            self.logger.info("Resposta enviada com sucesso em %d mensagem(ns)", len(reply.messages))
+            return "".join(parts).strip() or None
+        self.logger.warning("Resposta vazia gerada para usuário %s", message.author.id)
+        await message.reply(EMPTY_REPLY)
+        return None
+
+    async def generate_image(self, prompt: str, message: discord.Message) -> Optional[discord.File]:
+        """
+        Enfileira a geração da imagem, informando a posição na fila, e retorna o resultado
+        como um discord.File. Retorna None se ocorrer um erro. Levanta QueueFullError se a
+        fila estiver cheia e JobCancelledError se o pedido for abandonado.
+        """
+        guild_id = message.guild.id if message.guild else None
+        self.logger.info("Iniciando geração de imagem para prompt: %s", prompt)
+        
+        image_key = make_key(prompt, namespace=f"imagem:{self.image_model}:{self.image_format}")
+        if self.image_cache:
+            cached = await self.image_cache.get(image_key)
+            if cached:
+                self.logger.info("Imagem obtida do cache")
+                image_bytes, extension = cached
+                return discord.File(fp=BytesIO(image_bytes), filename=f'image.{extension}')
+        
+        # Prompts idênticos na fila compartilham um único job
+        job, waiter = self.image_queue.submit(
+            image_key,
+            lambda: self.render_image(prompt, image_key),
+            subscriber=message.id,
+            user_id=message.author.id,
+            priority=self.image_priorities.get(guild_id, self.default_image_priority)
+        )
+        progress = asyncio.create_task(self.track_image_job(job, message))
+        try:
+            rendered = await waiter
+        except (JobCancelledError, asyncio.CancelledError):
+            raise
         except Exception as e:
-            self.logger.error(f"Erro ao gerar imagem: {e}", exc_info=True)
+            self.metrics.inc("erros_total", etapa="imagem", tipo=type(e).__name__)
+            self.logger.error("Erro ao gerar imagem: %s", e, exc_info=True)
             return None
+        finally:
+            progress.cancel()
+            # Se quem esperava foi cancelado, desiste do pedido na fila
+            self.image_queue.unsubscribe(message.id)
+        
+        if rendered:
+            # Cada resposta precisa do seu próprio discord.File
+            image_bytes, extension = rendered
+            discord_file = discord.File(fp=BytesIO(image_bytes), filename=f'image.{extension}')
+            self.logger.info("Imagem gerada com sucesso")
+            return discord_file
+        
+        self.logger.warning("Imagem gerada está vazia")
+        return None
 
-    def should_respond(self, message: discord.Message) -> bool:
-        """Verifica se o bot deve responder à mensagem."""
-        # Ignora mensagens de bots
-        if message.author.bot:
-            return False
+    async def track_image_job(self, job: ImageJob, message: discord.Message):
+        """Mantém o usuário informado da posição do pedido na fila até a geração começar."""
+        status = None
+        last_text = None
+        try:
+            while job.state == ImageJob.PENDING:
+                text = (
+                    f"🖼️ Você é o #{self.image_queue.position(job) + 1} na fila de imagens, "
+                    f"ETA ~{math.ceil(self.image_queue.eta(job))}s"
+                )
+                if text != last_text:
+                    if status is None:
+                        status = await message.reply(text)
+                    else:
+                        await status.edit(content=text)
+                    last_text = text
+                await asyncio.sleep(self.image_status_interval)
+        except discord.HTTPException as e:
+            self.logger.warning("Não foi possível atualizar a posição na fila: %s", e)
+        finally:
+            if status is not None:
+                try:
+                    await status.delete()
+                except discord.HTTPException:
+                    pass
 
-        # Obtém o conteúdo limpo da mensagem
-        content = message.content.strip().lower()
+    async def render_image(self, prompt: str, image_key: str) -> Optional[Tuple[bytes, str]]:
+        """Chama o HuggingFace, codifica a imagem e a guarda no cache. Retorna (bytes, extensão)."""
+        # Chamada síncrona, então executa no pool de threads da fila para não bloquear o event loop
+        with self.metrics.timer("etapa_segundos", etapa="imagem_geracao"):
+            image = await self.hf_resilience.call(
+                lambda: self.image_queue.run_blocking(lambda: self.image_client().text_to_image(prompt))
+            )
+        if not image:
+            return None
         
-        # Verifica menção direta ao bot
-        is_mentioned = self.bot.user in message.mentions
+        # A codificação é pesada em CPU: roda em outro processo, escolhendo a qualidade que
+        # cabe no limite de upload (o Pillow só é importado no primeiro pedido de imagem)
+        from utils.image_encoding import encode_image
         
-        # Lista de possíveis ativações (nomes e sinônimos)
-        activation_phrases = ['samer', f'<@{self.bot.user.id}>', f'<@!{self.bot.user.id}>']
+        with self.metrics.timer("etapa_segundos", etapa="imagem_codificacao"):
+            image_bytes, extension = await asyncio.get_running_loop().run_in_executor(
+                self.encoding_pool,
+                encode_image,
+                image,
+                self.image_format,
+                self.upload_limit,
+                self.image_quality
+            )
+        self.logger.info("Imagem codificada em %s com %.0f KB", extension.upper(), len(image_bytes) / 1024)
         
-        # Verifica se começa com alguma das frases de ativação
-        starts_with_activation = any(content.startswith(phrase + ' ') or 
-                                     content.startswith(phrase + ',') or 
-                                     content.startswith(phrase + ':') or 
-                                     content.startswith(phrase + '?') or 
-                                     content.startswith(phrase + '!') 
-                                     for phrase in activation_phrases)
+        if self.image_cache:
+            try:
+                await self.image_cache.set(image_key, image_bytes, extension)
+            except OSError as e:
+                self.logger.error("Erro ao salvar imagem no cache: %s", e, exc_info=True)
+        return image_bytes, extension
+
+    def build_triggers(self):
+        """Compila os gatilhos de ativação (nome, menções e apelidos por servidor) após o login."""
+        self.triggers = {None: TriggerMatcher(self.bot.user.id, self.trigger_names)}
+        for guild_id, aliases in self.guild_aliases.items():
+            self.triggers[guild_id] = TriggerMatcher(self.bot.user.id, list(self.trigger_names) + list(aliases))
+
+    def match_trigger(self, message: discord.Message) -> Optional[str]:
+        """
+        Verifica se o bot deve responder à mensagem e, em caso positivo, retorna o conteúdo já
+        sem o nome de ativação e sem as menções ao bot. Retorna None se a mensagem não for para ele.
+        """
+        # Ignora mensagens de bots
+        if message.author.bot:
+            return None
+        
+        if not self.triggers:
+            self.build_triggers()
+        matcher = self.triggers.get(message.guild.id if message.guild else None) or self.triggers[None]
         
         # Verifica se é uma resposta a uma mensagem do bot
+        reference = message.reference
         is_reply_to_bot = (
-            message.reference and 
-            isinstance(message.reference.resolved, discord.Message) and 
-            message.reference.resolved.author.id == self.bot.user.id
+            reference is not None and
+            isinstance(reference.resolved, discord.Message) and
+            reference.resolved.author.id == self.bot.user.id
         )
         
-        # Só responde se for mencionado ou chamado pelo nome
-        should_respond = is_mentioned or starts_with_activation or is_reply_to_bot
+        # Só responde se for mencionado, chamado pelo nome ou em resposta ao bot
+        content = matcher.match(message.content, is_reply_to_bot)
         
         # Loga a decisão para debug
-        if should_respond:
+        if content is not None:
             self.logger.debug(
-                f"Respondendo mensagem | "
-                f"Autor: {message.author} | "
-                f"Conteúdo: {content} | "
-                f"Mencionado: {is_mentioned} | "
-                f"Ativado por frase: {starts_with_activation} | "
-                f"Resposta a bot: {is_reply_to_bot}"
+                "Respondendo mensagem | Autor: %s | Conteúdo: %s | Resposta a bot: %s",
+                message.author, content, is_reply_to_bot
             )
-        
-        return should_respond
+        return content
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """Responde apenas quando explicitamente chamado."""
-        if not self.should_respond(message):
-            return
+        # Decide e remove o gatilho em uma única passada
+        with self.metrics.timer("etapa_segundos", etapa="gatilho"):
+            content = self.match_trigger(message)
+        if content is None:
+            # Sem gatilho, só entra se continuar uma pergunta que o usuário ainda está escrevendo
+            content = self.continuation(message)
+            if content is None:
+                return
+            continued = True
+        else:
+            continued = False
 
+        # Liga todos os logs desta mensagem (chamada ao Gemini, envio da resposta) pelo mesmo ID
+        request_id = new_correlation_id()
+        # Resultado registrado no histórico quando a mensagem é atendida
+        started = None
+        answer, status = None, "erro"
         try:
-            # Remove menções e nome do bot
-            content = message.content
+            # Verifica se o usuário deseja gerar uma imagem; continuações só acrescentam texto
+            # à pergunta em aberto, mesmo que comecem com "imagem"
+            prompt = None if continued else split_image_prompt(content)
+            is_image = prompt is not None
             
-            # Remove menções ao bot
-            for mention in message.mentions:
-                if mention.id == self.bot.user.id:
-                    content = content.replace(str(mention), '').strip()
+            # Pedidos de texto esperam as próximas mensagens do usuário (inclusive um "samer"
+            # sozinho, seguido da pergunta); as que chegam com a janela aberta entram nesta
+            key = (message.author.id, message.channel.id)
+            debounce = self.debouncer is not None and not is_image
+            joining = debounce and self.debouncer.is_open(key)
             
-            # Remove "samer" do início se presente
-            content_lower = content.lower()
-            for phrase in ['samer', f'<@{self.bot.user.id}>', f'<@!{self.bot.user.id}>']:
-                if content_lower.startswith(phrase):
-                    parts = content.split(None, 1)
-                    if len(parts) > 1:
-                        content = parts[1].strip()
-                    else:
-                        content = ''
-                    break
+            # Se não sobrou conteúdo após limpeza (e não há pergunta a completar), não responde
+            if not content and not debounce:
+                return
             
-            # Se não sobrou conteúdo após limpeza, não responde
-            if not content:
+            # Rejeita de imediato quem passou do limite, antes de abrir a janela de agrupamento e
+            # de qualquer chamada externa; continuações de uma pergunta já admitida não pagam de novo
+            if not joining and not await self.admit(message, is_image):
+                self.metrics.inc("mensagens_total", resultado="limitada")
                 return
-                
-            channel_name = self.get_channel_name(message.channel)
             
+            if debounce:
+                with self.metrics.timer("etapa_segundos", etapa="agrupamento"):
+                    async with message.channel.typing():
+                        burst = await self.debouncer.submit(key, message, content)
+                if burst is None:
+                    if content:
+                        self.metrics.inc("mensagens_total", resultado="agrupada")
+                    return
+                # Responde à última mensagem, com a pergunta completa
+                message, content = burst
+                if not content:
+                    return
+                
             self.logger.info(
-                f"Mensagem recebida | Canal: {channel_name} | "
-                f"Usuário: {message.author} | ID: {message.author.id}"
+                "Mensagem recebida | Canal: %s | Usuário: %s | ID: %s",
+                self.get_channel_name(message.channel), message.author, message.author.id
             )
             
+            self.metrics.inc("mensagens_total", resultado="imagem" if is_image else "texto")
+            started = time.perf_counter()
+            
             async with message.channel.typing():
-                # Verifica se o usuário deseja gerar uma imagem
-                if content.startswith("imagem ") or content.startswith("image "):
-                    # Extrai o prompt para a imagem
-                    prompt = content[len("imagem "):].strip() or content[len("image "):].strip()
+                if is_image:
                     if not prompt:
+                        status = "sem_prompt"
                         await message.reply("❌ Por favor, forneça um prompt para gerar a imagem. Exemplo: `imagem Astronauta montando um cavalo`")
                         return
                     
-                    discord_file = await self.generate_image(prompt)
+                    try:
+                        discord_file = await self.generate_image(prompt, message)
+                    except QueueFullError:
+                        status = "fila_cheia"
+                        await message.reply("⏳ A fila de imagens está cheia no momento. Tente novamente em alguns minutos.")
+                        return
+                    except JobCancelledError:
+                        status = "cancelada"
+                        self.logger.info("Pedido de imagem cancelado | Usuário: %s", message.author.id)
+                        return
+                    
                     if discord_file:
-                        await message.reply(file=discord_file)
+                        with self.metrics.timer("etapa_segundos", etapa="discord_envio"):
+                            await message.reply(file=discord_file)
+                        status = "ok"
                         self.logger.info("Imagem enviada com sucesso")
                     else:
                         await message.reply("❌ Não foi possível gerar a imagem no momento. Por favor, tente novamente mais tarde.")
+                elif self.streaming:
+                    # Processa como uma pergunta de texto, publicando a resposta aos poucos
+                    answer = await self.reply_streaming(message, content)
+                    status = "ok" if answer else "erro"
                 else:
                     # Processa como uma pergunta de texto normal
                     response = await self.get_gemini_response(
                         content,
-                        message.author.id
+                        message.author.id,
+                        message.guild.id if message.guild else None,
+                        message.channel.id
                     )
                     
-                    if len(response) > 1900:
-                        chunks = [response[i:i+1900] for i in range(0, len(response), 1900)]
-                        for i, chunk in enumerate(chunks, 1):
-                            await message.reply(chunk)
-                            self.logger.info(f"Enviada parte {i}/{len(chunks)} da resposta")
-                    else:
-                        await message.reply(response)
-                        self.logger.info("Resposta enviada com sucesso")
+                    with self.metrics.timer("etapa_segundos", etapa="discord_envio"):
+                        sent = await deliver(
+                            message.reply,
+                            response,
+                            use_embeds=self.use_embeds,
+                            attachment_threshold=self.attachment_threshold
+                        )
+                    self.logger.info("Resposta enviada com sucesso em %d mensagem(ns)", len(sent))
+                    if not self.is_fallback_reply(response):
+                        answer, status = response, "ok"
                     
         except Exception as e:
+            self.metrics.inc("erros_total", etapa="mensagem", tipo=type(e).__name__)
             channel_name = self.get_channel_name(message.channel)
-            self.logger.error(f"Erro no canal {channel_name}: {e}", exc_info=True)
+            self.logger.error("Erro no canal %s: %s", channel_name, e, exc_info=True)
             await message.reply("Desculpe, ocorreu um erro. Pode tentar novamente?")
+        finally:
+            if started is not None and self.history:
+                guild_id = message.guild.id if message.guild else None
+                self.history.record_interaction(
+                    message.author.id,
+                    prompt if is_image else content,
+                    answer,
+                    status,
+                    kind="imagem" if is_image else "texto",
+                    guild_id=guild_id,
+                    channel_id=message.channel.id,
+                    persona=None if is_image else self.persona_for(guild_id),
+                    latency=time.perf_counter() - started,
+                    correlation_id=request_id
+                )
+
+    def continuation(self, message: discord.Message) -> Optional[str]:
+        """Retorna o texto da mensagem se ela continua uma pergunta em aberto do mesmo autor no canal."""
+        if not self.debouncer or message.author.bot:
+            return None
+        if not self.debouncer.is_open((message.author.id, message.channel.id)):
+            return None
+        content = message.content.strip()
+        # Comandos (como `!esquecer`) não fazem parte da pergunta
+        if not content or content.startswith(self.bot.command_prefix):
+            return None
+        return content
+
+    def is_fallback_reply(self, text: str) -> bool:
+        """Indica se o texto é um aviso de erro enviado no lugar de uma resposta do Gemini."""
+        return text in (EMPTY_REPLY, UNAVAILABLE_REPLY, self.messages["error"], self.messages["timeout"])
 
-    @commands.command(name="config")
+    async def admit(self, message: discord.Message, is_image: bool) -> bool:
+        """Aplica o controle de admissão. Retorna False (e avisa o usuário) se a requisição foi rejeitada."""
+        if not self.rate_limiter:
+            return True
+        
+        retry_after = await self.rate_limiter.acquire(
+            {
+                "user": message.author.id,
+                "channel": message.channel.id,
+                "guild": message.guild.id if message.guild else None
+            },
+            cost=self.image_cost if is_image else self.text_cost
+        )
+        if not retry_after:
+            return True
+        
+        self.logger.info(
+            "Requisição limitada | Usuário: %s | Nova tentativa em %.1fs", message.author.id, retry_after
+        )
+        if not self.notice_limiter.try_acquire({"user": message.author.id}):
+            await message.reply(
+                f"⏳ Você está enviando pedidos rápido demais. Tente novamente em {math.ceil(retry_after)}s."
+            )
+        return False
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """Cancela o pedido de imagem (ou o trecho de pergunta em aberto) cuja mensagem foi apagada."""
+        if self.image_queue.unsubscribe(payload.message_id):
+            self.logger.info("Pedido de imagem abandonado (mensagem %s apagada)", payload.message_id)
+        elif self.debouncer and self.debouncer.discard(payload.message_id):
+            self.logger.info("Trecho de pergunta descartado (mensagem %s apagada)", payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_typing(self, channel: discord.abc.Messageable, user: discord.abc.User, when: datetime):
+        """Mantém aberta a pergunta de quem voltou a digitar no canal."""
+        if self.debouncer:
+            self.debouncer.touch((user.id, channel.id))
+
+    @commands.command(name="cancelar")
+    async def cancel_images(self, ctx: commands.Context):
+        """Cancela os pedidos de imagem do usuário que ainda estão na fila."""
+        try:
+            cancelled = self.image_queue.cancel_user(ctx.author.id)
+            if cancelled:
+                await ctx.send(f"🗑️ {cancelled} pedido(s) de imagem cancelado(s).")
+            else:
+                await ctx.send("ℹ️ Você não tem pedidos de imagem na fila.")
+            self.logger.info(f"{cancelled} pedido(s) de imagem cancelado(s) por {ctx.author}")
+        except Exception as e:
+            self.logger.error("Erro ao cancelar pedidos de imagem", exc_info=True)
+            await ctx.send("❌ Erro ao cancelar os pedidos de imagem.")
+
+    @commands.group(name="config", invoke_without_command=True)
     @commands.has_permissions(administrator=True)
     async def configure(self, ctx: commands.Context, 
                         temperatura: Optional[float] = None,
@@ -328,6 +1208,15 @@ class GeminiCog(commands.Cog, name="Comandos Gemini"):
             if updates:
                 old_config = self.generation_config.copy()
                 self.generation_config.update(updates)
+                # Os outros processos de shards aplicam a mudança na próxima sincronização
+                await self.state.set("config", "geracao", self.generation_config)
+                if self.history:
+                    self.history.record_config(
+                        "geracao", self.generation_config,
+                        guild_id=ctx.guild.id if ctx.guild else None, user_id=ctx.author.id
+                    )
+                # A configuração faz parte da chave do cache, então respostas geradas com os
+                # parâmetros antigos deixam de ser servidas automaticamente
                 self.logger.info(
                     f"Configuração alterada de {old_config} para {self.generation_config} | "
                     f"Usuário: {ctx.author}"
@@ -352,20 +1241,103 @@ class GeminiCog(commands.Cog, name="Comandos Gemini"):
             self.logger.error("Erro ao configurar parâmetros do modelo", exc_info=True)
             await ctx.send("❌ Erro ao configurar parâmetros do modelo.")
 
+    @configure.command(name="modelo")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def configure_model(self, ctx: commands.Context, modo: Optional[str] = None):
+        """Mostra ou altera o roteamento de modelos do servidor: auto, rapido ou pesado."""
+        try:
+            if not self.router:
+                await ctx.send(f"ℹ️ O roteamento está desativado; todas as perguntas usam `{self.model_name}`.")
+                return
+            
+            if modo is None:
+                lines = [
+                    f"🧠 Roteamento neste servidor: `{self.guild_routes.get(ctx.guild.id, AUTO)}` "
+                    f"(rápido: `{self.fast_model_name}`, pesado: `{self.model_name}`)"
+                ]
+                lines.extend(self.format_router_stats())
+                await ctx.send("\n".join(lines))
+                return
+            
+            modo = modo.lower()
+            if modo not in MODES:
+                await ctx.send(f"❌ Modo desconhecido. Disponíveis: {', '.join(f'`{name}`' for name in MODES)}")
+                return
+            
+            self.guild_routes[ctx.guild.id] = modo
+            # Os outros processos de shards aplicam a mudança na próxima sincronização
+            await self.state.set("modelos", str(ctx.guild.id), modo)
+            if self.history:
+                self.history.record_config("modelo", modo, guild_id=ctx.guild.id, user_id=ctx.author.id)
+            self.logger.info(f"Roteamento do servidor {ctx.guild.id} alterado para '{modo}' | Usuário: {ctx.author}")
+            await ctx.send(f"✅ Roteamento alterado para `{modo}`.")
+        except Exception as e:
+            self.logger.error("Erro ao alterar o roteamento de modelos", exc_info=True)
+            await ctx.send("❌ Erro ao alterar o roteamento de modelos.")
+
+    def format_router_stats(self) -> List[str]:
+        """Uma linha por modelo com as chamadas, falhas e latências recentes."""
+        lines = []
+        for stats in self.router.summary():
+            latency = (
+                f"primeiro trecho p50 {stats['p50']:.1f}s, p95 {stats['p95']:.1f}s" if stats["p50"] is not None
+                else "sem dados recentes de latência"
+            )
+            lines.append(
+                f"{'🟢' if stats['healthy'] else '🔴'} `{stats['model']}`: {stats['calls']} chamadas, "
+                f"{stats['error_rate']:.0%} de falhas recentes, {latency}"
+            )
+        if self.router.diverted:
+            lines.append(f"↪️ {self.router.diverted} pergunta(s) desviada(s) para o outro modelo")
+        return lines
+
     @commands.command(name="logs")
     @commands.has_permissions(administrator=True)
-    async def show_logs(self, ctx: commands.Context, lines: int = 10):
-        """Mostra as últimas linhas do log (apenas para administradores)."""
+    async def show_logs(self, ctx: commands.Context, lines: int = 10, *filtros: str):
+        """
+        Mostra as últimas linhas do log (apenas para administradores).
+        Filtros opcionais: `nivel=ERROR`, `logger=GeminiCog`, `desde=2024-05-01T10:00`, `ate=12:30`.
+        """
         try:
-            latest_logs: List[str] = self.logger.get_latest_logs(lines)
+            options = {}
+            for filtro in filtros:
+                chave, _, valor = filtro.partition("=")
+                chave = chave.lower()
+                if chave not in ("nivel", "logger", "desde", "ate") or not valor:
+                    await ctx.send(f"❌ Filtro inválido: `{filtro}`. Use `nivel=`, `logger=`, `desde=` ou `ate=`.")
+                    return
+                if chave in ("desde", "ate"):
+                    valor = self.parse_log_time(valor)
+                    if valor is None:
+                        await ctx.send("❌ Horário inválido. Use `AAAA-MM-DD`, `AAAA-MM-DDTHH:MM` ou `HH:MM`.")
+                        return
+                options[chave] = valor
+            
+            # Limita a leitura: um número enorme de linhas percorreria o arquivo inteiro
+            lines = max(1, min(lines, 500))
+            latest_logs: List[str] = await self.logger.query_logs(
+                lines,
+                level=options.get("nivel"),
+                name=options.get("logger"),
+                since=options.get("desde"),
+                until=options.get("ate")
+            )
+            if not latest_logs:
+                await ctx.send("ℹ️ Nenhum registro encontrado com esses filtros.")
+                return
             log_text = "```\n" + "".join(latest_logs) + "\n```"
             
-            if len(log_text) > 2000:
-                chunks = [log_text[i:i+2000] for i in range(0, len(log_text), 2000)]
-                for chunk in chunks:
-                    await ctx.send(chunk)
-            else:
-                await ctx.send(log_text)
+            # Corta entre registros, mantendo o bloco de código em cada parte; muitos registros
+            # vão como arquivo
+            await deliver(
+                ctx.send,
+                log_text,
+                use_embeds=self.use_embeds,
+                attachment_threshold=self.attachment_threshold,
+                filename="logs.md",
+                attachment_notice=f"📄 {len(latest_logs)} registros enviados como arquivo."
+            )
                 
             self.logger.info(f"Logs mostrados para {ctx.author}")
             
@@ -373,6 +1345,280 @@ class GeminiCog(commands.Cog, name="Comandos Gemini"):
             self.logger.error("Erro ao mostrar logs", exc_info=True)
             await ctx.send("❌ Erro ao recuperar logs.")
 
+    @staticmethod
+    def parse_log_time(value: str) -> Optional[str]:
+        """Converte o horário informado no formato usado nos logs ("AAAA-MM-DD HH:MM:SS")."""
+        try:
+            if len(value) <= 5 and ":" in value:
+                moment = datetime.combine(datetime.now().date(), datetime.strptime(value, "%H:%M").time())
+            else:
+                moment = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+    @commands.command(name="fila")
+    @commands.has_permissions(administrator=True)
+    async def show_queue(self, ctx: commands.Context):
+        """Mostra a ocupação e o tempo de espera da fila do Gemini (apenas para administradores)."""
+        try:
+            stats = self.scheduler.stats()
+            await ctx.send(
+                "📊 **Fila do Gemini:**\n"
+                f"Em execução: {stats['in_flight']}/{stats['limit']}\n"
+                f"Na fila: {stats['queued']}\n"
+                f"Requisições atendidas: {stats['acquired']}\n"
+                f"Espera média: {stats['avg_wait_ms']:.0f} ms\n"
+                f"Espera p95: {stats['p95_wait_ms']:.0f} ms\n"
+                f"Espera máxima: {stats['max_wait_ms']:.0f} ms\n"
+                f"Chamadas economizadas por agrupamento (texto/imagem): "
+                f"{self.text_flight.saved} / {self.image_queue.saved}"
+                + self.format_image_queue()
+                + self.format_image_cache()
+                + f"\nTokens de entrada economizados com a instrução de sistema: ~{self.prompt_tokens_saved}"
+                + self.format_sessions()
+                + self.format_rate_limits()
+                + self.format_ttfb()
+            )
+            self.logger.info(f"Estatísticas da fila mostradas para {ctx.author}")
+        except Exception as e:
+            self.logger.error("Erro ao mostrar estatísticas da fila", exc_info=True)
+            await ctx.send("❌ Erro ao recuperar estatísticas da fila.")
+
+    def format_image_queue(self) -> str:
+        """Resumo da fila de imagens."""
+        stats = self.image_queue.stats()
+        return (
+            f"\nFila de imagens: {stats['pending']}/{stats['max_pending']} pendentes, "
+            f"{stats['running']}/{stats['workers']} em execução, "
+            f"duração média {stats['avg_duration']:.0f}s "
+            f"({stats['completed']} concluídas, {stats['failed']} falhas, {stats['cancelled']} canceladas)"
+        )
+
+    def format_image_cache(self) -> str:
+        """Resumo do cache de imagens."""
+        if not self.image_cache:
+            return ""
+        stats = self.image_cache.stats()
+        return (
+            f"\nCache de imagens: {stats['entries']} arquivos, "
+            f"{stats['bytes'] / 1024 / 1024:.0f}/{stats['max_bytes'] / 1024 / 1024:.0f} MB "
+            f"({stats['hits']} acertos, {stats['misses']} falhas)"
+        )
+
+    def format_sessions(self) -> str:
+        """Resumo da ocupação das sessões de conversa."""
+        if not self.chats:
+            return ""
+        stats = self.chats.stats()
+        return (
+            f"\nSessões de conversa: {stats['sessions']}/{stats['max_sessions']} "
+            f"(~{stats['tokens']} tokens, {stats['evicted']} expulsas, {stats['expired']} expiradas)"
+        )
+
+    def format_rate_limits(self) -> str:
+        """Resumo do controle de admissão."""
+        if not self.rate_limiter:
+            return ""
+        stats = self.rate_limiter.stats()
+        buckets = "baldes compartilhados" if stats['buckets'] is None else f"{stats['buckets']} baldes"
+        return f"\nLimite de taxa: {stats['rejected']} rejeitadas / {stats['allowed']} admitidas ({buckets})"
+
+    def format_ttfb(self) -> str:
+        """Resumo do tempo até o primeiro byte das respostas em streaming."""
+        histogram = self.metrics.histogram("etapa_segundos", etapa="gemini_ttfb")
+        if not histogram.count:
+            return ""
+        return f"\nTTFB p50/p95: {histogram.quantile(0.5) * 1000:.0f} / {histogram.quantile(0.95) * 1000:.0f} ms"
+
+    @commands.command(name="cache")
+    @commands.has_permissions(administrator=True)
+    async def show_cache(self, ctx: commands.Context, acao: Optional[str] = None):
+        """Mostra as estatísticas do cache de respostas ou o limpa com `!cache limpar`."""
+        try:
+            if not self.response_cache:
+                await ctx.send("ℹ️ O cache de respostas está desativado.")
+                return
+            
+            if acao == "limpar":
+                await self.response_cache.clear()
+                self.logger.info(f"Cache de respostas limpo por {ctx.author}")
+                await ctx.send("✅ Cache de respostas limpo.")
+                return
+            
+            stats = self.response_cache.stats()
+            await ctx.send(
+                "📊 **Cache de respostas:**\n"
+                f"Entradas em memória: {stats['entries']}/{stats['max_entries']}\n"
+                f"Acertos (memória/disco): {stats['hits']} / {stats['disk_hits']}\n"
+                f"Falhas: {stats['misses']}\n"
+                f"Taxa de acerto: {stats['hit_rate']:.1%}\n"
+                f"Camada em disco: {'ativada' if stats['disk_enabled'] else 'desativada'}"
+            )
+            self.logger.info(f"Estatísticas do cache mostradas para {ctx.author}")
+        except Exception as e:
+            self.logger.error("Erro ao mostrar estatísticas do cache", exc_info=True)
+            await ctx.send("❌ Erro ao recuperar estatísticas do cache.")
+
+    @commands.command(name="persona")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def set_persona(self, ctx: commands.Context, nome: Optional[str] = None):
+        """Mostra ou altera a variante de persona usada neste servidor."""
+        try:
+            if nome is None:
+                await ctx.send(
+                    f"🎭 Persona atual: `{self.persona_for(ctx.guild.id)}`\n"
+                    f"Disponíveis: {', '.join(f'`{name}`' for name in PERSONAS)}"
+                )
+                return
+            
+            if nome not in PERSONAS:
+                await ctx.send(f"❌ Persona desconhecida. Disponíveis: {', '.join(f'`{name}`' for name in PERSONAS)}")
+                return
+            
+            self.guild_personas[ctx.guild.id] = nome
+            await self.state.set("personas", str(ctx.guild.id), nome)
+            if self.history:
+                self.history.record_config("persona", nome, guild_id=ctx.guild.id, user_id=ctx.author.id)
+            self.logger.info(f"Persona do servidor {ctx.guild.id} alterada para '{nome}' | Usuário: {ctx.author}")
+            await ctx.send(f"✅ Persona alterada para `{nome}`.")
+        except Exception as e:
+            self.logger.error("Erro ao alterar persona", exc_info=True)
+            await ctx.send("❌ Erro ao alterar a persona.")
+
+    @commands.command(name="esquecer")
+    async def forget(self, ctx: commands.Context):
+        """Encerra a conversa do usuário neste canal, começando do zero na próxima pergunta."""
+        try:
+            # Descarta também uma pergunta que ainda estava sendo escrita
+            if self.debouncer:
+                self.debouncer.cancel((ctx.author.id, ctx.channel.id))
+            if self.chats and self.chats.clear(ctx.author.id, ctx.channel.id):
+                await ctx.send("🧹 Conversa encerrada. Na próxima pergunta começamos do zero.")
+            else:
+                await ctx.send("ℹ️ Não há conversa ativa neste canal.")
+            self.logger.info(f"Sessão de conversa encerrada por {ctx.author}")
+        except Exception as e:
+            self.logger.error("Erro ao encerrar sessão de conversa", exc_info=True)
+            await ctx.send("❌ Erro ao encerrar a conversa.")
+
+    @commands.command(name="status")
+    @commands.has_permissions(administrator=True)
+    async def show_status(self, ctx: commands.Context):
+        """Mostra o estado dos disjuntores do Gemini e do HuggingFace (apenas para administradores)."""
+        try:
+            icons = {
+                CircuitBreaker.CLOSED: "🟢",
+                CircuitBreaker.HALF_OPEN: "🟡",
+                CircuitBreaker.OPEN: "🔴",
+            }
+            lines = ["🩺 **Serviços externos:**"]
+            for caller in (self.gemini_resilience, self.hf_resilience):
+                stats = caller.stats()
+                line = (
+                    f"{icons[stats['state']]} **{stats['service']}**: {stats['state']}"
+                    f" | falhas seguidas: {stats['consecutive_failures']}"
+                    f" | chamadas: {stats['calls']}, novas tentativas: {stats['retries']},"
+                    f" timeouts: {stats['timeouts']}, recusadas: {stats['rejected']}"
+                    f" | hedging: {stats['hedged']} ({stats['hedge_wins']} venceram)"
+                )
+                if stats['p95_ms'] is not None:
+                    line += f" | p95: {stats['p95_ms']:.0f} ms"
+                if stats['first_chunk_p95_ms'] is not None:
+                    line += f" | p95 até a 1ª parte: {stats['first_chunk_p95_ms']:.0f} ms"
+                if stats['retry_after']:
+                    line += f" | reabre em {stats['retry_after']:.0f}s"
+                lines.append(line)
+            await ctx.send("\n".join(lines))
+            self.logger.info(f"Estado dos serviços mostrado para {ctx.author}")
+        except Exception as e:
+            self.logger.error("Erro ao mostrar estado dos serviços", exc_info=True)
+            await ctx.send("❌ Erro ao recuperar o estado dos serviços.")
+
+    @commands.command(name="stats")
+    @commands.has_permissions(administrator=True)
+    async def show_stats(self, ctx: commands.Context):
+        """Mostra latências por etapa (p50/p95/p99), erros e tokens (apenas para administradores)."""
+        try:
+            lines = [
+                "📈 **Latência por etapa (ms):**",
+                "```",
+                f"{'etapa':<22}{'n':>8}{'p50':>9}{'p95':>9}{'p99':>9}",
+            ]
+            for name, label in (("etapa_segundos", "etapa"), ("comando_segundos", "comando")):
+                for labels, histogram in sorted(self.metrics.histograms().get(name, {}).items()):
+                    if not histogram.count:
+                        continue
+                    stage = dict(labels).get(label, "")
+                    if label == "comando":
+                        stage = f"!{stage}"
+                    lines.append(
+                        f"{stage:<22}{histogram.count:>8}"
+                        + "".join(f"{histogram.quantile(q) * 1000:>9.1f}" for q in (0.5, 0.95, 0.99))
+                    )
+            lines.append("```")
+            
+            errors = {}
+            for labels, value in self.metrics.counters("erros_total").items():
+                stage = dict(labels).get("etapa", "")
+                errors[stage] = errors.get(stage, 0) + value
+            lines.append(
+                "❌ **Erros:** "
+                + (", ".join(f"{stage}: {value:.0f}" for stage, value in sorted(errors.items())) or "nenhum")
+            )
+            lines.append(
+                f"🔤 **Tokens do Gemini:** {self.metrics.counter_value('gemini_tokens_total', tipo='entrada'):.0f} de entrada, "
+                f"{self.metrics.counter_value('gemini_tokens_total', tipo='saida'):.0f} de saída"
+            )
+            if self.router:
+                lines.append(
+                    f"🧠 **Roteamento:** {self.router.routed[FAST]} rápidas, {self.router.routed[HEAVY]} pesadas"
+                )
+                lines.extend(self.format_router_stats())
+            if self.metrics.overhead_ns is not None:
+                lines.append(f"⏱️ Custo de cada medição: ~{self.metrics.overhead_ns:.0f} ns")
+            await ctx.send("\n".join(lines))
+            self.logger.info(f"Métricas mostradas para {ctx.author}")
+        except Exception as e:
+            self.logger.error("Erro ao mostrar métricas", exc_info=True)
+            await ctx.send("❌ Erro ao recuperar as métricas.")
+
+    @commands.command(name="historico")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def show_history(self, ctx: commands.Context, usuario: Optional[discord.Member] = None, quantidade: int = 10):
+        """Mostra as últimas interações do servidor ou de um usuário (apenas para administradores)."""
+        try:
+            if not self.history:
+                await ctx.send("ℹ️ O histórico de interações está desativado.")
+                return
+            
+            quantidade = max(1, min(quantidade, 50))
+            # Garante que as interações mais recentes já estejam no arquivo
+            await self.history.flush()
+            if usuario is not None:
+                rows = await self.history.by_user(usuario.id, guild_id=ctx.guild.id, limit=quantidade)
+            else:
+                rows = await self.history.by_guild(ctx.guild.id, limit=quantidade)
+            if not rows:
+                await ctx.send("ℹ️ Nenhuma interação registrada.")
+                return
+            
+            lines = [f"🗂️ **Últimas {len(rows)} interação(ões):**"]
+            for row in rows:
+                question = row["question"] if len(row["question"]) <= 80 else row["question"][:77] + "..."
+                lines.append(
+                    f"`{datetime.fromtimestamp(row['ts']).strftime('%d/%m %H:%M:%S')}` usuário `{row['user_id']}` "
+                    f"[{row['kind']}, {row['status']}, {(row['latency_ms'] or 0) / 1000:.1f}s] {question}"
+                )
+            await deliver(ctx.send, "\n".join(lines), use_embeds=self.use_embeds,
+                          attachment_threshold=self.attachment_threshold, filename="historico.md")
+            self.logger.info(f"Histórico mostrado para {ctx.author}")
+        except Exception as e:
+            self.logger.error("Erro ao mostrar o histórico", exc_info=True)
+            await ctx.send("❌ Erro ao recuperar o histórico.")
+
     @commands.command(name="convite")
     async def convite(self, ctx: commands.Context):
         """Gera um link de convite para adicionar o bot a outros servidores."""
@@ -7,7 +7,8 @@ setup(
     install_requires=[
         "discord.py>=2.3.2",
         "python-dotenv>=1.0.0",
-        "google-generativeai>=0.3.0",
+        "google-generativeai>=0.5.0",
+        "Pillow>=10.0.0",
         "aiohttp>=3.8.0",
     ],
     author="ZeBookTech",
@@ -0,0 +1,66 @@
+# tests/test_delivery.py
+
+import pytest
+
+pytest.importorskip("discord")
+
+from utils.delivery import EMBEDS_TOTAL_LIMIT, cut_chunk, pack_embeds, split_text
+
+
+def test_texto_curto_fica_inteiro():
+    assert split_text("Olá, tudo bem?", 1900) == ["Olá, tudo bem?"]
+
+
+def test_corta_entre_paragrafos():
+    text = "a" * 1500 + "\n\n" + "b" * 1500
+    assert split_text(text, 1900) == ["a" * 1500, "b" * 1500]
+
+
+def test_bloco_de_codigo_e_fechado_e_reaberto_com_a_linguagem():
+    text = "```python\n" + "x = 1\n" * 600 + "```\nfim"
+    chunks = split_text(text, 1900)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 1900 for chunk in chunks)
+    for chunk in chunks[:-1]:
+        assert chunk.startswith("```python\n")
+        assert chunk.count("```") == 2
+    assert chunks[-1].endswith("fim")
+
+
+def test_linha_com_crases_repetidas_nao_trava():
+    # Linha enorme começando com ``` e com outras ``` no meio: antes o restante nunca diminuía
+    text = "Veja:\n" + "```Art. 5º Todos são iguais perante a lei, sem distinção de qualquer natureza " * 80 + "\n\nfim"
+    chunks = split_text(text, 1900)
+    assert all(len(chunk) <= 1900 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace("\n", "").replace(" ", "")
+
+
+def test_abertura_maior_que_a_janela_faz_corte_seco():
+    text = "```" + "a" * 5000 + "\nprint()\n```"
+    head, rest = cut_chunk(text, 1900)
+    assert head == text[:1900]
+    assert len(rest) < len(text)
+    assert "".join(split_text(text, 1900)) == text
+
+
+def test_bloco_aberto_e_fechado_na_mesma_linha_nao_e_repetido():
+    text = "intro\n```x = 1```\n" + "palavra " * 400
+    chunks = split_text(text, 1900)
+    assert len(chunks) == 2
+    assert chunks[0].count("```") == 2
+    assert "```" not in chunks[1]
+
+
+def test_abertura_com_texto_na_mesma_linha_reabre_sem_o_texto():
+    text = "```sql SELECT 1\n" + "linha de código\n" * 200
+    head, rest = cut_chunk(text, 1900)
+    assert head.endswith("\n```")
+    assert rest.startswith("```\n")
+
+
+def test_embeds_respeitam_os_limites():
+    text = "\n\n".join("parágrafo " * 50 for _ in range(60))
+    groups = pack_embeds(text)
+    assert all(sum(len(chunk) for chunk in group) <= EMBEDS_TOTAL_LIMIT for group in groups)
+    assert all(len(group) <= 10 for group in groups)
+    assert sum(len(chunk) for group in groups for chunk in group) >= len(text) - 60 * 2
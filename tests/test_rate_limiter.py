@@ -0,0 +1,48 @@
+# tests/test_rate_limiter.py
+
+import asyncio
+
+from utils.rate_limiter import RateLimiter
+
+
+def test_bloqueia_apos_esgotar_a_capacidade():
+    limiter = RateLimiter({"user": (2, 1.0)})
+    assert limiter.try_acquire({"user": 1}) == 0
+    assert limiter.try_acquire({"user": 1}) == 0
+    assert limiter.try_acquire({"user": 1}) > 0
+    # Outro usuário tem o próprio balde
+    assert limiter.try_acquire({"user": 2}) == 0
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_so_desconta_quando_todos_os_escopos_admitem():
+    limiter = RateLimiter({"user": (5, 1.0), "guild": (1, 0.1)})
+    assert limiter.try_acquire({"user": 1, "guild": 10}) == 0
+    assert limiter.try_acquire({"user": 1, "guild": 10}) > 0
+    # A recusa pelo servidor não gastou tokens do usuário
+    bucket = limiter._buckets[("user", 1)]
+    assert bucket[0] >= 3.99
+
+
+def test_escopo_sem_limite_ou_sem_chave_e_ignorado():
+    limiter = RateLimiter({"user": (1, 1.0)})
+    assert limiter.try_acquire({"user": None, "canal": 3}) == 0
+    assert limiter.stats()["buckets"] == 0
+
+
+def test_custo_maior_que_a_capacidade_ainda_e_admitido():
+    limiter = RateLimiter({"user": (2, 1.0)})
+    assert limiter.try_acquire({"user": 1}, cost=10) == 0
+
+
+def test_limita_o_numero_de_baldes():
+    limiter = RateLimiter({"user": (1, 0.001)}, max_buckets=10)
+    for user in range(50):
+        limiter.try_acquire({"user": user})
+    assert limiter.stats()["buckets"] <= 10
+
+
+def test_acquire_assincrono():
+    limiter = RateLimiter({"user": (1, 1.0)})
+    assert asyncio.run(limiter.acquire({"user": 1})) == 0
+    assert asyncio.run(limiter.acquire({"user": 1})) > 0
@@ -0,0 +1,90 @@
+# tests/test_resilience.py
+
+import asyncio
+
+import pytest
+
+from utils.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+def _stream(opened, closed, delay):
+    async def generator():
+        index = len(opened)
+        opened.append(index)
+        try:
+            await asyncio.sleep(delay)
+            yield f"a{index}"
+            yield f"b{index}"
+        finally:
+            closed.append(index)
+    return generator()
+
+
+def test_stream_faz_hedging_pelo_tempo_ate_a_primeira_parte():
+    async def run():
+        caller = ResilientCaller("teste", timeout=5, hedging=True, hedge_min_samples=5)
+        opened, closed = [], []
+        # Amostras do tempo até a primeira parte, sem hedging enquanto o p95 se forma
+        caller.hedging = False
+        for _ in range(10):
+            assert [chunk async for chunk in caller.stream(lambda: _stream(opened, closed, 0.01))] != []
+        caller.hedging = True
+
+        # A primeira tentativa trava: a segunda, aberta após o p95, responde
+        delays = iter([2.0, 0.01])
+        chunks = [chunk async for chunk in caller.stream(lambda: _stream(opened, closed, next(delays)))]
+        return caller, chunks, opened, closed
+
+    caller, chunks, opened, closed = asyncio.run(run())
+    assert chunks == ["a11", "b11"]
+    assert caller.stats()["hedged"] == 1
+    assert caller.stats()["hedge_wins"] == 1
+    # O stream perdedor também foi fechado
+    assert sorted(closed) == sorted(opened)
+
+
+def test_stream_vazio():
+    async def empty():
+        return
+        yield
+
+    async def run():
+        caller = ResilientCaller("teste", hedging=True)
+        return [chunk async for chunk in caller.stream(empty)]
+
+    assert asyncio.run(run()) == []
+
+
+def test_stream_repete_antes_da_primeira_parte():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("falhou")
+        yield "ok"
+
+    async def run():
+        caller = ResilientCaller("teste", max_attempts=2, backoff_base=0.001)
+        return [chunk async for chunk in caller.stream(flaky)]
+
+    assert asyncio.run(run()) == ["ok"]
+    assert len(attempts) == 2
+
+
+def test_disjuntor_recusa_chamadas_quando_aberto():
+    async def failing():
+        raise ConnectionError("fora do ar")
+
+    async def run():
+        caller = ResilientCaller("teste", max_attempts=1, breaker=CircuitBreaker(2, 60))
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await caller.call(failing)
+        with pytest.raises(CircuitOpenError):
+            await caller.call(failing)
+        return caller
+
+    caller = asyncio.run(run())
+    assert caller.stats()["state"] == CircuitBreaker.OPEN
+    assert caller.stats()["rejected"] == 1
@@ -0,0 +1,118 @@
+# tests/test_scheduler.py
+
+import asyncio
+
+import pytest
+
+from utils.scheduler import FairScheduler
+
+
+def test_limite_invalido():
+    with pytest.raises(ValueError):
+        FairScheduler(max_concurrent=0)
+
+
+def test_respeita_o_limite_de_vagas():
+    async def run():
+        scheduler = FairScheduler(max_concurrent=2)
+        peak = 0
+
+        async def job():
+            nonlocal peak
+            async with scheduler.slot("a"):
+                peak = max(peak, scheduler.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(job() for _ in range(10)))
+        return scheduler, peak
+
+    scheduler, peak = asyncio.run(run())
+    assert peak == 2
+    assert scheduler.in_flight == 0
+    assert scheduler.queue_depth == 0
+    assert scheduler.stats()["acquired"] == 10
+
+
+def test_servidor_ativo_nao_monopoliza_as_vagas():
+    async def run():
+        scheduler = FairScheduler(max_concurrent=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def job(key):
+            async with scheduler.slot(key):
+                order.append(key)
+                await gate.wait()
+
+        # Ocupa a vaga e enfileira 5 pedidos de "a" antes de 1 de "b"
+        first = asyncio.ensure_future(job("a"))
+        await asyncio.sleep(0)
+        tasks = [asyncio.ensure_future(job("a")) for _ in range(5)]
+        tasks.append(asyncio.ensure_future(job("b")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *tasks)
+        return order
+
+    order = asyncio.run(run())
+    # "b" é atendido logo após o pedido de "a" que já estava em andamento e mais um
+    assert order.index("b") <= 2
+
+
+def test_pesos_dividem_as_vagas():
+    async def run():
+        scheduler = FairScheduler(max_concurrent=1, weights={"a": 3})
+        order = []
+        hold = asyncio.Event()
+
+        async def job(key):
+            async with scheduler.slot(key):
+                order.append(key)
+                await hold.wait()
+
+        first = asyncio.ensure_future(job("x"))
+        await asyncio.sleep(0)
+        tasks = [asyncio.ensure_future(job(key)) for key in ["a"] * 6 + ["b"] * 6]
+        await asyncio.sleep(0)
+        hold.set()
+        await asyncio.gather(first, *tasks)
+        return order[1:9]
+
+    window = asyncio.run(run())
+    assert window.count("a") == 6
+    assert window.count("b") == 2
+
+
+def test_cancelamento_na_fila_nao_vaza_vaga():
+    async def run():
+        scheduler = FairScheduler(max_concurrent=1)
+        await scheduler.acquire("a")
+        waiting = asyncio.ensure_future(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert scheduler.queue_depth == 0
+        scheduler.release()
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler.in_flight == 0
+
+
+def test_cancelamento_apos_receber_a_vaga_a_devolve():
+    async def run():
+        scheduler = FairScheduler(max_concurrent=1)
+        await scheduler.acquire("a")
+        waiting = asyncio.ensure_future(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        # A vaga é concedida e a tarefa é cancelada antes de voltar a rodar
+        scheduler.release()
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler.in_flight == 0
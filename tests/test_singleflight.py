@@ -0,0 +1,87 @@
+# tests/test_singleflight.py
+
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_chamadas_simultaneas_sao_agrupadas():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def factory():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "resposta"
+
+        results = await asyncio.gather(*(flight.do("k", factory) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(run())
+    assert calls == 1
+    assert results == ["resposta"] * 5
+    assert flight.stats() == {"in_flight": 0, "upstream_calls": 1, "saved_calls": 4}
+
+
+def test_erro_nao_fica_guardado():
+    async def run():
+        flight = SingleFlight()
+
+        async def failing():
+            raise RuntimeError("falhou")
+
+        async def working():
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            await flight.do("k", failing)
+        return await flight.do("k", working)
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_stream_repassa_partes_ja_recebidas():
+    async def run():
+        flight = SingleFlight()
+        gate = asyncio.Event()
+
+        async def generator():
+            yield "a"
+            await gate.wait()
+            yield "b"
+
+        async def collect():
+            return [chunk async for chunk in flight.stream("k", generator)]
+
+        first = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.01)
+        # Quem chega depois recebe também a parte que já tinha chegado
+        second = asyncio.ensure_future(collect())
+        await asyncio.sleep(0)
+        gate.set()
+        return await first, await second, flight.stats()
+
+    first, second, stats = asyncio.run(run())
+    assert first == second == ["a", "b"]
+    assert stats["upstream_calls"] == 1
+
+
+def test_cancelar_um_interessado_nao_afeta_os_demais():
+    async def run():
+        flight = SingleFlight()
+
+        async def factory():
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        first = asyncio.ensure_future(flight.do("k", factory))
+        second = asyncio.ensure_future(flight.do("k", factory))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "ok"
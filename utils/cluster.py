@@ -0,0 +1,111 @@
+# utils/cluster.py
+
+import json
+import multiprocessing
+import os
+import signal
+import time
+import urllib.request
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Variável de ambiente com o número do cluster do processo atual (ausente em processo único)
+CLUSTER_ENV = "SAMELIO_CLUSTER"
+
+# Intervalo mínimo entre identificações de shards no gateway do Discord, por balde de concorrência
+IDENTIFY_INTERVAL = 5.0
+
+
+def current_cluster() -> Optional[int]:
+    """Número do cluster deste processo, ou None quando o bot roda em um único processo."""
+    value = os.getenv(CLUSTER_ENV)
+    return int(value) if value is not None else None
+
+
+def fetch_gateway_info(token: str) -> Tuple[int, int]:
+    """Consulta o Discord e retorna (shards recomendados, max_concurrency da identificação)."""
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": "DiscordBot (samelio, 1.0)"}
+    )
+    with urllib.request.urlopen(request, timeout=15) as response:
+        data = json.load(response)
+    return data["shards"], data.get("session_start_limit", {}).get("max_concurrency", 1)
+
+
+def plan_clusters(shard_count: int, processes: int) -> List[List[int]]:
+    """Divide os shards em blocos contíguos, o mais equilibrados possível, um por processo."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    clusters, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        clusters.append(list(range(start, end)))
+        start = end
+    return clusters
+
+
+def launch(target: Callable[[int, List[int], int, float], None], token: str, processes: int,
+           shard_count: Optional[int] = None, logger=None, restart_delay: float = 10.0):
+    """
+    Inicia um processo por cluster de shards e os supervisiona, reiniciando os que caírem.
+    `target(cluster_id, shard_ids, shard_count, delay)` roda o bot de um cluster; `delay`
+    escalona as identificações para respeitar o limite do gateway entre processos.
+    """
+    max_concurrency = 1
+    if shard_count is None:
+        shard_count, max_concurrency = fetch_gateway_info(token)
+    clusters = plan_clusters(shard_count, processes)
+    if logger:
+        logger.info("Iniciando %d shards em %d processos: %s", shard_count, len(clusters), clusters)
+
+    # "spawn" evita herdar o event loop, threads e conexões do processo pai
+    context = multiprocessing.get_context("spawn")
+    running: Dict[int, multiprocessing.Process] = {}
+
+    def start(cluster_id: int, delay: float):
+        os.environ[CLUSTER_ENV] = str(cluster_id)
+        process = context.Process(
+            target=target,
+            args=(cluster_id, clusters[cluster_id], shard_count, delay),
+            name=f"cluster-{cluster_id}",
+            daemon=False
+        )
+        process.start()
+        running[cluster_id] = process
+        os.environ.pop(CLUSTER_ENV, None)
+
+    # Cada cluster só começa a identificar seus shards depois dos clusters anteriores
+    delay = 0.0
+    for cluster_id, shard_ids in enumerate(clusters):
+        start(cluster_id, delay)
+        delay += len(shard_ids) / max_concurrency * IDENTIFY_INTERVAL
+
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while not stopping:
+            time.sleep(1)
+            for cluster_id, process in list(running.items()):
+                if process.is_alive():
+                    continue
+                if logger:
+                    logger.error(
+                        "Cluster %d (shards %s) encerrou com código %s; reiniciando em %.0fs",
+                        cluster_id, clusters[cluster_id], process.exitcode, restart_delay
+                    )
+                time.sleep(restart_delay)
+                if not stopping:
+                    start(cluster_id, 0.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in running.values():
+            if process.is_alive():
+                process.terminate()
+        for process in running.values():
+            process.join(timeout=30)
@@ -0,0 +1,17 @@
+# utils/config.py
+
+import json
+import os
+from typing import Any, Dict
+
+# Caminho padrão do arquivo de configuração do bot
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cogs', 'config_bot.json')
+
+
+def load_config(path: str = CONFIG_PATH) -> Dict[str, Any]:
+    """Carrega o arquivo de configuração do bot. Retorna um dicionário vazio se não existir."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
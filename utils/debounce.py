@@ -0,0 +1,126 @@
+# utils/debounce.py
+
+import asyncio
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class _Burst:
+    """Mensagens de uma mesma pergunta ainda em aberto."""
+
+    __slots__ = ("parts", "started", "deadline", "wake")
+
+    def __init__(self, deadline: float):
+        self.parts: List[Tuple[Any, str]] = []
+        self.started = time.monotonic()
+        self.deadline = deadline
+        self.wake = asyncio.Event()
+
+
+class MessageDebouncer:
+    """
+    Junta em uma única pergunta as mensagens que um usuário manda em sequência no mesmo
+    canal. A primeira mensagem abre uma janela de `window` segundos; cada nova mensagem a
+    prorroga por mais `window` segundos e o aviso de que o usuário voltou a digitar, por
+    `typing_window` segundos, sempre até no máximo `max_wait` segundos desde a primeira. Quem abriu a janela recebe a pergunta completa; as demais chamadas
+    recebem None, porque já estão incluídas nela.
+    """
+
+    def __init__(self, window: float = 1.0, typing_window: float = 5.0, max_wait: float = 8.0,
+                 max_parts: int = 5, max_chars: int = 4000, max_open: int = 10000):
+        self.window = window
+        self.typing_window = typing_window
+        self.max_wait = max_wait
+        self.max_parts = max_parts
+        self.max_chars = max_chars
+        self.max_open = max_open
+        self._bursts: Dict[Hashable, _Burst] = {}
+        self._owners: Dict[int, Hashable] = {}
+        self.merged = 0
+        self.bypassed = 0
+
+    def is_open(self, key: Hashable) -> bool:
+        """Indica se há uma pergunta em aberto para a chave (usuário, canal)."""
+        return key in self._bursts
+
+    def touch(self, key: Hashable):
+        """Prorroga a janela em aberto (por exemplo, quando o usuário volta a digitar)."""
+        burst = self._bursts.get(key)
+        if burst is not None:
+            self._extend(burst, self.typing_window)
+
+    def _extend(self, burst: _Burst, seconds: float):
+        # Nunca encurta a janela: uma mensagem logo após o aviso de digitação não a reduz
+        deadline = min(time.monotonic() + seconds, burst.started + self.max_wait)
+        burst.deadline = max(burst.deadline, deadline)
+
+    async def submit(self, key: Hashable, message: Any, content: str) -> Optional[Tuple[Any, str]]:
+        """
+        Registra uma mensagem. Retorna (última mensagem, texto completo) para quem abriu a
+        janela, quando ela fecha, ou None se a mensagem foi incorporada a uma pergunta em
+        aberto ou se todas as partes foram apagadas.
+        """
+        burst = self._bursts.get(key)
+        if burst is not None:
+            burst.parts.append((message, content))
+            self._owners[message.id] = key
+            self.merged += 1
+            self._extend(burst, self.window)
+            # Perguntas grandes o bastante seguem sem esperar o fim da janela
+            if len(burst.parts) >= self.max_parts or sum(len(text) for _, text in burst.parts) >= self.max_chars:
+                burst.wake.set()
+            return None
+
+        if len(self._bursts) >= self.max_open:
+            # Sem espaço para mais janelas: atende a mensagem sozinha, sem esperar
+            self.bypassed += 1
+            return message, content
+
+        burst = self._bursts[key] = _Burst(time.monotonic() + self.window)
+        burst.parts.append((message, content))
+        self._owners[message.id] = key
+        try:
+            while True:
+                remaining = burst.deadline - time.monotonic()
+                if remaining <= 0 or burst.wake.is_set():
+                    break
+                try:
+                    await asyncio.wait_for(burst.wake.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Também ao ser cancelado: a janela nunca fica órfã
+            del self._bursts[key]
+            for part, _ in burst.parts:
+                self._owners.pop(part.id, None)
+
+        if not burst.parts:
+            return None
+        text = "\n".join(text for _, text in burst.parts if text)
+        return burst.parts[-1][0], text
+
+    def cancel(self, key: Hashable) -> bool:
+        """Descarta a pergunta em aberto da chave; quem abriu a janela recebe None."""
+        burst = self._bursts.get(key)
+        if burst is None:
+            return False
+        for message, _ in burst.parts:
+            self._owners.pop(message.id, None)
+        burst.parts = []
+        burst.wake.set()
+        return True
+
+    def discard(self, message_id: int) -> bool:
+        """Remove da pergunta em aberto uma mensagem que foi apagada."""
+        key = self._owners.pop(message_id, None)
+        burst = self._bursts.get(key) if key is not None else None
+        if burst is None:
+            return False
+        burst.parts = [(message, text) for message, text in burst.parts if message.id != message_id]
+        if not burst.parts:
+            # Não sobrou nada para responder: encerra a janela
+            burst.wake.set()
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {"open": len(self._bursts), "merged": self.merged, "bypassed": self.bypassed}
@@ -0,0 +1,134 @@
+# utils/delivery.py
+
+from io import BytesIO
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import discord
+
+# Limites da API do Discord
+MESSAGE_LIMIT = 2000
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBEDS_TOTAL_LIMIT = 6000
+EMBEDS_PER_MESSAGE = 10
+
+FENCE = "```"
+
+# Pontos de corte preferidos, do melhor para o pior, com quantos caracteres o separador ocupa
+_BOUNDARIES = (("\n\n", 2), ("\n", 1), (". ", 1), ("! ", 1), ("? ", 1), (" ", 1))
+
+
+def _fence_info(line: str) -> Optional[str]:
+    """
+    Se a linha abre ou fecha um bloco de código, retorna a linguagem indicada ("" se não
+    houver); senão None. "```x = 1```", aberto e fechado na mesma linha, não é delimitador.
+    """
+    stripped = line.strip()
+    if not stripped.startswith(FENCE):
+        return None
+    remainder = stripped[len(FENCE):]
+    if FENCE in remainder:
+        return None
+    # Só a primeira palavra, e só se for uma palavra sozinha, é a linguagem ("```python")
+    return remainder if remainder and not any(char.isspace() for char in remainder) else ""
+
+
+def _open_fence(text: str) -> Optional[str]:
+    """Retorna a abertura a repetir (ex.: "```python") se o texto terminar dentro de um bloco de código."""
+    opening = None
+    for line in text.split("\n"):
+        info = _fence_info(line)
+        if info is not None:
+            opening = None if opening is not None else FENCE + info
+    return opening
+
+
+def cut_chunk(text: str, limit: int) -> Tuple[str, str]:
+    """
+    Separa o maior trecho inicial que cabe em `limit`, cortando de preferência entre
+    parágrafos, depois entre linhas, frases e palavras. Se o corte cair dentro de um bloco
+    de código, fecha o bloco no trecho e o reabre no restante. Retorna (trecho, restante);
+    o restante é sempre menor que o texto, para que quem chama em laço sempre termine.
+    """
+    if len(text) <= limit:
+        return text, ""
+
+    # Reserva espaço para o fechamento do bloco de código, se for necessário
+    window = limit - len(FENCE) - 1
+    position, skip = window, 0
+    for separator, size in _BOUNDARIES:
+        found = text.rfind(separator, 0, window)
+        # Cortes muito no começo gerariam mensagens minúsculas: tenta o próximo tipo de separador
+        if found >= window // 2:
+            # Em ". " o ponto fica no trecho; o espaço é descartado
+            position = found + (len(separator) - size)
+            skip = size
+            break
+
+    head, rest = text[:position].rstrip(" "), text[position + skip:]
+    fence = _open_fence(head)
+    if fence is not None:
+        head += "\n" + FENCE
+        rest = fence + "\n" + rest
+    if len(rest) >= len(text):
+        # Reabrir o bloco não deixaria o texto menor: corte seco, sem tratar o markdown
+        return text[:limit], text[limit:]
+    return head, rest
+
+
+def split_text(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Divide o texto em trechos de até `limit` caracteres, respeitando parágrafos e markdown."""
+    chunks = []
+    rest = text.strip()
+    while rest:
+        chunk, rest = cut_chunk(rest, limit)
+        if chunk.strip():
+            chunks.append(chunk)
+    return chunks
+
+
+def pack_embeds(text: str, min_embed: int = 500) -> List[List[str]]:
+    """
+    Divide o texto em grupos de embeds, um grupo por mensagem, preenchendo cada mensagem até
+    o limite total de caracteres dos embeds antes de passar para a próxima.
+    """
+    groups: List[List[str]] = []
+    rest = text.strip()
+    while rest:
+        group: List[str] = []
+        budget = EMBEDS_TOTAL_LIMIT
+        # Sobras pequenas do orçamento viram a próxima mensagem, em vez de um embed minúsculo
+        while rest and len(group) < EMBEDS_PER_MESSAGE and budget >= min_embed:
+            chunk, rest = cut_chunk(rest, min(EMBED_DESCRIPTION_LIMIT, budget))
+            if chunk.strip():
+                group.append(chunk)
+                budget -= len(chunk)
+        if group:
+            groups.append(group)
+    return groups
+
+
+async def deliver(send: Callable[..., Awaitable[discord.Message]], text: str,
+                  use_embeds: bool = True, attachment_threshold: Optional[int] = 8000,
+                  filename: str = "resposta.md",
+                  attachment_notice: str = "📄 A resposta é longa, então foi enviada como arquivo.") -> List[discord.Message]:
+    """
+    Envia um texto longo com o menor número de chamadas à API: uma mensagem simples se couber,
+    senão trechos agrupados em embeds (até 6000 caracteres por mensagem) ou, acima de
+    `attachment_threshold` caracteres, um único arquivo. `send` é `message.reply` ou `ctx.send`.
+    """
+    text = text.strip()
+    if len(text) <= MESSAGE_LIMIT:
+        return [await send(text)]
+
+    if attachment_threshold and len(text) > attachment_threshold:
+        attachment = discord.File(fp=BytesIO(text.encode("utf-8")), filename=filename)
+        return [await send(attachment_notice, file=attachment)]
+
+    sent = []
+    if use_embeds:
+        for group in pack_embeds(text):
+            sent.append(await send(embeds=[discord.Embed(description=chunk) for chunk in group]))
+    else:
+        for chunk in split_text(text, MESSAGE_LIMIT):
+            sent.append(await send(chunk))
+    return sent
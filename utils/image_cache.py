@@ -0,0 +1,147 @@
+# utils/image_cache.py
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ImageCache:
+    """
+    Cache em disco de imagens geradas, endereçado pela chave do pedido (prompt + modelo +
+    formato). O índice fica em memória em ordem LRU e os arquivos mais antigos são removidos
+    quando o tamanho total passa do limite. Arquivos gravados por outros processos que usam o
+    mesmo diretório são encontrados no disco. Todo acesso a disco roda fora do event loop.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 500 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        """
+        Reconstrói o índice a partir dos arquivos já existentes no diretório. Pode rodar com o
+        bot já atendendo: entradas indexadas durante a varredura são mantidas.
+        """
+        entries = await asyncio.to_thread(self._scan)
+        # Os arquivos antigos entram antes (menos recentes) das entradas indexadas na varredura
+        for key, path, size in reversed(entries):
+            if key in self._index:
+                continue
+            self._index[key] = (path, size)
+            self._index.move_to_end(key, last=False)
+            self._total += size
+        await self._evict()
+
+    def _scan(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, os.path.splitext(name)[0], path, stat.st_size))
+        # Menos usados primeiro (o mtime é atualizado a cada acerto)
+        entries.sort()
+        return [(key, path, size) for _, key, path, size in entries]
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{extension}")
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """Retorna (bytes, extensão) da imagem em cache, ou None."""
+        entry = self._index.get(key)
+        if entry is None:
+            # Outro processo (cluster de shards) pode ter gerado a imagem no mesmo diretório
+            entry = await asyncio.to_thread(self._probe, key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._index[key] = entry
+            self._total += entry[1]
+        path, _ = entry
+        try:
+            data = await asyncio.to_thread(self._read, path)
+        except FileNotFoundError:
+            self._forget(key)
+            self.misses += 1
+            return None
+        self._index.move_to_end(key)
+        self.hits += 1
+        return data, os.path.splitext(path)[1][1:]
+
+    def _probe(self, key: str) -> Optional[Tuple[str, int]]:
+        directory = os.path.dirname(self._path(key, ""))
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.startswith(key + ".") and not name.endswith(".tmp"):
+                path = os.path.join(directory, name)
+                return path, os.path.getsize(path)
+        return None
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        return data
+
+    async def set(self, key: str, data: bytes, extension: str):
+        """Armazena a imagem e remove as menos usadas se o limite for ultrapassado."""
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key, extension)
+        await asyncio.to_thread(self._write, path, data)
+        self._forget(key)
+        self._index[key] = (path, len(data))
+        self._total += len(data)
+        await self._evict()
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def _forget(self, key: str):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._total -= entry[1]
+
+    async def _evict(self):
+        removed = []
+        while self._total > self.max_bytes and self._index:
+            _, (path, size) = self._index.popitem(last=False)
+            self._total -= size
+            removed.append(path)
+        if removed:
+            await asyncio.to_thread(self._remove, removed)
+
+    @staticmethod
+    def _remove(paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna ocupação e contadores do cache de imagens."""
+        return {
+            "entries": len(self._index),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
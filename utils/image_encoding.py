@@ -0,0 +1,72 @@
+# utils/image_encoding.py
+
+from io import BytesIO
+from typing import Tuple
+
+from PIL import Image
+
+# Extensão de arquivo usada para cada formato suportado
+EXTENSIONS = {"PNG": "png", "WEBP": "webp", "JPEG": "jpg"}
+
+
+def _save(image: Image.Image, fmt: str, quality: int) -> bytes:
+    buffer = BytesIO()
+    if fmt == "PNG":
+        image.save(buffer, format="PNG", optimize=True)
+    elif fmt == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _fit_quality(image: Image.Image, fmt: str, max_bytes: int, quality: int, min_quality: int) -> Tuple[bytes, bool]:
+    """Busca binária pela maior qualidade que cabe no limite."""
+    data = _save(image, fmt, quality)
+    if len(data) <= max_bytes:
+        return data, True
+
+    best = None
+    low, high = min_quality, quality - 1
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = _save(image, fmt, middle)
+        if len(candidate) <= max_bytes:
+            best = candidate
+            low = middle + 1
+        else:
+            high = middle - 1
+    if best is not None:
+        return best, True
+    return _save(image, fmt, min_quality), False
+
+
+def encode_image(image: Image.Image, fmt: str = "WEBP", max_bytes: int = 10 * 1024 * 1024,
+                 quality: int = 90, min_quality: int = 40) -> Tuple[bytes, str]:
+    """
+    Codifica a imagem no formato pedido garantindo que caiba em `max_bytes`: reduz a
+    qualidade (formatos com perda), troca PNG por WEBP e, em último caso, reduz a resolução.
+    Pensada para rodar em um processo separado, já que a codificação é pesada em CPU.
+    Retorna os bytes e a extensão do arquivo.
+    """
+    fmt = fmt.upper()
+    if fmt == "JPG":
+        fmt = "JPEG"
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Formato de imagem não suportado: {fmt}")
+
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    if fmt == "PNG":
+        data = _save(image, fmt, quality)
+        if len(data) <= max_bytes:
+            return data, EXTENSIONS[fmt]
+        # PNG não tem qualidade ajustável: passa para WEBP
+        fmt = "WEBP"
+
+    while True:
+        data, fits = _fit_quality(image, fmt, max_bytes, quality, min_quality)
+        if fits or min(image.size) <= 64:
+            return data, EXTENSIONS[fmt]
+        image = image.resize((int(image.width * 0.75), int(image.height * 0.75)), Image.LANCZOS)
@@ -0,0 +1,235 @@
+# utils/image_queue.py
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+
+class QueueFullError(Exception):
+    """A fila de imagens atingiu o limite de pedidos pendentes."""
+
+
+class JobCancelledError(Exception):
+    """O pedido foi abandonado por quem o fez."""
+
+
+class ImageJob:
+    """Um pedido de geração de imagem. Pedidos idênticos compartilham o mesmo job."""
+
+    PENDING = "pendente"
+    RUNNING = "executando"
+    DONE = "concluido"
+    CANCELLED = "cancelado"
+
+    def __init__(self, key: Hashable, factory: Callable[[], Awaitable[Any]], priority: int, seq: int):
+        self.key = key
+        self.factory = factory
+        self.priority = priority
+        self.seq = seq
+        self.state = self.PENDING
+        self.started_at = 0.0
+        # assinante (id da mensagem) -> (id do usuário, future entregue ao assinante)
+        self.waiters: Dict[Hashable, Tuple[Hashable, asyncio.Future]] = {}
+
+    def __lt__(self, other: "ImageJob") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class ImageJobQueue:
+    """
+    Fila limitada de geração de imagens, atendida por um conjunto fixo de workers que usam
+    um pool de threads próprio (sem disputar o executor padrão do event loop). Pedidos têm
+    prioridade por servidor, podem ser cancelados por quem pediu e informam posição e ETA.
+
+    Uma chamada que estoura o prazo continua ocupando sua thread até o servidor responder,
+    então o pool tem `threads` threads (mais que `workers`): a nova tentativa de um worker
+    não fica presa atrás da chamada travada da tentativa anterior.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 50, default_duration: float = 20.0,
+                 threads: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.threads = max(self.workers, threads or self.workers)
+        self.max_pending = max_pending
+        self.default_duration = default_duration
+
+        self._heap: List[ImageJob] = []
+        self._ready = asyncio.Semaphore(0)
+        self._jobs: Dict[Hashable, ImageJob] = {}
+        self._by_subscriber: Dict[Hashable, ImageJob] = {}
+        self._seq = itertools.count()
+        self._pending = 0
+        self._running = 0
+        self._durations: Deque[float] = deque(maxlen=50)
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.saved = 0
+
+    def start(self):
+        """Inicia os workers. Deve ser chamado com o event loop em execução."""
+        if self._tasks:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="imagem")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Encerra os workers e cancela os pedidos pendentes."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in list(self._jobs.values()):
+            for _, future in job.waiters.values():
+                self._abandon(future)
+        self._jobs.clear()
+        self._by_subscriber.clear()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run_blocking(self, func: Callable[[], Any]) -> Any:
+        """Executa uma função bloqueante no pool de threads dedicado da fila."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func)
+
+    def submit(self, key: Hashable, factory: Callable[[], Awaitable[Any]], subscriber: Hashable,
+               user_id: Hashable, priority: int = 10) -> Tuple[ImageJob, asyncio.Future]:
+        """
+        Enfileira `factory()` (ou se junta a um job idêntico já na fila) e retorna o job e a
+        future que recebe o resultado deste assinante.
+        """
+        job = self._jobs.get(key)
+        if job is not None:
+            self.saved += 1
+            # Um assinante com prioridade maior adianta o job compartilhado
+            if job.state == ImageJob.PENDING and priority < job.priority:
+                job.priority = priority
+                heapq.heapify(self._heap)
+        else:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Fila de imagens cheia ({self.max_pending} pedidos pendentes)")
+            job = ImageJob(key, factory, priority, next(self._seq))
+            self._jobs[key] = job
+            heapq.heappush(self._heap, job)
+            self._pending += 1
+            self._ready.release()
+
+        future = asyncio.get_running_loop().create_future()
+        job.waiters[subscriber] = (user_id, future)
+        self._by_subscriber[subscriber] = job
+        return job, future
+
+    def unsubscribe(self, subscriber: Hashable) -> bool:
+        """Desiste do pedido. O job só é cancelado quando ninguém mais espera por ele."""
+        job = self._by_subscriber.pop(subscriber, None)
+        if job is None:
+            return False
+        _, future = job.waiters.pop(subscriber)
+        self._abandon(future)
+        if not job.waiters and job.state == ImageJob.PENDING:
+            job.state = ImageJob.CANCELLED
+            self._pending -= 1
+            del self._jobs[job.key]
+            self.cancelled += 1
+        return True
+
+    @staticmethod
+    def _abandon(future: asyncio.Future):
+        if future.done():
+            return
+        future.set_exception(JobCancelledError())
+        # Quem ainda espera recebe a exceção normalmente; isto só evita o aviso de
+        # "exception was never retrieved" quando o assinante já foi embora
+        future.exception()
+
+    def cancel_user(self, user_id: Hashable) -> int:
+        """Cancela todos os pedidos ainda pendentes do usuário. Retorna quantos foram cancelados."""
+        subscribers = [
+            subscriber for subscriber, job in self._by_subscriber.items()
+            if job.state == ImageJob.PENDING and job.waiters[subscriber][0] == user_id
+        ]
+        for subscriber in subscribers:
+            self.unsubscribe(subscriber)
+        return len(subscribers)
+
+    def position(self, job: ImageJob) -> int:
+        """Quantos pedidos pendentes estão à frente do job (0 se já estiver em execução)."""
+        if job.state != ImageJob.PENDING:
+            return 0
+        return sum(1 for other in self._heap if other.state == ImageJob.PENDING and other < job)
+
+    def average_duration(self) -> float:
+        if not self._durations:
+            return self.default_duration
+        return sum(self._durations) / len(self._durations)
+
+    def eta(self, job: ImageJob) -> float:
+        """Estimativa, em segundos, até o job terminar."""
+        duration = self.average_duration()
+        if job.state == ImageJob.RUNNING:
+            return max(0.0, duration - (time.monotonic() - job.started_at))
+        if job.state != ImageJob.PENDING:
+            return 0.0
+        return (self.position(job) // self.workers + 1) * duration
+
+    async def _worker(self):
+        while True:
+            await self._ready.acquire()
+            job = heapq.heappop(self._heap)
+            if job.state != ImageJob.PENDING:
+                continue
+
+            job.state = ImageJob.RUNNING
+            job.started_at = time.monotonic()
+            self._pending -= 1
+            self._running += 1
+            try:
+                result = await job.factory()
+            except asyncio.CancelledError:
+                self._finish(job, error=asyncio.CancelledError())
+                raise
+            except Exception as e:
+                self.failed += 1
+                self._finish(job, error=e)
+            else:
+                self.completed += 1
+                self._durations.append(time.monotonic() - job.started_at)
+                self._finish(job, result=result)
+
+    def _finish(self, job: ImageJob, result: Any = None, error: Optional[BaseException] = None):
+        job.state = ImageJob.DONE
+        self._running -= 1
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        for subscriber, (_, future) in job.waiters.items():
+            self._by_subscriber.pop(subscriber, None)
+            if future.done():
+                continue
+            if isinstance(error, asyncio.CancelledError):
+                self._abandon(future)
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        job.waiters.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna ocupação da fila e contadores."""
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "running": self._running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "saved": self.saved,
+            "avg_duration": self.average_duration(),
+        }
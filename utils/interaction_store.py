@@ -0,0 +1,272 @@
+# utils/interaction_store.py
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from utils.metrics import metrics
+
+# Colunas gravadas por interação, na ordem do INSERT
+_INTERACTION_COLUMNS = (
+    "ts", "guild_id", "channel_id", "user_id", "kind", "persona",
+    "question", "answer", "latency_ms", "status", "correlation_id"
+)
+
+# Linhas removidas por transação na limpeza, para não segurar o arquivo por muito tempo
+_DELETE_CHUNK = 5000
+
+
+class InteractionStore:
+    """
+    Histórico persistente de perguntas, respostas, latências e alterações de configuração,
+    em SQLite (modo WAL). `record_interaction` e `record_config` só enfileiram em memória:
+    uma tarefa de gravação junta os registros em lotes e grava cada lote em uma única
+    transação, fora do event loop, então o atendimento nunca espera pelo disco. Uma limpeza
+    periódica aplica a retenção e o número máximo de registros, mantendo o arquivo limitado.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 20000, retention_days: float = 90, max_rows: int = 500000,
+                 compaction_interval: float = 3600.0, logger=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retention = retention_days * 86400
+        self.max_rows = max_rows
+        self.compaction_interval = compaction_interval
+        self.logger = logger
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Conexão de escrita, usada só pela tarefa de gravação e pela limpeza
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        # Só vale para arquivos novos: permite devolver ao disco as páginas liberadas pela limpeza
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Em WAL, NORMAL não sincroniza o disco a cada commit, só nos checkpoints
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS interactions ("
+            "id INTEGER PRIMARY KEY, ts REAL NOT NULL, guild_id INTEGER, channel_id INTEGER, "
+            "user_id INTEGER NOT NULL, kind TEXT NOT NULL, persona TEXT, question TEXT NOT NULL, "
+            "answer TEXT, latency_ms REAL, status TEXT NOT NULL, correlation_id TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_interactions_user ON interactions(user_id, ts)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_interactions_guild ON interactions(guild_id, ts)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_interactions_ts ON interactions(ts)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS config_changes ("
+            "id INTEGER PRIMARY KEY, ts REAL NOT NULL, guild_id INTEGER, user_id INTEGER, "
+            "section TEXT NOT NULL, value TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_config_changes_ts ON config_changes(ts)")
+        # Consultas usam outra conexão: em WAL, leitores não esperam pela gravação de um lote
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False, timeout=10)
+
+        self._pending: Deque[Tuple[str, tuple]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._last_compaction = time.monotonic()
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.removed = 0
+
+    def start(self):
+        """Inicia a tarefa de gravação (precisa de um event loop em execução)."""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def record_interaction(self, user_id: int, question: str, answer: Optional[str], status: str,
+                           kind: str = "texto", guild_id: Optional[int] = None,
+                           channel_id: Optional[int] = None, persona: Optional[str] = None,
+                           latency: Optional[float] = None, correlation_id: str = ""):
+        """Enfileira uma interação; `latency` em segundos. Não bloqueia."""
+        self._enqueue("interactions", (
+            time.time(), guild_id, channel_id, user_id, kind, persona, question, answer,
+            latency * 1000 if latency is not None else None, status, correlation_id or None
+        ))
+
+    def record_config(self, section: str, value: Any, guild_id: Optional[int] = None,
+                      user_id: Optional[int] = None):
+        """Enfileira uma alteração de configuração feita por comando. Não bloqueia."""
+        self._enqueue("config_changes", (
+            time.time(), guild_id, user_id, section, json.dumps(value, ensure_ascii=False, default=str)
+        ))
+
+    def _enqueue(self, table: str, row: tuple):
+        self._pending.append((table, row))
+        # Com o disco travado por muito tempo, descarta os registros mais antigos em vez de
+        # crescer sem limite
+        while len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if time.monotonic() - self._last_compaction >= self.compaction_interval:
+                self._last_compaction = time.monotonic()
+                await self.compact()
+
+    async def flush(self):
+        """Grava os registros pendentes, em lotes de até `batch_size`, um commit por lote."""
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                with metrics.timer("etapa_segundos", etapa="historico_gravacao"):
+                    await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                # Devolve o lote à fila e tenta de novo no próximo ciclo
+                self._pending.extendleft(reversed(batch))
+                if self.logger:
+                    self.logger.error("Erro ao gravar o histórico: %s", e, exc_info=True)
+                return
+            self.written += len(batch)
+            self.batches += 1
+
+    def _write(self, batch: List[Tuple[str, tuple]]):
+        interactions = [row for table, row in batch if table == "interactions"]
+        configs = [row for table, row in batch if table == "config_changes"]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if interactions:
+                    self._conn.executemany(
+                        f"INSERT INTO interactions ({', '.join(_INTERACTION_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(_INTERACTION_COLUMNS))})",
+                        interactions
+                    )
+                if configs:
+                    self._conn.executemany(
+                        "INSERT INTO config_changes (ts, guild_id, user_id, section, value) VALUES (?, ?, ?, ?, ?)",
+                        configs
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def compact(self) -> int:
+        """Aplica a retenção e o limite de registros e devolve o espaço livre ao disco."""
+        try:
+            removed = await asyncio.to_thread(self._compact, time.time())
+        except Exception as e:
+            if self.logger:
+                self.logger.error("Erro na limpeza do histórico: %s", e, exc_info=True)
+            return 0
+        self.removed += removed
+        if removed and self.logger:
+            self.logger.info("Limpeza do histórico: %d registro(s) removido(s)", removed)
+        return removed
+
+    def _compact(self, now: float) -> int:
+        cutoff = now - self.retention
+        removed = 0
+        for table in ("interactions", "config_changes"):
+            removed += self._delete_chunks(
+                f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE ts < ? LIMIT ?)", (cutoff,)
+            )
+        # Acima do limite, remove as interações mais antigas (ids crescem com o tempo)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM interactions ORDER BY id DESC LIMIT 1 OFFSET ?", (self.max_rows,)
+            ).fetchone()
+        if row is not None:
+            removed += self._delete_chunks(
+                "DELETE FROM interactions WHERE id IN (SELECT id FROM interactions WHERE id <= ? LIMIT ?)", (row[0],)
+            )
+        if removed:
+            with self._lock:
+                self._conn.execute("PRAGMA incremental_vacuum")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def _delete_chunks(self, sql: str, params: tuple) -> int:
+        removed = 0
+        while True:
+            with self._lock:
+                count = self._conn.execute(sql, params + (_DELETE_CHUNK,)).rowcount
+            removed += count
+            if count < _DELETE_CHUNK:
+                return removed
+
+    async def by_user(self, user_id: int, guild_id: Optional[int] = None,
+                      since: Optional[float] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Interações mais recentes do usuário (opcionalmente em um servidor e a partir de `since`)."""
+        sql = "SELECT * FROM interactions WHERE user_id = ?"
+        params: list = [user_id]
+        if guild_id is not None:
+            sql += " AND guild_id = ?"
+            params.append(guild_id)
+        if since is not None:
+            sql += " AND ts >= ?"
+            params.append(since)
+        return await asyncio.to_thread(self._query, sql + " ORDER BY ts DESC LIMIT ?", params + [limit])
+
+    async def by_guild(self, guild_id: int, since: Optional[float] = None,
+                       until: Optional[float] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Interações mais recentes de um servidor, opcionalmente em um intervalo de tempo."""
+        sql = "SELECT * FROM interactions WHERE guild_id = ?"
+        params: list = [guild_id]
+        if since is not None:
+            sql += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND ts < ?"
+            params.append(until)
+        return await asyncio.to_thread(self._query, sql + " ORDER BY ts DESC LIMIT ?", params + [limit])
+
+    async def config_history(self, guild_id: Optional[int] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Alterações de configuração mais recentes (de um servidor ou de todos)."""
+        if guild_id is None:
+            return await asyncio.to_thread(
+                self._query, "SELECT * FROM config_changes ORDER BY ts DESC LIMIT ?", [limit]
+            )
+        return await asyncio.to_thread(
+            self._query, "SELECT * FROM config_changes WHERE guild_id = ? ORDER BY ts DESC LIMIT ?", [guild_id, limit]
+        )
+
+    def _query(self, sql: str, params: list) -> List[Dict[str, Any]]:
+        with self._read_lock:
+            cursor = self._reader.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "removed": self.removed,
+        }
+
+    async def close(self):
+        """Grava o que estiver pendente e fecha o arquivo."""
+        self._closing = True
+        if self._task:
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        with self._lock:
+            self._conn.close()
+        with self._read_lock:
+            self._reader.close()
@@ -0,0 +1,161 @@
+# utils/log_reader.py
+
+import bisect
+import json
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Cabeçalho de cada registro: "2024-01-01 12:00:00,123 - GeminiCog - INFO - mensagem"
+_HEADER = re.compile(
+    r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d{3} - (\S+) - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - "
+)
+# No modo JSON lines cada linha é um objeto que começa pelo mesmo carimbo de tempo
+_HEADER_BYTES = re.compile(rb'^(?:\{"ts": ")?(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d{3}')
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+
+class _FileIndex:
+    """Índice esparso (timestamp, offset) de um arquivo de log, a cada `stride` bytes."""
+
+    __slots__ = ("identity", "size", "timestamps", "offsets", "next_mark")
+
+    def __init__(self, identity: Tuple[int, int]):
+        self.identity = identity
+        self.size = 0
+        self.timestamps: List[str] = []
+        self.offsets: List[int] = []
+        self.next_mark = 0
+
+
+class LogReader:
+    """
+    Leitura eficiente dos logs para o comando `!logs`: lê os arquivos de trás para frente
+    em blocos (só o necessário), continua pelos backups rotacionados (`bot.log.1`, ...) e
+    filtra por nível, logger e intervalo de tempo. Para consultas com limite superior de
+    tempo, um índice esparso de offsets evita ler o final do arquivo à toa.
+    Os métodos são bloqueantes: devem ser chamados fora do event loop.
+    """
+
+    def __init__(self, log_file: str, backup_count: int = 5, block_size: int = 8192,
+                 index_stride: int = 64 * 1024):
+        self.log_file = log_file
+        self.backup_count = backup_count
+        self.block_size = block_size
+        self.index_stride = index_stride
+        self._indexes: Dict[str, _FileIndex] = {}
+
+    def files(self) -> List[str]:
+        """Arquivos de log existentes, do mais novo para o mais antigo."""
+        candidates = [self.log_file] + [f"{self.log_file}.{i}" for i in range(1, self.backup_count + 1)]
+        return [path for path in candidates if os.path.exists(path)]
+
+    def query(self, lines: int = 10, level: Optional[str] = None, name: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None) -> List[str]:
+        """
+        Retorna os `lines` registros mais recentes que passam nos filtros, em ordem
+        cronológica. `since` e `until` usam o formato "AAAA-MM-DD HH:MM:SS".
+        """
+        min_level = LEVELS.get(level.upper(), 0) if level else 0
+        records: List[str] = []
+
+        for path in self.files():
+            end = self._end_offset(path, until) if until else None
+            for timestamp, record_name, record_level, text in self._reverse_records(path, end):
+                if since and timestamp and timestamp < since:
+                    # Arquivos e registros vêm do mais novo para o mais antigo: nada mais serve
+                    return list(reversed(records))
+                if until and timestamp and timestamp > until:
+                    continue
+                if min_level and LEVELS.get(record_level, 0) < min_level:
+                    continue
+                if name and record_name != name:
+                    continue
+                records.append(text)
+                if len(records) >= lines:
+                    return list(reversed(records))
+
+        return list(reversed(records))
+
+    def _reverse_lines(self, path: str, end: Optional[int] = None) -> Iterator[str]:
+        """Lê as linhas do arquivo de trás para frente, em blocos."""
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell() if end is None else min(end, f.tell())
+            remainder = b""
+            while position > 0:
+                size = min(self.block_size, position)
+                position -= size
+                f.seek(position)
+                parts = (f.read(size) + remainder).split(b"\n")
+                remainder = parts.pop(0)
+                for line in reversed(parts):
+                    if line:
+                        yield line.decode("utf-8", "replace")
+            if remainder:
+                yield remainder.decode("utf-8", "replace")
+
+    def _reverse_records(self, path: str, end: Optional[int] = None) -> Iterator[Tuple[str, str, str, str]]:
+        """Agrupa linhas de continuação (ex.: tracebacks) com o cabeçalho do registro."""
+        continuation: List[str] = []
+        for line in self._reverse_lines(path, end):
+            if line.startswith("{"):
+                record = self._parse_json(line)
+                if record is not None:
+                    yield record
+                    continue
+            match = _HEADER.match(line)
+            if match is None:
+                continuation.append(line)
+                continue
+            text = "\n".join([line] + list(reversed(continuation))) + "\n"
+            continuation = []
+            yield match.group(1), match.group(2), match.group(3), text
+        if continuation:
+            yield "", "", "", "\n".join(reversed(continuation)) + "\n"
+
+    @staticmethod
+    def _parse_json(line: str) -> Optional[Tuple[str, str, str, str]]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        return entry.get("ts", "")[:19], entry.get("logger", ""), entry.get("level", ""), line + "\n"
+
+    def _end_offset(self, path: str, until: str) -> Optional[int]:
+        """Offset a partir do qual todos os registros são posteriores a `until`."""
+        index = self._index(path)
+        position = bisect.bisect_right(index.timestamps, until)
+        if position < len(index.offsets):
+            return index.offsets[position]
+        return None
+
+    def _index(self, path: str) -> _FileIndex:
+        stat = os.stat(path)
+        identity = (stat.st_ino, stat.st_dev)
+        index = self._indexes.get(path)
+        # Rotação troca o arquivo por trás do nome; arquivo menor também invalida o índice
+        if index is None or index.identity != identity or stat.st_size < index.size:
+            index = self._indexes[path] = _FileIndex(identity)
+        if stat.st_size > index.size:
+            self._extend(path, index)
+        return index
+
+    def _extend(self, path: str, index: _FileIndex):
+        # Só indexa o trecho novo do arquivo (o log ativo cresce; os backups não mudam)
+        with open(path, "rb") as f:
+            f.seek(index.size)
+            offset = index.size
+            for line in f:
+                if offset >= index.next_mark:
+                    match = _HEADER_BYTES.match(line)
+                    if match:
+                        index.timestamps.append(match.group(1).decode("ascii"))
+                        index.offsets.append(offset)
+                        index.next_mark = offset + self.index_stride
+                if not line.endswith(b"\n"):
+                    # Linha ainda sendo escrita: indexa na próxima vez
+                    break
+                offset += len(line)
+            index.size = offset
@@ -1,51 +1,174 @@
 # utils/logger.py
 
+import asyncio
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
-from typing import List
+import os
+import queue
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+from utils.cluster import current_cluster
+from utils.config import load_config
+from utils.log_reader import LogReader
+
+# Identificador que liga uma mensagem do Discord à chamada ao Gemini e à resposta enviada.
+# Tarefas criadas a partir de um handler herdam o valor automaticamente.
+correlation_id: ContextVar[str] = ContextVar("correlation_id", default="")
+
+
+def new_correlation_id() -> str:
+    """Gera um novo ID de correlação e o associa à tarefa atual."""
+    value = uuid.uuid4().hex[:8]
+    correlation_id.set(value)
+    return value
+
+
+class _CorrelationFilter(logging.Filter):
+    """Anexa o ID de correlação da tarefa atual ao registro."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        record.correlation = f"[{record.correlation_id}] " if record.correlation_id else ""
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Envia os registros para a fila do listener. Só resolve a mensagem (formatação `%`)
+    e o traceback; o formato final é aplicado na thread do listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Formato JSON lines: um objeto por linha, com o mesmo carimbo de tempo do formato texto."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", ""):
+            entry["correlation_id"] = record.correlation_id
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_level = logging.DEBUG
+
+
+def _pipeline(log_file: str) -> QueueHandler:
+    """
+    Cria (uma única vez por processo) o pipeline de logging: os loggers só colocam os
+    registros em uma fila e uma thread em segundo plano escreve no arquivo e no console,
+    mantendo a latência de disco fora do event loop.
+    """
+    global _listener, _queue_handler, _level
+    if _queue_handler is not None:
+        return _queue_handler
+
+    logs = load_config().get("logs", {})
+    _level = logging.getLevelName(logs.get("nivel", "DEBUG").upper())
+    if not isinstance(_level, int):
+        _level = logging.DEBUG
+
+    # Formato do log
+    if logs.get("formato", "texto") == "json":
+        file_formatter = JsonFormatter()
+    else:
+        file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(correlation)s%(message)s')
+    console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(correlation)s%(message)s')
+
+    # Handler para escrever em arquivo com rotação
+    file_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=5, encoding='utf-8')
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(file_formatter)
+
+    # Handler para exibir no console
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(console_formatter)
+
+    _queue_handler = _DeferredQueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(_CorrelationFilter())
+    _listener = QueueListener(_queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    # Garante que o que ainda está na fila seja escrito ao encerrar
+    atexit.register(flush_logs)
+    return _queue_handler
+
+
+def flush_logs():
+    """Escreve o que ainda estiver na fila e encerra a thread do listener."""
+    global _listener
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
 
 class Logger:
     """Configuração personalizada de logging."""
 
     def __init__(self, name: str = 'DiscordBot', log_file: str = 'bot.log'):
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(logging.DEBUG)
-        
+        # Cada cluster de shards escreve no próprio arquivo: a rotação não é segura entre processos
+        cluster = current_cluster()
+        if cluster is not None:
+            root, extension = os.path.splitext(log_file)
+            log_file = f"{root}-cluster{cluster}{extension}"
+        self.log_file = log_file
+        self.reader = LogReader(log_file, backup_count=5)
+
+        handler = _pipeline(log_file)
+        # Níveis desativados em `logs.nivel` são descartados antes de qualquer formatação
+        self.logger.setLevel(_level)
+        self.logger.propagate = False
+
         # Evita adicionar múltiplos handlers caso o logger seja instanciado várias vezes
-        if not self.logger.handlers:
-            # Formato do log
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            
-            # Handler para escrever em arquivo com rotação
-            file_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=5)
-            file_handler.setLevel(logging.DEBUG)
-            file_handler.setFormatter(formatter)
-            
-            # Handler para exibir no console
-            console_handler = logging.StreamHandler()
-            console_handler.setLevel(logging.INFO)
-            console_handler.setFormatter(formatter)
-            
-            # Adiciona os handlers ao logger
-            self.logger.addHandler(file_handler)
-            self.logger.addHandler(console_handler)
-    
-    def debug(self, message: str):
-        self.logger.debug(message)
-    
-    def info(self, message: str):
-        self.logger.info(message)
-    
-    def warning(self, message: str):
-        self.logger.warning(message)
-    
-    def error(self, message: str, exc_info: bool = False):
-        self.logger.error(message, exc_info=exc_info)
-    
-    def get_latest_logs(self, lines: int = 10) -> List[str]:
-        """Retorna as últimas linhas do arquivo de log."""
-        try:
-            with open('bot.log', 'r', encoding='utf-8') as f:
-                return f.readlines()[-lines:]
-        except FileNotFoundError:
+        if handler not in self.logger.handlers:
+            self.logger.addHandler(handler)
+
+    # As mensagens aceitam argumentos no estilo `%` ("Usuário %s", user_id), formatados
+    # apenas se o nível estiver ativo
+    def debug(self, message: str, *args):
+        self.logger.debug(message, *args)
+
+    def info(self, message: str, *args):
+        self.logger.info(message, *args)
+
+    def warning(self, message: str, *args):
+        self.logger.warning(message, *args)
+
+    def error(self, message: str, *args, exc_info: bool = False):
+        self.logger.error(message, *args, exc_info=exc_info)
+
+    def is_enabled(self, level: int) -> bool:
+        """Permite pular trabalho caro de preparação de logs quando o nível está desativado."""
+        return self.logger.isEnabledFor(level)
+
+    def get_latest_logs(self, lines: int = 10, level: Optional[str] = None, name: Optional[str] = None,
+                        since: Optional[str] = None, until: Optional[str] = None) -> List[str]:
+        """Retorna os últimos registros do log, incluindo os arquivos rotacionados, com filtros opcionais."""
+        if not self.reader.files():
             return ["Arquivo de log não encontrado."]
+        return self.reader.query(lines, level=level, name=name, since=since, until=until)
+
+    async def query_logs(self, lines: int = 10, level: Optional[str] = None, name: Optional[str] = None,
+                         since: Optional[str] = None, until: Optional[str] = None) -> List[str]:
+        """Versão de `get_latest_logs` que faz a leitura dos arquivos fora do event loop."""
+        return await asyncio.to_thread(self.get_latest_logs, lines, level, name, since, until)
@@ -0,0 +1,242 @@
+# utils/metrics.py
+
+import bisect
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Limites dos buckets dos histogramas, em segundos: progressão geométrica de razão √2,
+# de 10 µs até ~4 min. Os percentis são estimados com erro relativo abaixo de ~41%
+# no pior caso (tipicamente bem menor, pela interpolação dentro do bucket).
+DEFAULT_BUCKETS: Tuple[float, ...] = tuple(1e-5 * 2 ** (i / 2) for i in range(50))
+
+Labels = Tuple[Tuple[str, str], ...]
+
+INF_LABEL = 'le="+Inf"'
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """
+    Histograma de latências com buckets fixos: memória constante e registro em O(log n),
+    sem guardar as amostras. Os percentis são interpolados dentro do bucket.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        # Um bucket a mais para valores acima do último limite
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimativa do percentil `q` (0 a 1), ou None se não houver amostras."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            if bucket and seen + bucket >= rank:
+                low = self.bounds[index - 1] if index > 0 else 0.0
+                high = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(low + (high - low) * (rank - seen) / bucket, self.max)
+            seen += bucket
+        return self.max
+
+
+class _Timer:
+    """Context manager que registra a duração do bloco em um histograma."""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Optional[Histogram]):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas do bot: contadores, histogramas de latência por etapa e gauges.
+    Os gauges são funções lidas apenas na consulta (`!stats` ou o endpoint HTTP), então
+    não custam nada no caminho das mensagens. Tudo roda no event loop, sem locks.
+    """
+
+    def __init__(self, prefix: str = "samelio", enabled: bool = True):
+        self.prefix = prefix
+        self.enabled = enabled
+        self._help: Dict[str, str] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[Labels, float]]] = {}
+        self._lookup: Dict[tuple, Histogram] = {}
+        self.overhead_ns: Optional[float] = None
+
+    def describe(self, name: str, help_text: str):
+        """Texto de ajuda exibido no formato Prometheus."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        series = self._counters.setdefault(name, {})
+        key = _labels(labels) if labels else ()
+        series[key] = series.get(key, 0) + value
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        # Atalho pela ordem dos argumentos de cada chamada, sem ordenar os rótulos
+        shortcut = (name, *labels.items())
+        histogram = self._lookup.get(shortcut)
+        if histogram is None:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.setdefault(_labels(labels), Histogram())
+            self._lookup[shortcut] = histogram
+        return histogram
+
+    def observe(self, name: str, seconds: float, **labels):
+        if self.enabled:
+            self.histogram(name, **labels).observe(seconds)
+
+    def timer(self, name: str, **labels) -> _Timer:
+        """`with metrics.timer("etapa"):` registra a duração do bloco em segundos."""
+        return _Timer(self.histogram(name, **labels) if self.enabled else None)
+
+    def gauge(self, name: str, callback: Callable[[], Any], help_text: str = ""):
+        """
+        Registra um gauge calculado na consulta. `callback` retorna um número ou um dicionário
+        {rótulo: valor}, cujas chaves viram o rótulo `tipo`.
+        """
+        def collect() -> Dict[Labels, float]:
+            value = callback()
+            if isinstance(value, dict):
+                return {(("tipo", str(key)),): float(item) for key, item in value.items()}
+            return {(): float(value)}
+
+        self._gauges[name] = collect
+        if help_text:
+            self._help[name] = help_text
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def counters(self, name: str) -> Dict[Labels, float]:
+        return dict(self._counters.get(name, {}))
+
+    def histograms(self) -> Dict[str, Dict[Labels, Histogram]]:
+        return self._histograms
+
+    def calibrate(self, iterations: int = 20000) -> float:
+        """Mede o custo de registrar uma duração com `timer()`, em nanossegundos."""
+        name = "_calibracao"
+        started = time.perf_counter()
+        for _ in range(iterations):
+            with self.timer(name, etapa="teste"):
+                pass
+        elapsed = time.perf_counter() - started
+        self._histograms.pop(name, None)
+        self._lookup.pop((name, ("etapa", "teste")), None)
+        self.overhead_ns = elapsed / iterations * 1e9
+        return self.overhead_ns
+
+    def render(self) -> str:
+        """Exporta todas as métricas no formato de texto do Prometheus."""
+        lines: List[str] = []
+
+        def header(name: str, kind: str):
+            full = f"{self.prefix}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        for name, series in sorted(self._counters.items()):
+            full = header(name, "counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{full}{_format_labels(labels)} {value:g}")
+
+        for name, collect in sorted(self._gauges.items()):
+            try:
+                series = collect()
+            except Exception:
+                # Um componente desativado ou com falha não pode derrubar a exportação
+                continue
+            full = header(name, "gauge")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{full}{_format_labels(labels)} {value:g}")
+
+        for name, series in sorted(self._histograms.items()):
+            full = header(name, "histogram")
+            for labels, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket in zip(histogram.bounds, histogram.counts):
+                    cumulative += bucket
+                    le = 'le="%.6g"' % bound
+                    lines.append(f"{full}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{full}_bucket{_format_labels(labels, INF_LABEL)} {histogram.count}")
+                lines.append(f"{full}_sum{_format_labels(labels)} {histogram.total:.6f}")
+                lines.append(f"{full}_count{_format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Endpoint HTTP local (`/metrics`) com as métricas no formato do Prometheus."""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        # aiohttp já é dependência do discord.py; importado aqui porque o endpoint é opcional
+        from aiohttp import web
+
+        async def handle(request: "web.Request") -> "web.Response":
+            return web.Response(
+                text=self.registry.render(),
+                content_type="text/plain",
+                charset="utf-8",
+                headers={"X-Prometheus-Format": "0.0.4"}
+            )
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# Registro compartilhado por todo o processo (bot e cogs)
+metrics = MetricsRegistry()
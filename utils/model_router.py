@@ -0,0 +1,173 @@
+# utils/model_router.py
+
+import re
+import time
+import unicodedata
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+FAST = "rapido"
+HEAVY = "pesado"
+AUTO = "auto"
+MODES = (AUTO, FAST, HEAVY)
+
+# Pedidos que costumam exigir raciocínio longo, independentemente do tamanho da pergunta
+_HEAVY_HINTS = re.compile(
+    r"\b(analis\w*|compar\w*|parecer|redij\w*|redigir|elabor\w*|fundamente\w*|"
+    r"caso concreto|jurisprudenc\w*|detalhad\w*|passo a passo|estudo de caso|peticao|"
+    r"argument\w*|critic\w*|hipotes\w*|quest(?:ao|oes) discursiv\w*)\b"
+)
+_SENTENCE_END = re.compile(r"[?.!;:]\s")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return text.encode("ascii", "ignore").decode("ascii")
+
+
+class ModelStats:
+    """
+    Latências e falhas das últimas `window` chamadas a um modelo, nos últimos `max_age`
+    segundos: um modelo evitado por estar com problemas volta a ser usado quando as
+    amostras ruins envelhecem. A latência é o tempo até o primeiro trecho da resposta, que
+    não cresce com o tamanho dela; chamadas sem essa medida contam só para a taxa de erros.
+    """
+
+    def __init__(self, window: int = 50, max_age: float = 300.0):
+        self.max_age = max_age
+        self._samples: Deque[Tuple[float, Optional[float], bool]] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, latency: Optional[float], ok: bool):
+        self._samples.append((time.monotonic(), latency, ok))
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+
+    @property
+    def samples(self) -> List[Tuple[Optional[float], bool]]:
+        """(latência, sucesso) das chamadas recentes."""
+        cutoff = time.monotonic() - self.max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return [(latency, ok) for _, latency, ok in self._samples]
+
+    def error_rate(self) -> float:
+        samples = self.samples
+        if not samples:
+            return 0.0
+        return sum(1 for _, ok in samples if not ok) / len(samples)
+
+    def latency(self, q: float = 0.5) -> Optional[float]:
+        """Percentil `q` das latências das chamadas bem-sucedidas recentes (None sem dados)."""
+        values = sorted(latency for latency, ok in self.samples if ok and latency is not None)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class ModelRouter:
+    """
+    Escolhe entre um modelo rápido e um pesado para cada pergunta. A classificação usa o
+    tamanho da pergunta, o número de frases, palavras típicas de pedidos analíticos e o
+    tamanho da conversa; a escolha é corrigida pelas estatísticas recentes de cada modelo:
+    um modelo com muitas falhas ou lento demais cede a vez ao outro enquanto estiver assim.
+    """
+
+    def __init__(self, fast_model: str, heavy_model: str, simple_chars: int = 300,
+                 heavy_chars: int = 1200, fast_max_tokens: int = 1024, heavy_max_tokens: int = 4096,
+                 max_error_rate: float = 0.3, max_latency: Optional[float] = 10.0,
+                 min_samples: int = 10, window: int = 50, max_age: float = 300.0):
+        self.models = {FAST: fast_model, HEAVY: heavy_model}
+        self.simple_chars = simple_chars
+        self.heavy_chars = heavy_chars
+        self.max_tokens = {FAST: fast_max_tokens, HEAVY: heavy_max_tokens}
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self.min_samples = min_samples
+        self.window = window
+        self.max_age = max_age
+        self._stats: Dict[str, ModelStats] = {}
+        self.routed = {FAST: 0, HEAVY: 0}
+        self.diverted = 0
+
+    def complexity(self, question: str, history_turns: int = 0) -> float:
+        """Pontuação de 0 a 1: acima de 0.5 a pergunta vai para o modelo pesado."""
+        length = len(question)
+        if length >= self.heavy_chars:
+            return 1.0
+        # Até `simple_chars` caracteres o tamanho sozinho não pesa; depois cresce até o limite
+        score = 0.6 * max(0.0, (length - self.simple_chars) / (self.heavy_chars - self.simple_chars))
+        if _HEAVY_HINTS.search(_normalize(question)):
+            score += 0.55
+        # Várias perguntas ou frases na mesma mensagem
+        score += min(0.2, 0.05 * len(_SENTENCE_END.findall(question + " ")))
+        # Conversas longas tendem a pedir aprofundamento
+        score += min(0.15, 0.03 * history_turns)
+        return min(1.0, score)
+
+    def stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.window, self.max_age)
+        return stats
+
+    def healthy(self, model: str) -> bool:
+        """Um modelo é evitado se falha demais ou está lento demais nas últimas chamadas."""
+        stats = self.stats(model)
+        if len(stats.samples) < self.min_samples:
+            return True
+        if stats.error_rate() > self.max_error_rate:
+            return False
+        latency = stats.latency(0.5)
+        return self.max_latency is None or latency is None or latency <= self.max_latency
+
+    def route(self, question: str, history_turns: int = 0, mode: str = AUTO,
+              models: Optional[Dict[str, str]] = None) -> Tuple[str, str, int, bool]:
+        """
+        Retorna (nível, modelo, orçamento de tokens de saída, desviado). `mode` força um
+        nível (`rapido` ou `pesado`) e `models` substitui os nomes dos modelos (por servidor).
+        A decisão só entra nas estatísticas com `count`, quando o modelo é de fato chamado.
+        """
+        models = {**self.models, **(models or {})}
+        score = self.complexity(question, history_turns)
+        tier = mode if mode in (FAST, HEAVY) else (HEAVY if score > 0.5 else FAST)
+
+        # No modo automático, desvia do modelo com problemas se o outro estiver saudável
+        diverted = False
+        if mode == AUTO:
+            other = FAST if tier == HEAVY else HEAVY
+            if not self.healthy(models[tier]) and self.healthy(models[other]):
+                tier = other
+                diverted = True
+
+        # O orçamento cresce com a complexidade: perguntas simples não precisam de 4096 tokens
+        limit = self.max_tokens[tier]
+        budget = int(limit * (0.5 + 0.5 * score)) if tier == FAST else int(limit * (0.75 + 0.25 * score))
+        return tier, models[tier], max(256, budget), diverted
+
+    def count(self, tier: str, diverted: bool = False):
+        """Contabiliza uma decisão de `route` que resultou em chamada ao modelo."""
+        self.routed[tier] += 1
+        if diverted:
+            self.diverted += 1
+
+    def record(self, model: str, latency: Optional[float], ok: bool):
+        """Registra uma chamada; `latency` é o tempo até o primeiro trecho (None se não medido)."""
+        self.stats(model).record(latency, ok)
+
+    def summary(self) -> List[Dict[str, object]]:
+        """Estatísticas por modelo para os comandos de administração."""
+        return [
+            {
+                "model": model,
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "error_rate": stats.error_rate(),
+                "p50": stats.latency(0.5),
+                "p95": stats.latency(0.95),
+                "healthy": self.healthy(model),
+            }
+            for model, stats in sorted(self._stats.items())
+        ]
@@ -0,0 +1,85 @@
+# utils/rate_limiter.py
+
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class RateLimiter:
+    """
+    Controle de admissão por token bucket, com um balde por escopo (usuário, canal, servidor).
+    Cada verificação é O(1): os baldes são reabastecidos de forma preguiçosa no acesso.
+    Baldes ociosos tempo suficiente para encher de novo equivalem a baldes novos e são
+    descartados, mantendo a memória limitada.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], max_buckets: int = 100000):
+        # limits: escopo -> (capacidade, tokens por segundo)
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Tuple[str, Hashable], List[float]]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def try_acquire(self, keys: Dict[str, Optional[Hashable]], cost: float = 1.0) -> float:
+        """
+        Tenta consumir `cost` tokens de todos os baldes indicados (escopo -> chave).
+        Retorna 0 se a requisição foi admitida, ou quantos segundos faltam para ser.
+        """
+        now = time.monotonic()
+        buckets = []
+        retry_after = 0.0
+
+        for scope, key in keys.items():
+            if key is None or scope not in self.limits:
+                continue
+            capacity, rate = self.limits[scope]
+            bucket = self._bucket(scope, key, capacity, now)
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            needed = min(cost, capacity)
+            if bucket[0] < needed:
+                retry_after = max(retry_after, (needed - bucket[0]) / rate)
+            buckets.append((bucket, needed))
+
+        self._evict(now)
+
+        if retry_after > 0:
+            self.rejected += 1
+            return retry_after
+
+        # Só desconta quando todos os escopos admitem a requisição
+        for bucket, needed in buckets:
+            bucket[0] -= needed
+        self.allowed += 1
+        return 0.0
+
+    async def acquire(self, keys: Dict[str, Optional[Hashable]], cost: float = 1.0) -> float:
+        """Versão assíncrona de `try_acquire`, com a mesma interface do SharedRateLimiter."""
+        return self.try_acquire(keys, cost)
+
+    def _bucket(self, scope: str, key: Hashable, capacity: float, now: float) -> List[float]:
+        bucket_key = (scope, key)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._buckets[bucket_key] = [capacity, now]
+        else:
+            self._buckets.move_to_end(bucket_key)
+        return bucket
+
+    def _evict(self, now: float):
+        # Os baldes menos usados ficam no início; descarta os que já estariam cheios
+        while self._buckets:
+            (scope, _), bucket = next(iter(self._buckets.items()))
+            capacity, rate = self.limits[scope]
+            if len(self._buckets) <= self.max_buckets and now - bucket[1] < capacity / rate:
+                break
+            self._buckets.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna o número de baldes ativos e os contadores de admissão."""
+        return {
+            "buckets": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,326 @@
+# utils/resilience.py
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, Type
+
+
+class CircuitOpenError(Exception):
+    """O serviço está marcado como fora do ar e a chamada foi recusada sem tentar."""
+
+    def __init__(self, service: str, retry_after: float):
+        super().__init__(f"Circuito de {service} aberto; nova tentativa em {retry_after:.0f}s")
+        self.service = service
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Disjuntor clássico: após `failure_threshold` falhas seguidas abre e recusa chamadas por
+    `reset_timeout` segundos; depois deixa passar uma única chamada de teste (semiaberto).
+    """
+
+    CLOSED = "fechado"
+    OPEN = "aberto"
+    HALF_OPEN = "semiaberto"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Indica se uma chamada pode ser feita agora."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def release(self):
+        """Libera a chamada de teste quando ela termina sem dizer nada sobre o serviço."""
+        self._probing = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class ResilientCaller:
+    """
+    Camada de resiliência para chamadas a um serviço externo: prazo por tentativa, novas
+    tentativas com backoff exponencial e jitter, requisições "hedged" quando a latência passa
+    do p95 observado e um disjuntor que falha rápido enquanto o serviço está fora do ar.
+    Em streaming, o hedging compara o tempo até a primeira parte com o p95 desse tempo.
+    """
+
+    def __init__(self, service: str, timeout: float = 30.0, max_attempts: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 breaker: Optional[CircuitBreaker] = None, hedging: bool = False,
+                 hedge_min_samples: int = 20,
+                 non_retryable: Tuple[Type[BaseException], ...] = (),
+                 retryable: Tuple[Type[BaseException], ...] = ()):
+        self.service = service
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        # Erros do próprio pedido (bloqueio de segurança, argumento inválido): repetir não
+        # adianta e não dizem nada sobre a saúde do serviço, então não contam para o disjuntor.
+        # `retryable` devolve à regra geral subclasses como o 429 (limite de requisições)
+        self.non_retryable = non_retryable
+        self.retryable = retryable
+
+        self._latencies: Deque[float] = deque(maxlen=200)
+        # Tempo até a primeira parte das chamadas em streaming
+        self._first_chunk_latencies: Deque[float] = deque(maxlen=200)
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.rejected = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def latency_p95(self) -> Optional[float]:
+        """p95 das latências recentes, ou None enquanto houver poucas amostras."""
+        return self._p95(self._latencies)
+
+    def first_chunk_p95(self) -> Optional[float]:
+        """p95 do tempo até a primeira parte em streaming, ou None enquanto houver poucas amostras."""
+        return self._p95(self._first_chunk_latencies)
+
+    def _p95(self, samples: Deque[float]) -> Optional[float]:
+        if len(samples) < self.hedge_min_samples:
+            return None
+        recent = sorted(samples)
+        return recent[min(len(recent) - 1, int(len(recent) * 0.95))]
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(self.service, self.breaker.retry_after())
+
+    def is_request_error(self, error: BaseException) -> bool:
+        """Indica se o erro é do pedido em si, e não uma falha do serviço."""
+        return isinstance(error, self.non_retryable) and not isinstance(error, self.retryable)
+
+    def _record_failure(self, error: BaseException):
+        self.failures += 1
+        if isinstance(error, asyncio.TimeoutError):
+            self.timeouts += 1
+        self.breaker.record_failure()
+
+    def _record_success(self, latency: Optional[float] = None):
+        if latency is not None:
+            self._latencies.append(latency)
+        self.breaker.record_success()
+
+    async def _backoff(self, attempt: int):
+        # "Full jitter": espera aleatória entre 0 e o teto exponencial
+        self.retries += 1
+        await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+    async def call(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa `factory()` com prazo, novas tentativas, hedging e disjuntor."""
+        self.calls += 1
+        for attempt in range(self.max_attempts):
+            self._check_breaker()
+            started = time.monotonic()
+            try:
+                result = await self._attempt(factory)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if self.is_request_error(e):
+                    self.breaker.release()
+                    raise
+                self._record_failure(e)
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                await self._backoff(attempt)
+                continue
+            self._record_success(time.monotonic() - started)
+            return result
+
+    async def _attempt(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        p95 = self.latency_p95() if self.hedging else None
+        if p95 is None or p95 >= self.timeout:
+            return await asyncio.wait_for(factory(), self.timeout)
+
+        primary = asyncio.ensure_future(asyncio.wait_for(factory(), self.timeout))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=p95)
+            if done:
+                return primary.result()
+
+            # A chamada principal passou do p95: dispara uma segunda e fica com a primeira que responder
+            self.hedged += 1
+            hedge = asyncio.ensure_future(asyncio.wait_for(factory(), self.timeout - p95))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+            raise primary.exception()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def stream(self, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Versão para streaming. Novas tentativas só acontecem antes da primeira parte chegar,
+        pois o que já foi publicado não pode ser desfeito; depois disso, o prazo vale para o
+        intervalo entre as partes.
+        """
+        self.calls += 1
+        for attempt in range(self.max_attempts):
+            self._check_breaker()
+            try:
+                generator, first = await self._first(factory)
+            except StopAsyncIteration:
+                self._record_success()
+                return
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if self.is_request_error(e):
+                    self.breaker.release()
+                    raise
+                self._record_failure(e)
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                await self._backoff(attempt)
+                continue
+
+            try:
+                yield first
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(generator.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            except Exception as e:
+                # Um bloqueio de segurança no meio da resposta também é erro do pedido
+                if self.is_request_error(e):
+                    self.breaker.release()
+                else:
+                    self._record_failure(e)
+                raise
+            except BaseException:
+                # Cancelamento ou consumidor que desistiu no meio da resposta
+                self.breaker.release()
+                raise
+            finally:
+                await generator.aclose()
+
+            # A duração total depende do tamanho da resposta: só o tempo até a primeira parte
+            # entra nas amostras, e ele não se mistura com as latências de `call`
+            self._record_success()
+            return
+
+    async def _first(self, factory: Callable[[], AsyncIterator[Any]]) -> Tuple[AsyncIterator[Any], Any]:
+        """
+        Abre o stream e aguarda a primeira parte. Com hedging, se ela demorar mais que o p95
+        do tempo até a primeira parte, abre um segundo stream e segue com o que responder
+        primeiro; o outro é fechado. Uma resposta vazia gera StopAsyncIteration.
+        """
+        started = time.monotonic()
+        p95 = self.first_chunk_p95() if self.hedging else None
+        generators = [factory()]
+        tasks = [asyncio.ensure_future(asyncio.wait_for(generators[0].__anext__(), self.timeout))]
+        winner = None
+        try:
+            if p95 is not None and p95 < self.timeout:
+                done, _ = await asyncio.wait(tasks, timeout=p95)
+                if not done:
+                    # A primeira parte passou do p95: abre um segundo stream
+                    self.hedged += 1
+                    generators.append(factory())
+                    tasks.append(asyncio.ensure_future(
+                        asyncio.wait_for(generators[1].__anext__(), self.timeout - p95)
+                    ))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner = tasks.index(task)
+                        break
+                if winner is not None:
+                    break
+            if winner is None:
+                raise tasks[0].exception()
+
+            if winner == 1:
+                self.hedge_wins += 1
+            self._first_chunk_latencies.append(time.monotonic() - started)
+            if tasks[winner].exception() is not None:
+                raise tasks[winner].exception()
+            return generators[winner], tasks[winner].result()
+        finally:
+            for index, (task, generator) in enumerate(zip(tasks, generators)):
+                if index == winner and not tasks[winner].exception():
+                    continue
+                # O gerador só pode ser fechado depois que a leitura em andamento terminar
+                if not task.done():
+                    task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await generator.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna o estado do disjuntor e os contadores de resiliência."""
+        p95 = self.latency_p95()
+        first_chunk_p95 = self.first_chunk_p95()
+        return {
+            "service": self.service,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "times_opened": self.breaker.times_opened,
+            "retry_after": self.breaker.retry_after() if self.breaker.state == CircuitBreaker.OPEN else 0.0,
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": p95 * 1000 if p95 is not None else None,
+            "first_chunk_p95_ms": first_chunk_p95 * 1000 if first_chunk_p95 is not None else None,
+        }
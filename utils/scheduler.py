@@ -0,0 +1,155 @@
+# utils/scheduler.py
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Hashable, Optional
+
+
+class FairScheduler:
+    """
+    Limita o número de chamadas simultâneas a um serviço externo e distribui as vagas
+    entre servidores usando enfileiramento justo ponderado (start-time fair queueing).
+    Um servidor muito ativo não consegue monopolizar as vagas dos demais.
+    """
+
+    def __init__(self, max_concurrent: int = 4, weights: Optional[Dict[Hashable, float]] = None,
+                 default_weight: float = 1.0, history_size: int = 500):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent deve ser pelo menos 1")
+        self.max_concurrent = max_concurrent
+        self.weights: Dict[Hashable, float] = dict(weights or {})
+        self.default_weight = default_weight
+
+        self._in_flight = 0
+        self._queued = 0
+        self._queues: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self._finish_tags: Dict[Hashable, float] = {}
+        self._virtual_clock = 0.0
+
+        # Estatísticas de espera na fila
+        self._total_acquired = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._recent_waits: Deque[float] = deque(maxlen=history_size)
+
+    def weight_for(self, key: Hashable) -> float:
+        """Retorna o peso configurado para a chave (servidor)."""
+        weight = self.weights.get(key, self.default_weight)
+        return weight if weight > 0 else self.default_weight
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable = None):
+        """Reserva uma vaga para a chave durante o bloco `async with`."""
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, key: Hashable = None):
+        """Aguarda até que exista uma vaga disponível para a chave."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        # Caminho rápido: há vaga livre e ninguém esperando
+        if self._in_flight < self.max_concurrent and not self._queued:
+            self._in_flight += 1
+            self._charge(key)
+            self._record_wait(0.0)
+            return
+
+        future = loop.create_future()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        queue.append(future)
+        self._queued += 1
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # A vaga foi concedida, mas a tarefa foi cancelada antes de usá-la
+                self.release()
+            else:
+                self._discard(key, future)
+            raise
+
+        self._record_wait(loop.time() - started)
+
+    def release(self):
+        """Libera uma vaga e despacha o próximo da fila."""
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _discard(self, key: Hashable, future: asyncio.Future):
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+            self._queued -= 1
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[key]
+
+    def _dispatch(self):
+        while self._in_flight < self.max_concurrent and self._queued:
+            # Próxima chave é a de menor tag virtual entre as que têm pedidos na fila
+            key = min(self._queues, key=self._start_tag)
+            queue = self._queues[key]
+            future = queue.popleft()
+            self._queued -= 1
+            if not queue:
+                del self._queues[key]
+            if future.done():
+                continue
+            self._in_flight += 1
+            self._charge(key)
+            future.set_result(None)
+
+    def _start_tag(self, key: Hashable) -> float:
+        return max(self._finish_tags.get(key, 0.0), self._virtual_clock)
+
+    def _charge(self, key: Hashable):
+        start = self._start_tag(key)
+        self._virtual_clock = start
+        self._finish_tags[key] = start + 1.0 / self.weight_for(key)
+
+        # Chaves inativas cuja tag já ficou para trás equivalem a chaves novas
+        if len(self._finish_tags) > 256:
+            self._finish_tags = {
+                k: tag for k, tag in self._finish_tags.items()
+                if tag > self._virtual_clock or k in self._queues
+            }
+
+    def _record_wait(self, wait: float):
+        self._total_acquired += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        self._recent_waits.append(wait)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna profundidade da fila e estatísticas de tempo de espera (em milissegundos)."""
+        recent = sorted(self._recent_waits)
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {
+            "limit": self.max_concurrent,
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "queued_by_key": {key: len(queue) for key, queue in self._queues.items()},
+            "acquired": self._total_acquired,
+            "avg_wait_ms": (self._total_wait / self._total_acquired * 1000) if self._total_acquired else 0.0,
+            "p95_wait_ms": p95 * 1000,
+            "max_wait_ms": self._max_wait * 1000,
+        }
@@ -0,0 +1,125 @@
+# utils/sessions.py
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token), suficiente para orçamentos."""
+    return len(text) // 4 + 1
+
+
+class _Session:
+    __slots__ = ("turns", "tokens", "last_used")
+
+    def __init__(self):
+        self.turns: List[Dict[str, Any]] = []
+        self.tokens = 0
+        self.last_used = time.monotonic()
+
+
+class ChatSessionStore:
+    """
+    Histórico de conversa por usuário e canal, no formato aceito por `start_chat(history=...)`.
+    Cada sessão tem um orçamento de tokens (as trocas mais antigas são descartadas), sessões
+    ociosas expiram por TTL e o total em memória é limitado com expulsão LRU.
+    """
+
+    def __init__(self, max_sessions: int = 5000, ttl: float = 1800.0,
+                 max_history_tokens: int = 2000, max_total_tokens: int = 2_000_000):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_history_tokens = max_history_tokens
+        self.max_total_tokens = max_total_tokens
+
+        self._sessions: "OrderedDict[Tuple[Hashable, Hashable], _Session]" = OrderedDict()
+        self._total_tokens = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def history(self, user_id: Hashable, channel_id: Hashable) -> List[Dict[str, Any]]:
+        """Retorna uma cópia do histórico da sessão (lista vazia se não houver)."""
+        key = (user_id, channel_id)
+        session = self._sessions.get(key)
+        if session is None:
+            return []
+        if time.monotonic() - session.last_used > self.ttl:
+            self._remove(key)
+            self.expired += 1
+            return []
+        return list(session.turns)
+
+    def record(self, user_id: Hashable, channel_id: Hashable, question: str, answer: str):
+        """Acrescenta uma troca pergunta/resposta à sessão e aplica os limites de memória."""
+        key = (user_id, channel_id)
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = _Session()
+        self._sessions.move_to_end(key)
+        session.last_used = time.monotonic()
+
+        for role, text in (("user", question), ("model", answer)):
+            session.turns.append({"role": role, "parts": [text]})
+            tokens = estimate_tokens(text)
+            session.tokens += tokens
+            self._total_tokens += tokens
+
+        self._trim(session)
+        self._enforce_limits()
+
+    def clear(self, user_id: Hashable, channel_id: Hashable) -> bool:
+        """Encerra a sessão. Retorna True se havia uma sessão ativa."""
+        return self._remove((user_id, channel_id))
+
+    def _trim(self, session: _Session):
+        # Descarta as trocas mais antigas até caber no orçamento, preservando a última
+        while session.tokens > self.max_history_tokens and len(session.turns) > 2:
+            for turn in session.turns[:2]:
+                tokens = estimate_tokens(turn["parts"][0])
+                session.tokens -= tokens
+                self._total_tokens -= tokens
+            del session.turns[:2]
+
+        # Uma única troca maior que o orçamento tem a resposta encurtada
+        if session.tokens > self.max_history_tokens and len(session.turns) == 2:
+            answer = session.turns[1]["parts"][0]
+            excess_chars = (session.tokens - self.max_history_tokens) * 4
+            shortened = answer[:max(0, len(answer) - excess_chars)]
+            delta = estimate_tokens(answer) - estimate_tokens(shortened)
+            session.turns[1] = {"role": "model", "parts": [shortened]}
+            session.tokens -= delta
+            self._total_tokens -= delta
+
+    def _enforce_limits(self):
+        now = time.monotonic()
+        # Sessões mais antigas ficam no início; remove as expiradas
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.ttl:
+                break
+            self._remove(key)
+            self.expired += 1
+
+        while self._sessions and (len(self._sessions) > self.max_sessions
+                                  or self._total_tokens > self.max_total_tokens):
+            self._remove(next(iter(self._sessions)))
+            self.evicted += 1
+
+    def _remove(self, key: Tuple[Hashable, Hashable]) -> bool:
+        session = self._sessions.pop(key, None)
+        if session is None:
+            return False
+        self._total_tokens -= session.tokens
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna ocupação e contadores de expulsão das sessões."""
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "tokens": self._total_tokens,
+            "max_tokens": self.max_total_tokens,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
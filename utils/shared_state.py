@@ -0,0 +1,233 @@
+# utils/shared_state.py
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+# Balde de token compartilhado: (chave, capacidade, tokens por segundo)
+Bucket = Tuple[str, float, float]
+
+
+class SharedState:
+    """
+    Estado que precisa ser global quando o bot roda em vários processos (clusters de shards):
+    baldes do controle de admissão e configurações alteradas por comandos. Esta implementação
+    guarda tudo em memória e serve para um único processo; `SQLiteState` compartilha os mesmos
+    dados entre processos na mesma máquina.
+    """
+
+    # Indica se outros processos enxergam as alterações (e se vale a pena sincronizar)
+    shared = False
+
+    def __init__(self):
+        self._values: Dict[str, Dict[str, Tuple[Any, int]]] = {}
+        self._version = 0
+        # Baldes: chave -> [tokens, atualizado em, cheio em]
+        self._buckets: Dict[str, List[float]] = {}
+        self._takes = 0
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        entry = self._values.get(namespace, {}).get(key)
+        return entry[0] if entry else None
+
+    async def set(self, namespace: str, key: str, value: Any):
+        self._version += 1
+        self._values.setdefault(namespace, {})[key] = (value, self._version)
+
+    async def changes(self, namespace: str, since: int = 0) -> Tuple[Dict[str, Any], int]:
+        """Valores alterados depois da versão `since` e a versão mais recente do namespace."""
+        entries = self._values.get(namespace, {})
+        changed = {key: value for key, (value, version) in entries.items() if version > since}
+        return changed, max((version for _, version in entries.values()), default=since)
+
+    async def take_tokens(self, buckets: List[Bucket], cost: float) -> float:
+        """
+        Consome `cost` tokens de todos os baldes de uma vez. Retorna 0 se foi admitido ou
+        quantos segundos faltam (mesma regra do `RateLimiter` e do `SQLiteState`).
+        """
+        now = time.monotonic()
+        updates = []
+        retry_after = 0.0
+        for key, capacity, rate in buckets:
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            needed = min(cost, capacity)
+            if tokens < needed:
+                retry_after = max(retry_after, (needed - tokens) / rate)
+            updates.append((key, tokens, needed, capacity, rate))
+
+        # Só desconta quando todos os escopos admitem a requisição
+        if retry_after == 0:
+            for key, tokens, needed, capacity, rate in updates:
+                self._buckets[key] = [tokens - needed, now, now + (capacity - tokens + needed) / rate]
+
+        # Baldes que já estariam cheios equivalem a baldes novos
+        self._takes += 1
+        if self._takes % 256 == 0:
+            for key in [key for key, bucket in self._buckets.items() if bucket[2] <= now]:
+                del self._buckets[key]
+        return retry_after
+
+    async def close(self):
+        pass
+
+
+class SQLiteState(SharedState):
+    """
+    Estado compartilhado em um arquivo SQLite (modo WAL), seguro para vários processos.
+    Cada operação é uma transação curta executada fora do event loop.
+    """
+
+    shared = True
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, version INTEGER NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_full_at ON buckets(full_at)")
+        self._takes = 0
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get, namespace, key)
+
+    def _get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def set(self, namespace: str, key: str, value: Any):
+        await asyncio.to_thread(self._set, namespace, key, json.dumps(value, ensure_ascii=False))
+
+    def _set(self, namespace: str, key: str, value: str):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Versão global crescente, para que cada processo leia só o que mudou
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO kv (namespace, key, value, version) "
+                    "VALUES (?, ?, ?, (SELECT COALESCE(MAX(version), 0) + 1 FROM kv))",
+                    (namespace, key, value)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def changes(self, namespace: str, since: int = 0) -> Tuple[Dict[str, Any], int]:
+        return await asyncio.to_thread(self._changes, namespace, since)
+
+    def _changes(self, namespace: str, since: int) -> Tuple[Dict[str, Any], int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, version FROM kv WHERE namespace = ? AND version > ?", (namespace, since)
+            ).fetchall()
+        return {key: json.loads(value) for key, value, _ in rows}, max((row[2] for row in rows), default=since)
+
+    async def take_tokens(self, buckets: List[Bucket], cost: float) -> float:
+        """
+        Consome `cost` tokens de todos os baldes em uma única transação. Retorna 0 se foi
+        admitido ou quantos segundos faltam. Usa o relógio de parede, comum aos processos.
+        """
+        return await asyncio.to_thread(self._take_tokens, buckets, cost)
+
+    def _take_tokens(self, buckets: List[Bucket], cost: float) -> float:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                updates = []
+                retry_after = 0.0
+                for key, capacity, rate in buckets:
+                    row = self._conn.execute(
+                        "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+                    ).fetchone()
+                    tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                    needed = min(cost, capacity)
+                    if tokens < needed:
+                        retry_after = max(retry_after, (needed - tokens) / rate)
+                    updates.append((key, tokens, needed, capacity, rate))
+
+                # Só desconta quando todos os escopos admitem a requisição
+                if retry_after == 0:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                        [
+                            (key, tokens - needed, now, now + (capacity - tokens + needed) / rate)
+                            for key, tokens, needed, capacity, rate in updates
+                        ]
+                    )
+
+                # Baldes que já estariam cheios equivalem a baldes novos
+                self._takes += 1
+                if self._takes % 256 == 0:
+                    self._conn.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return retry_after
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SharedRateLimiter:
+    """
+    Mesmo controle de admissão do RateLimiter (um token bucket por escopo), com os baldes no
+    estado compartilhado, para que os limites valham para o bot inteiro e não por processo.
+    """
+
+    def __init__(self, state: SharedState, limits: Dict[str, Tuple[float, float]]):
+        self.state = state
+        self.limits = limits
+        self.allowed = 0
+        self.rejected = 0
+
+    async def acquire(self, keys: Dict[str, Optional[Hashable]], cost: float = 1.0) -> float:
+        buckets = [
+            (f"{scope}:{key}", *self.limits[scope])
+            for scope, key in keys.items() if key is not None and scope in self.limits
+        ]
+        retry_after = await self.state.take_tokens(buckets, cost) if buckets else 0.0
+        if retry_after > 0:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores deste processo; os baldes ficam no estado compartilhado."""
+        return {"buckets": None, "allowed": self.allowed, "rejected": self.rejected}
+
+
+def create_state(config: Dict[str, Any], multiprocess: bool = False) -> SharedState:
+    """
+    Cria o backend da seção "estado_compartilhado". Com vários processos o estado em memória
+    não serve, então o SQLite é usado mesmo que a configuração peça "memoria".
+    """
+    backend = config.get("backend", "memoria")
+    if backend == "sqlite" or multiprocess:
+        return SQLiteState(config.get("arquivo", "./cache/estado.sqlite3"))
+    if backend != "memoria":
+        raise ValueError(f"Backend de estado compartilhado desconhecido: {backend}")
+    return SharedState()
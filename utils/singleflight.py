@@ -0,0 +1,104 @@
+# utils/singleflight.py
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List
+
+
+class _Flight:
+    """Uma chamada em andamento, compartilhada por todos que pediram a mesma coisa."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.streaming = False
+        self.done = False
+        self.task: asyncio.Task = None
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """
+    Agrupa requisições idênticas simultâneas em uma única chamada ao serviço externo.
+    Todos os interessados recebem o mesmo resultado; o cancelamento de um deles não afeta
+    os demais, e erros não ficam guardados: a próxima requisição tenta de novo.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.saved = 0
+
+    def _join(self, key: Hashable) -> _Flight:
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.saved += 1
+        return flight
+
+    def _start(self, key: Hashable, flight: _Flight, coro: Awaitable[Any]) -> _Flight:
+        self._flights[key] = flight
+        self.calls += 1
+
+        def finished(task: asyncio.Task):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.done = True
+            flight.notify()
+            # Marca a exceção como lida, mesmo que todos os interessados tenham desistido
+            if not task.cancelled():
+                task.exception()
+
+        flight.task = asyncio.ensure_future(coro)
+        flight.task.add_done_callback(finished)
+        return flight
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa `factory()` uma única vez por chave entre chamadas simultâneas."""
+        flight = self._join(key) or self._start(key, _Flight(), factory())
+        return await asyncio.shield(flight.task)
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Versão para respostas em streaming: a primeira requisição consome o gerador e as
+        demais recebem as mesmas partes, inclusive as que já tinham chegado.
+        """
+        flight = self._join(key)
+        if flight is None:
+            flight = _Flight()
+            flight.streaming = True
+            self._start(key, flight, self._consume(flight, factory()))
+
+        if not flight.streaming:
+            yield await asyncio.shield(flight.task)
+            return
+
+        position = 0
+        while True:
+            changed = flight.changed
+            while position < len(flight.chunks):
+                position += 1
+                yield flight.chunks[position - 1]
+            if flight.done:
+                break
+            await changed.wait()
+
+        # Repassa o erro da chamada compartilhada (se houver) a cada interessado
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            raise flight.task.exception()
+
+    @staticmethod
+    async def _consume(flight: _Flight, generator: AsyncIterator[str]) -> str:
+        async for chunk in generator:
+            flight.chunks.append(chunk)
+            flight.notify()
+        return "".join(flight.chunks)
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna quantas chamadas foram feitas e quantas foram economizadas."""
+        return {
+            "in_flight": len(self._flights),
+            "upstream_calls": self.calls,
+            "saved_calls": self.saved,
+        }
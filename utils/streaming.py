@@ -0,0 +1,86 @@
+# utils/streaming.py
+
+import asyncio
+import time
+from typing import List, Optional
+
+import discord
+
+from utils.delivery import cut_chunk
+from utils.metrics import metrics
+
+
+class StreamingReply:
+    """
+    Publica uma resposta à medida que ela é gerada: envia os primeiros trechos assim que
+    chegam e depois edita a mensagem em intervalos agrupados, respeitando os limites de
+    taxa do Discord. Quando o texto passa do limite, continua em uma nova mensagem, cortando
+    entre parágrafos ou frases e sem quebrar blocos de código.
+    """
+
+    def __init__(self, source: discord.Message, limit: int = 1900,
+                 edit_interval: float = 1.0, max_edit_interval: float = 5.0):
+        self.source = source
+        self.limit = limit
+        self.edit_interval = edit_interval
+        self.max_edit_interval = max_edit_interval
+        self.messages: List[discord.Message] = []
+
+        self._current: Optional[discord.Message] = None
+        self._buffer = ""
+        self._published = ""
+        self._last_edit = 0.0
+
+    @property
+    def has_content(self) -> bool:
+        return bool(self.messages or self._buffer.strip())
+
+    async def feed(self, text: str):
+        """Acrescenta texto à resposta, publicando-o quando for a hora."""
+        if not self.messages and not self._buffer:
+            text = text.lstrip()
+        self._buffer += text
+
+        # Passou do limite: fecha a mensagem atual e continua em uma nova
+        while len(self._buffer) > self.limit:
+            head, self._buffer = cut_chunk(self._buffer, self.limit)
+            await self._publish(head)
+            self._current = None
+            self._published = ""
+
+        if time.monotonic() - self._last_edit >= self.edit_interval:
+            await self._publish(self._buffer)
+
+    async def finish(self):
+        """Publica o que ainda estiver pendente."""
+        self._buffer = self._buffer.rstrip()
+        await self._publish(self._buffer)
+
+    async def _publish(self, content: str):
+        if not content.strip() or content == self._published:
+            return
+
+        started = time.monotonic()
+        try:
+            if self._current is None:
+                self._current = await self.source.reply(content)
+                self.messages.append(self._current)
+            else:
+                await self._current.edit(content=content)
+        except discord.HTTPException as e:
+            if e.status != 429:
+                raise
+            # Limite de taxa atingido: espera e espaça as próximas edições
+            self.edit_interval = min(self.edit_interval * 2, self.max_edit_interval)
+            await asyncio.sleep(getattr(e, "retry_after", None) or self.edit_interval)
+            return await self._publish(content)
+
+        self._published = content
+        self._last_edit = time.monotonic()
+        metrics.observe("etapa_segundos", self._last_edit - started, etapa="discord_envio")
+
+        # O discord.py espera sozinho quando há limite de taxa; se a edição demorou,
+        # aumenta o intervalo para agrupar mais texto em cada edição
+        elapsed = self._last_edit - started
+        if elapsed > self.edit_interval:
+            self.edit_interval = min(elapsed * 2, self.max_edit_interval)
@@ -0,0 +1,56 @@
+# utils/triggers.py
+
+import re
+from typing import Iterable, Optional
+
+# Pedido de imagem: "imagem <prompt>" ou "image <prompt>"
+_IMAGE_REQUEST = re.compile(r"(?:imagem|image)(?:\s+|$)(.*)", re.IGNORECASE | re.DOTALL)
+
+
+def split_image_prompt(content: str) -> Optional[str]:
+    """Retorna o prompt se a mensagem for um pedido de imagem (pode ser vazio), ou None."""
+    match = _IMAGE_REQUEST.match(content)
+    return match.group(1).strip() if match else None
+
+
+class TriggerMatcher:
+    """
+    Reconhece as mensagens dirigidas ao bot e já devolve o texto sem o gatilho, em uma
+    única passada. Os nomes de ativação ("samer", apelidos do servidor) e as formas de
+    menção são compilados em uma só expressão regular, montada uma vez após o login.
+
+    A maioria das mensagens não é para o bot, então o caminho de rejeição é o mais barato:
+    uma tentativa de casamento ancorada no início e uma busca de substring pelo ID do bot.
+    """
+
+    # Caracteres que podem seguir o nome de ativação ("samer, ...", "samer: ...", "samer? ...");
+    # o nome também pode vir sozinho, abrindo uma pergunta que chega na mensagem seguinte
+    SEPARATORS = r"\s,:?!"
+
+    def __init__(self, user_id: int, names: Iterable[str] = ("samer",)):
+        self.user_id = user_id
+        self._id = str(user_id)
+        mention = rf"<@!?{user_id}>"
+        # Nomes mais longos primeiro, para que um apelido que contém outro não seja cortado
+        alternatives = sorted({re.escape(name.lower()) for name in names if name}, key=len, reverse=True)
+        alternatives.append(mention)
+        self._prefix = re.compile(
+            rf"\s*(?:{'|'.join(alternatives)})(?=[{self.SEPARATORS}]|$)[{self.SEPARATORS}]*",
+            re.IGNORECASE
+        )
+        self._mention = re.compile(mention)
+
+    def match(self, content: str, reply_to_bot: bool = False) -> Optional[str]:
+        """
+        Retorna o conteúdo sem o gatilho e sem menções ao bot se a mensagem for para ele
+        (chamada pelo nome no início, menção em qualquer lugar ou resposta a uma mensagem do
+        bot), ou None caso contrário. O retorno pode ser vazio se só havia o gatilho.
+        """
+        prefix = self._prefix.match(content)
+        if prefix is not None:
+            content = content[prefix.end():]
+        elif not reply_to_bot and (self._id not in content or self._mention.search(content) is None):
+            return None
+        if self._id in content:
+            content = self._mention.sub("", content)
+        return content.strip()